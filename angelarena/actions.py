@@ -0,0 +1,106 @@
+import asyncio
+import collections
+import logging
+import time
+
+import aiohttp
+import discord
+
+# Bulk Discord actions (roles for every participant, check-in DMs, deleting a
+# tournament's channels) run concurrently instead of one round trip after
+# another. The number of calls in flight is bounded, and every route has a
+# budget of calls per period below Discord's rate limit for it, so we wait
+# on our own instead of running into 429s. discord.py still handles any 429
+# that slips through.
+
+# route -> (calls, seconds)
+ROUTE_LIMITS = {
+        'add_roles': (10, 10), # member role changes are limited per guild
+        'check_in_dm': (5, 1), # create_dm and the first wizard message
+        'delete_channel': (5, 5),
+        }
+DEFAULT_LIMIT = (5, 5)
+
+class RateBudget(object):
+    # Token bucket with `calls` tokens refilled evenly over `per` seconds
+    def __init__(self, calls, per):
+        self.calls = calls
+        self.per = per
+        self.tokens = calls
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.calls, self.tokens + (now - self.updated)*self.calls/self.per)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens)*self.per/self.calls)
+
+def transient(e):
+    if isinstance(e, discord.HTTPException):
+        return e.status == 429 or e.status >= 500
+    return isinstance(e, (asyncio.TimeoutError, aiohttp.ClientError, OSError))
+
+class ActionExecutor(object):
+    def __init__(self, limit=10, route_limits=ROUTE_LIMITS, retries=3, backoff=1.0, progress_interval=5.0):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.route_limits = route_limits
+        self.budgets = {}
+        self.retries = retries
+        self.backoff = backoff # seconds before the first retry, doubled for every further one
+        self.progress_interval = progress_interval
+        self.stats = collections.Counter()
+
+    def budget(self, route):
+        if not route in self.budgets:
+            self.budgets[route] = RateBudget(*self.route_limits.get(route, DEFAULT_LIMIT))
+        return self.budgets[route]
+
+    async def call(self, route, action, item):
+        budget = self.budget(route)
+        for attempt in range(self.retries + 1):
+            await budget.acquire()
+            try:
+                async with self.semaphore:
+                    result = await action(item)
+                self.stats[route] += 1
+                return result
+            except Exception as e:
+                if attempt == self.retries or not transient(e):
+                    raise
+                self.stats['retries'] += 1
+                logging.warning(f"Retrying {route} for {item} after {e!r}")
+                await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def run(self, route, action, items, progress=None):
+        # Calls the coroutine function `action` for every item. Failures do
+        # not stop the others, they are returned as (item, exception) pairs.
+        # `progress(done, total, failed)` is awaited every progress_interval
+        # seconds and once at the end.
+        items = list(items)
+        failed = []
+        done = 0
+        last_report = time.monotonic()
+
+        async def one(item):
+            nonlocal done, last_report
+            try:
+                await self.call(route, action, item)
+            except Exception as e:
+                self.stats['failed'] += 1
+                logging.error(f"{route} failed for {item}: {e!r}")
+                failed.append((item, e))
+            done += 1
+            if progress and done < len(items) and time.monotonic() - last_report >= self.progress_interval:
+                last_report = time.monotonic()
+                await progress(done, len(items), len(failed))
+
+        await asyncio.gather(*(one(item) for item in items))
+        if progress:
+            await progress(done, len(items), len(failed))
+        return failed
@@ -0,0 +1,113 @@
+import asyncio
+import collections
+import contextvars
+import time
+
+from angelarena import metrics
+
+# discord.py runs every event handler in a task of its own, so handlers for
+# the same tournament interleave at every await: sign-ups could land in the
+# middle of its kickoff, a second approval could announce it twice. Every
+# tournament gets a queue of events instead, worked through in order by one
+# task. Different tournaments still proceed concurrently and there is no
+# global lock. A full queue makes further events wait before they are
+# queued, which holds back only the handlers of that tournament. Queue depths
+# and waiting times are exported as metrics.
+
+CURRENT = contextvars.ContextVar('actor', default=None) # key of the queue whose event runs in this task
+
+class Event(object):
+    __slots__ = ('name', 'handler', 'args', 'future', 'queued')
+
+    def __init__(self, name, handler, args, future):
+        self.name = name
+        self.handler = handler
+        self.args = args
+        self.future = future
+        self.queued = time.perf_counter()
+
+class TournamentActors(object):
+    # One queue and one worker task per key, usually a tournament id. The
+    # worker only exists while its queue has events.
+    def __init__(self, maxsize=64, metrics=metrics.REGISTRY):
+        self.maxsize = maxsize
+        self.metrics = metrics
+        self.queues = {} # key -> asyncio.Queue
+        self.workers = {} # key -> task
+        self.queued = 0 # events queued or running over all keys
+        self.stats = collections.Counter()
+
+    def depth(self, key):
+        queue = self.queues.get(key)
+        return queue.qsize() if queue else 0
+
+    def update(self):
+        self.metrics.set('tournament_events_queued', self.queued)
+        self.metrics.set('tournament_queues', len(self.queues))
+
+    async def run(self, key, name, handler, *args):
+        # Awaits handler(*args) once the events queued for `key` before it
+        # are done and returns its result. An event that runs further events
+        # for its own key runs them right away instead of waiting for itself.
+        if CURRENT.get() == key:
+            return await handler(*args)
+
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = asyncio.Queue(self.maxsize)
+            self.workers[key] = asyncio.create_task(self.work(key, queue))
+
+        event = Event(name, handler, args, asyncio.get_running_loop().create_future())
+        if queue.full():
+            self.stats['blocked'] += 1
+            self.metrics.inc('tournament_events_blocked_total')
+        self.queued += 1
+        try:
+            await queue.put(event)
+        except asyncio.CancelledError:
+            self.queued -= 1
+            raise
+        finally:
+            self.update()
+        self.metrics.observe('tournament_queue_depth', queue.qsize())
+        return await event.future
+
+    async def work(self, key, queue):
+        CURRENT.set(key)
+        try:
+            # nothing is awaited between finding the queue empty and removing
+            # it, so no event can be put into a queue without a worker
+            while not queue.empty():
+                event = queue.get_nowait()
+                self.metrics.observe('tournament_event_wait_seconds', time.perf_counter() - event.queued, name=event.name)
+                try:
+                    with self.metrics.timed('tournament_event_seconds', name=event.name):
+                        result = await event.handler(*event.args)
+                except asyncio.CancelledError:
+                    event.future.cancel()
+                    raise
+                except Exception as e:
+                    # the caller may have given up waiting
+                    if not event.future.done():
+                        event.future.set_exception(e)
+                else:
+                    if not event.future.done():
+                        event.future.set_result(result)
+                finally:
+                    self.queued -= 1
+                    self.stats['processed'] += 1
+                    self.update()
+        finally:
+            if self.queues.get(key) is queue:
+                del self.queues[key]
+                del self.workers[key]
+            self.update()
+
+    def close(self):
+        # Stops all workers, events that did not run yet are cancelled
+        for key, queue in list(self.queues.items()):
+            while not queue.empty():
+                queue.get_nowait().future.cancel()
+                self.queued -= 1
+            self.workers[key].cancel()
+        self.update()
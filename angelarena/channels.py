@@ -0,0 +1,123 @@
+import asyncio
+import collections
+import logging
+
+import discord
+
+# Bringing a channel in line with the tournament state with as few Discord
+# API calls as possible. The history is read once and every message we want
+# to show is matched against it by id; only messages that are missing, differ
+# or are not wanted any more cost a write.
+
+Plan = collections.namedtuple('Plan', ['header', 'entries', 'delete'])
+# header and every entry are (action, message, content) with action one of
+# 'keep', 'edit' or 'create'. message is None for 'create'.
+
+def action(message, content):
+    if message is None:
+        return ('create', None, content)
+    elif message.content != content:
+        return ('edit', message, content)
+    else:
+        return ('keep', message, content)
+
+def plan_reconciliation(history, wanted, author_id, header=None):
+    # history: messages in the channel, oldest first
+    # wanted: (message_id, content) for every message that should be there,
+    #   message_id is None if the message was never posted
+    # header: content of a message that has to stay the oldest in the channel
+    index = {message.id: message for message in history}
+    claimed = set()
+    entries = []
+    for message_id, content in wanted:
+        message = index.get(message_id)
+        if message is not None and message_id in claimed:
+            message = None
+        if message is not None:
+            claimed.add(message_id)
+        entries.append(action(message, content))
+
+    header_action = None
+    if header is not None:
+        # The oldest own message that is not claimed can be the header as long
+        # as nothing we keep is older. Otherwise the channel has to be
+        # rebuilt, there is no way to post a message before existing ones.
+        message = None
+        for m in history:
+            if m.id in claimed:
+                break
+            if m.author.id == author_id:
+                message = m
+                break
+        if message is None and claimed:
+            return rebuild(history, wanted, header)
+        if message is not None:
+            claimed.add(message.id)
+        header_action = action(message, header)
+
+    delete = [message for message in history if not message.id in claimed]
+    return Plan(header_action, entries, delete)
+
+def rebuild(history, wanted, header=None):
+    return Plan(action(None, header) if header is not None else None,
+            [action(None, content) for _, content in wanted], list(history))
+
+def writes(plan):
+    actions = plan.entries + ([plan.header] if plan.header else [])
+    return sum(1 for a in actions if a[0] != 'keep') + len(plan.delete)
+
+class EditScheduler(object):
+    # Debounced message edits. Edits scheduled for a message within `delay`
+    # seconds collapse into one edit with the content rendered when it is
+    # sent. Discord rate limits message edits per channel, so every channel
+    # has one worker that sends its edits one after another, `interval`
+    # seconds apart. Edits still pending when the bot stops are picked up by
+    # the reconciliation at the next start.
+    def __init__(self, messages=None, delay=2.0, interval=1.0):
+        self.messages = messages if messages is not None else {} # message_id -> message cache
+        self.delay = delay
+        self.interval = interval
+        self.pending = collections.defaultdict(dict) # channel -> {message_id: render}
+        self.workers = {}
+        self.stats = collections.Counter()
+
+    def schedule(self, channel, message_id, render):
+        # render is called without arguments right before the edit is sent
+        self.pending[channel][message_id] = render
+        self.stats['scheduled'] += 1
+        if not channel in self.workers:
+            self.workers[channel] = asyncio.ensure_future(self.run(channel))
+
+    async def message(self, channel, message_id):
+        message = self.messages.get(message_id)
+        if message is None:
+            message = await channel.fetch_message(message_id)
+            self.stats['fetched'] += 1
+            self.messages[message_id] = message
+        return message
+
+    async def run(self, channel):
+        try:
+            while self.pending[channel]:
+                await asyncio.sleep(self.delay)
+                while self.pending[channel]:
+                    message_id, render = self.pending[channel].popitem()
+                    try:
+                        message = await self.message(channel, message_id)
+                        content = render()
+                        if message.content != content:
+                            await message.edit(content=content)
+                            self.stats['edited'] += 1
+                    except discord.NotFound:
+                        self.messages.pop(message_id, None)
+                        logging.warning(f"Message {message_id} in #{channel} is gone, edit dropped")
+                    except Exception:
+                        logging.exception(f"Editing message {message_id} in #{channel} failed")
+                    await asyncio.sleep(self.interval)
+        finally:
+            del self.workers[channel]
+            del self.pending[channel]
+
+    async def flush(self):
+        while self.workers:
+            await asyncio.gather(*self.workers.values())
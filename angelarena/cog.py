@@ -1,22 +1,41 @@
+import asyncio
 import logging
 import traceback
 import sys
-import imp
-import pickle
+import time
 
 import discord
 import discord.utils
 from discord.ext import commands
 
-from angelarena import tournament
+from angelarena import tournament, persistence, channels, actions, registry, rendering, sessions, metrics, profiling, imports, wizard, pairing, actors
+
+METRICS_TEXTFILE = 'metrics.prom' # for the node exporter textfile collector, None to disable
+METRICS_INTERVAL = 60 # seconds between textfile updates
+METRICS_PORT = None # port of a local /metrics endpoint, None to disable
+REPORT_DIRECTORY = 'reports' # profiler and memory reports
 
 class TournamentCog(commands.Cog):
     def __init__(self, bot, *args):
         super().__init__(*args)
 
         self.bot = bot
-        self.wizards = {}
-        self.tournaments = []
+        self.wizards = sessions.SessionStore() # user id -> wizard
+        self.tournaments = registry.TournamentRegistry()
+        self.messages = {} # message_id -> discord.Message, filled when channels are reconciled
+        self.open_tournament_top_message = None
+        self.edits = channels.EditScheduler(self.messages)
+        self.descriptions = rendering.DescriptionCache()
+        self.resizing = set() # ids of tournaments whose continuation messages are being posted or deleted
+        self.actions = actions.ActionExecutor()
+        self.pairing = pairing.PairingService()
+        self.actors = actors.TournamentActors() # events of one tournament run in order
+        self.journal = persistence.Journal()
+        self.writer = persistence.StateWriter(self.journal)
+        self.exporter = None
+        self.profiler = None
+        self.profile_events = None # gateway events left until the profiler stops
+        self.profile_channel = None
 
         self.load()
 
@@ -30,6 +49,41 @@ class TournamentCog(commands.Cog):
         await self.initiate_open_tournament_channel()
         await self.initiate_approve_tournament_channel()
 
+        if METRICS_TEXTFILE and self.exporter is None:
+            self.exporter = asyncio.create_task(self.export_metrics())
+        if METRICS_PORT:
+            await metrics.serve('127.0.0.1', METRICS_PORT)
+        if any(t.running for t in self.tournaments):
+            self.warm_pairing()
+
+    def warm_pairing(self):
+        # imports the pairing stack in the background before it is needed
+        if not tournament.system.loaded:
+            asyncio.get_running_loop().run_in_executor(None, imports.warm, tournament.system)
+
+    async def export_metrics(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, metrics.REGISTRY.write_textfile, METRICS_TEXTFILE)
+            except OSError:
+                logging.error("Writing metrics failed. Traceback: \n%s", traceback.format_exc())
+            await asyncio.sleep(METRICS_INTERVAL)
+
+    def cog_unload(self):
+        if self.exporter:
+            self.exporter.cancel()
+        if self.profiler:
+            self.profiler.stop()
+        self.pairing.close()
+        self.actors.close()
+
+    async def cog_before_invoke(self, ctx):
+        ctx.started = time.perf_counter()
+
+    async def cog_after_invoke(self, ctx):
+        metrics.REGISTRY.observe('bot_command_seconds', time.perf_counter() - ctx.started, name=ctx.command.qualified_name)
+
     async def initiate_open_tournament_channel(self):
         ch = discord.utils.get(self.bot.get_all_channels(), guild__name='Angel Arena', name='open-tournaments')
         self.open_tournament_channel = ch
@@ -37,26 +91,9 @@ class TournamentCog(commands.Cog):
         if not ch:
             logging.error("Channel #open-tournaments not found.")
 
-        # clear messages
-        ms = await ch.history(limit=200).flatten()
-        await ch.delete_messages(ms)
-
-        number_of_open_tournaments = sum(1 for _ in filter(lambda t: t.approval and not t.running, self.tournaments))
-        if number_of_open_tournaments == 0:
-            await ch.send(content="There are no open tournaments. You can register a new tournament by sending me a DM with `!register_tournament`.")
-        elif number_of_open_tournaments == 1:
-            await ch.send(content="There is one open tournament. Register for it by reacting with an emoji of your choice!")
-        else:
-            await ch.send(content=f"There are {number_of_open_tournaments} open tournaments. Register for them by reacting with an emoji of your choice!")
-
-        for t in filter(lambda t: t.approval and not t.running, self.tournaments):
-            try:
-                message = await self.open_tournament_channel.fetch_message(t.message_id)
-            except:
-                message = await self.open_tournament_channel.send(self.tournament_description(t))
-                t.message_id = message.id
-
-        await self.update_open_tournament_top_message()
+        tournaments = list(filter(lambda t: t.approval and not t.running, self.tournaments))
+        self.open_tournament_top_message, _ = await self.reconcile_channel(ch,
+                [(t, self.tournament_descriptions(t)) for t in tournaments], self.open_tournament_top_text())
 
     async def initiate_approve_tournament_channel(self):
         ch = discord.utils.get(self.bot.get_all_channels(), guild__name='Angel Arena', name='approve-tournaments')
@@ -65,36 +102,89 @@ class TournamentCog(commands.Cog):
         if not ch:
             logging.error("Channel #approve-tournaments not found.")
 
-        # clear messages
-        ms = await ch.history(limit=200).flatten()
-        await ch.delete_messages(ms)
-
-        for t in filter(lambda t: not t.approval and not t.running, self.tournaments):
+        tournaments = list(filter(lambda t: not t.approval and not t.running, self.tournaments))
+        await self.reconcile_channel(ch,
+                [(t, ["A new tournament was registered:\n{0}".format(self.tournament_description(t))]) for t in tournaments])
+
+    async def reconcile_channel(self, ch, wanted, header=None):
+        # Reads the history once and only edits, posts or deletes messages
+        # that differ from the wanted state, see channels.plan_reconciliation.
+        # wanted holds the message texts of every tournament, the first one
+        # goes to t.message_id and the rest to t.continuation_ids.
+        # Returns the header message and the messages of every tournament.
+        history = await ch.history(limit=200, oldest_first=True).flatten()
+        entries = []
+        for t, contents in wanted:
+            known = [t.message_id] + list(t.continuation_ids)
+            entries += [(known[k] if k < len(known) else None, content) for k, content in enumerate(contents)]
+        plan = channels.plan_reconciliation(history, entries, self.bot.user.id, header)
+
+        if plan.delete:
+            await self.delete_messages(ch, plan.delete)
+
+        async def apply(action, message, content):
+            if action == 'create':
+                message = await ch.send(content)
+            elif action == 'edit':
+                await message.edit(content=content)
+            self.messages[message.id] = message
+            return message
+
+        header_message = None
+        if plan.header:
+            header_message = await apply(*plan.header)
+
+        messages = []
+        planned = iter(plan.entries)
+        for t, contents in wanted:
+            tournament_messages = [await apply(*next(planned)) for _ in contents]
+            ids = [message.id for message in tournament_messages]
+            if ids != [t.message_id] + list(t.continuation_ids):
+                self.set(t, message_id=ids[0], continuation_ids=ids[1:])
+            messages.append(tournament_messages)
+
+        logging.info(f"Reconciled #{ch.name} with {len(history)} messages in {channels.writes(plan)} writes")
+        return header_message, messages
+
+    async def delete_messages(self, ch, messages):
+        for message in messages:
+            self.messages.pop(message.id, None)
+        # bulk deletion takes at most 100 messages younger than two weeks
+        for k in range(0, len(messages), 100):
+            chunk = messages[k:k+100]
             try:
-                message = await self.approve_tournament_channel.fetch_message(t.message_id)
-            except:
-                message = await self.approve_tournament_channel.send("A new tournament was registered:\n{0}".format(self.tournament_description(t)))
-                t.message_id = message.id
-
-    async def update_open_tournament_top_message(self):
-        m = (await self.open_tournament_channel.history(limit=1, oldest_first=True).flatten())[0]
+                await ch.delete_messages(chunk)
+            except discord.HTTPException:
+                for message in chunk:
+                    await message.delete()
 
+    def open_tournament_top_text(self):
         number_of_open_tournaments = sum(1 for _ in filter(lambda t: t.approval and not t.running, self.tournaments))
         if number_of_open_tournaments == 0:
-            await m.edit(content="There are no open tournaments. You can register a new tournament by sending me a DM with `!register_tournament`.")
+            return "There are no open tournaments. You can register a new tournament by sending me a DM with `!register_tournament`."
         elif number_of_open_tournaments == 1:
-            await m.edit(content="There is one open tournament. Register for it by reacting with an emoji of your choice!")
+            return "There is one open tournament. Register for it by reacting with an emoji of your choice!"
         else:
-            await m.edit(content=f"There are {number_of_open_tournaments} open tournaments. Register for them by reacting with an emoji of your choice!")
+            return f"There are {number_of_open_tournaments} open tournaments. Register for them by reacting with an emoji of your choice!"
+
+    async def update_open_tournament_top_message(self):
+        m = self.open_tournament_top_message
+        if m is None:
+            m = (await self.open_tournament_channel.history(limit=1, oldest_first=True).flatten())[0]
+            self.open_tournament_top_message = m
+
+        content = self.open_tournament_top_text()
+        if m.content != content:
+            await m.edit(content=content)
 
     async def announce_tournament(self, t):
         if not t.approval:
             message = await self.approve_tournament_channel.send("A new tournament was registered:\n{0}".format(self.tournament_description(t)))
-            t.message_id = message.id
+            self.set(t, message_id=message.id)
         else:
             await self.announcement_channel.send("A new tournament was registered:\n{0}".format(self.tournament_description(t)))
             message = await self.open_tournament_channel.send(self.tournament_description(t))
-            t.message_id = message.id
+            self.set(t, message_id=message.id)
             await self.update_open_tournament_top_message()
 
     async def add_tournament(self, t):
@@ -106,71 +196,91 @@ class TournamentCog(commands.Cog):
             t.approval = True
         else:
             t.approval = False
-        self.tournaments.append(t)
+        self.tournaments.add(t)
+        self.record('add', t, t)
         await self.announce_tournament(t)
 
     async def approve_tournament(self, message_id, user_id, emoji):
-        t = next(filter(lambda t: t.message_id == message_id, self.tournaments), None)
+        t = self.tournaments.find('message_id', message_id)
 
         if not t:
             logging.error(f"Could not find approval-awaiting tournament connected to this message_id: {message_id}")
             return
 
         user = self.guild.get_member(user_id)
-        message = await self.approve_tournament_channel.fetch_message(message_id)
+        message = await self.edits.message(self.approve_tournament_channel, message_id)
 
         if emoji.name == '👍':
-            t.approval = True
+            self.set(t, approval=True)
             await message.delete()
+            self.messages.pop(message.id, None)
             await self.announce_tournament(t)
         elif emoji.name == '👎':
             t.approval = False
             await message.delete()
-            self.tournaments.remove(t)
+            self.messages.pop(message.id, None)
+            self.tournaments.archive(t)
+            self.record('archive', t)
             del t
 
-    async def prepare_tournament(self, t):
+    def progress_reporter(self, channel, text):
+        # Keeps one status message in `channel` up to date while a bulk action runs
+        status = None
+
+        async def report(done, total, failed):
+            nonlocal status
+            content = f"{text}: {done}/{total}" + (f" ({failed} failed)" if failed else "")
+            if status is None:
+                status = await channel.send(content)
+            elif status.content != content:
+                await status.edit(content=content)
+        return report
+
+    async def prepare_tournament(self, t, status_channel=None):
         role = await self.guild.create_role(name=t.title, mentionable=True)
-        t.role_id = role.id
         category = await self.guild.create_category(t.title, position=10000, overwrites = {
             self.guild.default_role: discord.PermissionOverwrite(read_messages=False),
             role: discord.PermissionOverwrite(read_messages=True)
             })
-        t.category_id = category.id
         lobby = await category.create_text_channel("Lobby")
-        t.lobby_id = lobby.id
         results = await category.create_text_channel("Results")
-        t.results_id = results.id
         check_in = await category.create_text_channel("Check-in")
-        t.check_in_id = check_in.id
         bot_commands = await category.create_text_channel("Bot-commands")
-        t.bot_commands_id = bot_commands.id
+        self.set(t, role_id=role.id, category_id=category.id, lobby_id=lobby.id, results_id=results.id,
+                check_in_id=check_in.id, bot_commands_id=bot_commands.id)
 
-        for p_id in t.participants:
-            p = self.guild.get_member(p_id)
-            await p.add_roles(role)
+        async def add_role(p_id):
+            await self.guild.get_member(p_id).add_roles(role)
+
+        progress = self.progress_reporter(status_channel, "Adding participants to the tournament role") if status_channel else None
+        await self.actions.run('add_roles', add_role, t.participants, progress)
 
-        t.running = True
-        message = await self.open_tournament_channel.fetch_message(t.message_id)
-        await message.delete()
+        self.set(t, running=True)
+        for message_id in [t.message_id] + list(t.continuation_ids):
+            message = await self.edits.message(self.open_tournament_channel, message_id)
+            await message.delete()
+            self.messages.pop(message.id, None)
+        self.descriptions.forget(t)
 
         await lobby.send("{0} Welcome in this tournament lobby. We're in the check-in phase until ... (I need to implement this).".format(role.mention))
 
-        for p_id in t.participants:
+        async def start_check_in(p_id):
             p = self.guild.get_member(p_id)
-            dm_channel = await p.create_dm()
-            self.wizards[dm_channel] = tournament.TournamentCheckInWizard(self, t, p)
-            await self.wizards[dm_channel].on_message(None)
+            self.wizards[p.id] = tournament.TournamentCheckInWizard(self, t, p)
+            await self.wizards[p.id].on_message(None)
+
+        progress = self.progress_reporter(status_channel, "Sending check-in messages") if status_channel else None
+        await self.actions.run('check_in_dm', start_check_in, t.participants, progress)
 
     async def delete_tournament(self, t):
         category = self.guild.get_channel(t.category_id)
         role = self.guild.get_role(t.role_id)
 
-        for ch in category.channels:
-            await ch.delete()
+        await self.actions.run('delete_channel', lambda ch: ch.delete(), category.channels)
         await category.delete()
         await role.delete()
-        self.tournaments.remove(t)
+        self.tournaments.archive(t)
+        self.record('archive', t)
         del t
 
     @commands.command(name='update')
@@ -180,13 +290,11 @@ class TournamentCog(commands.Cog):
 
     @commands.command(name='register_tournament', aliases=['new_tournament'])
     async def _register_tournament(self, ctx):
-        dm_channel = await ctx.author.create_dm()
-
-        self.wizards[dm_channel] = tournament.TournamentCreationWizard(self, ctx.author)
+        self.wizards[ctx.author.id] = tournament.TournamentCreationWizard(self, ctx.author)
 
         ctx.content = ""
         if not isinstance(ctx.channel, discord.DMChannel):
-            await self.wizards[dm_channel].on_message(ctx)
+            await self.wizards[ctx.author.id].on_message(ctx)
             await ctx.channel.send("{0}, I have sent you a DM!".format(ctx.author.mention))
 
     @commands.command(name='kickoff', aliases=['start'])
@@ -196,7 +304,7 @@ class TournamentCog(commands.Cog):
             await ctx.channel.send("No argument found. Usage: `!kickoff <tournament title>`")
             return
 
-        t = next(filter(lambda x: x.title == title, self.tournaments), None)
+        t = self.tournaments.by_title(title)
         if not t:
             await ctx.channel.send("No tournament called `{0}` found.".format(title))
             return
@@ -205,12 +313,23 @@ class TournamentCog(commands.Cog):
             await ctx.channel.send("You are not the TO for this tournament.")
             return
 
-        await self.prepare_tournament(t)
+        await self.actors.run(t.id, 'kickoff', self.kickoff, ctx, t)
+
+    async def kickoff(self, ctx, t):
+        if t.running:
+            await ctx.channel.send("This tournament has already started.")
+            return
+
+        self.warm_pairing()
+        await self.prepare_tournament(t, ctx.channel)
         await ctx.channel.send("Tournament lobby prepared. Good luck and have fun!")
 
+        if isinstance(t, tournament.SSSTournament):
+            await ctx.channel.send(t.suggestion())
+
     @commands.command(name='abort', aliases=['delete'])
     async def _abort(self, ctx, *args):
-        t = next(filter(lambda t: t.category_id == ctx.channel.category.id, self.tournaments), None)
+        t = self.tournaments.by_channel(ctx.channel)
         if not t:
             await ctx.channel.send("Use this command only in a tournament lobby.")
             return
@@ -223,71 +342,225 @@ class TournamentCog(commands.Cog):
             await ctx.channel.send("If you are really sure, that you want to abort this tournament, type `!abort I am really sure`.")
             return
 
-        await self.delete_tournament(t)
+        await self.actors.run(t.id, 'abort', self.delete_tournament, t)
 
     @commands.command(name='checkin', aliases=['check-in', 'check'])
     async def _checkin(self, ctx, *args):
-        t = next(filter(lambda t: t.category_id == ctx.message.channel.category_id, self.tournaments), None)
+        t = self.tournaments.by_channel(ctx.channel)
         if not t:
             await ctx.channel.send("Please use this command in a tournament channel")
             return
 
-        dm_channel = await ctx.author.create_dm()
-        self.wizards[dm_channel] = tournament.TournamentCheckInWizard(self, t, ctx.author)
-        await self.wizards[dm_channel].on_message(None)
+        self.wizards[ctx.author.id] = tournament.TournamentCheckInWizard(self, t, ctx.author)
+        await self.wizards[ctx.author.id].on_message(None)
+
+    @commands.command(name='results', aliases=['report'])
+    async def _results(self, ctx, *args):
+        t = self.tournaments.by_channel(ctx.channel)
+        if not t or not isinstance(t, tournament.PairedTournament):
+            await ctx.channel.send("Use this command only in a tournament lobby.")
+            return
+
+        if not ctx.author.id == t.organizer_id:
+            await ctx.channel.send("You are not the TO for this tournament.")
+            return
+
+        if len(args) == 0:
+            await ctx.channel.send("No results found. Usage: `!results <table> <c|r|d> [<table> <c|r|d> ...]`")
+            return
+
+        if self.pairing.busy(t.id):
+            await ctx.channel.send("The next round is being paired, results cannot be changed any more.")
+            return
+
+        await self.actors.run(t.id, 'results', self.report_results, ctx, t, args, len(t.system.rounds))
+
+    async def report_results(self, ctx, t, args, round_number):
+        # `round_number` is the round when the command came in, an earlier
+        # event of the tournament may have finished it since
+        if len(t.system.rounds) != round_number:
+            await ctx.channel.send(f"Round {round_number} was already finished, no results recorded.")
+            return
+
+        try:
+            results = t.parse_results(args)
+            open_matches = t.system.report_results(results)
+        except Exception as e:
+            await ctx.channel.send(f"No results recorded: {e}")
+            return
+        self.record('results', t, results)
+
+        if open_matches:
+            self.pairing.speculate(t.id, t.system)
+            await ctx.channel.send(f"Recorded {len(args)//2} results, {open_matches} matches still open.")
+            return
+
+        await ctx.channel.send(f"Recorded {len(args)//2} results. Round {len(t.system.rounds)} is finished.")
+        await self.advance_tournament(t, ctx.channel)
+
+    @commands.command(name='pair')
+    async def _pair(self, ctx, *args):
+        t = self.tournaments.by_channel(ctx.channel)
+        if not t or not isinstance(t, tournament.PairedTournament):
+            await ctx.channel.send("Use this command only in a tournament lobby.")
+            return
+
+        if not ctx.author.id == t.organizer_id:
+            await ctx.channel.send("You are not the TO for this tournament.")
+            return
+
+        if args == ('cancel',):
+            if self.pairing.cancel(t.id):
+                await ctx.channel.send("Cancelling the pairing.")
+            else:
+                await ctx.channel.send("No pairing in progress.")
+            return
+
+        await self.actors.run(t.id, 'pair', self.pair_round, ctx, t)
+
+    async def pair_round(self, ctx, t):
+        if t.system.open_matches():
+            await ctx.channel.send(f"Round {len(t.system.rounds)} still has {t.system.open_matches()} open matches.")
+            return
+
+        if not t.system.rounds and not t.system.players:
+            # check-in does not add players yet, everyone who signed up plays
+            for user_id in t.participants:
+                t.system.add_new_player(user_id)
+                self.record('add_player', t, user_id)
+
+        await self.advance_tournament(t, ctx.channel)
+
+    async def advance_tournament(self, t, channel):
+        # Finishes the open round and pairs the next one in a worker process,
+        # see pairing.PairingService
+        finish = t.system.round_in_progress()
+        try:
+            round = await self.pairing.advance(t.id, t.system, finish=finish)
+        except Exception as e:
+            await channel.send(f"Pairing failed: {e}")
+            return
+
+        if finish:
+            self.record('finish', t)
+        if round is None and isinstance(t, tournament.DSSCutTournament) and not t.in_cut() and t.system.over():
+            try:
+                t.start_cut()
+            except Exception as e:
+                await channel.send(f"The cut could not be started: {e}")
+                return
+            self.record('cut', t)
+            kind = "double" if t.system.double else "single"
+            await channel.send(f"The Swiss rounds are over. The top {len(t.system.seeds)} play a {kind} elimination cut.")
+            return await self.advance_tournament(t, channel)
+        if round is None:
+            champion = t.system.champion() if hasattr(t.system, 'champion') else None
+            if champion is not None:
+                await channel.send(f"The tournament is over. Congratulations to <@{champion.member}>!")
+            else:
+                await channel.send("The tournament is over. Congratulations to the winner!" if finish else "Not enough players for another round.")
+            return
+        store = t.system.store
+        tables = slice(t.system.finished_matches, store.match_count)
+        self.record('pair', t, store.match_corp[tables].tolist(), store.match_runner[tables].tolist())
+        for text in rendering.pairings(len(t.system.rounds), round):
+            await channel.send(text)
 
     async def tournament_registration(self, message_id, user_id, emoji, add=True):
-        t = next(filter(lambda x: x.message_id == message_id, self.tournaments), None)
+        t = self.tournaments.find('message_id', message_id)
 
         if not t:
             logging.error(f"Could not find tournament connected to this message_id: {message_id}")
             return
 
-        message = await self.open_tournament_channel.fetch_message(t.message_id)
-
         if add and not user_id in t.participants:
-            t.participants.append(user_id)
-            await message.edit(content=self.tournament_description(t))
+            t.add_participant(user_id)
+            self.record('join', t, user_id)
+            self.schedule_description_edit(t)
             logging.info(f"{user_id} joined tournament '{t}'")
 
         if not add and user_id in t.participants:
-            t.participants.remove(user_id)
-            await message.edit(content=self.tournament_description(t))
+            t.remove_participant(user_id)
+            self.record('leave', t, user_id)
+            self.schedule_description_edit(t)
             logging.info(f"{user_id} left tournament '{t}'")
 
-    def tournament_description(self, tournament):
-        lines = tournament.desc.split('\n')
-        desc = '\n'.join(['> %s'%x for x in lines])
-        participants_text = ""
-        if len(tournament.participants) > 0:
-            participants_text = "\n**Participants ({0}):** {1}".format(len(tournament.participants), ', '.join([self.guild.get_member(p_id).mention for p_id in tournament.participants]))
-
-        return f"**Title:** {tournament.title}\n**Organizer:** {self.guild.get_member(tournament.organizer_id).mention}\n**Format:** {tournament.format}\n**Tournament system:** {tournament.system_text}\nAdditional information:\n{desc}{participants_text}"
+    def schedule_description_edit(self, t):
+        # a burst of sign-ups ends up as one edit per message with the latest participants
+        ids = [t.message_id] + list(t.continuation_ids)
+        for k, message_id in enumerate(ids):
+            self.edits.schedule(self.open_tournament_channel, message_id, lambda k=k: self.tournament_description(t, k))
+        if len(self.tournament_descriptions(t)) != len(ids):
+            asyncio.ensure_future(self.resize_description(t))
+
+    async def resize_description(self, t):
+        # Posts or deletes continuation messages until the description has
+        # one message per part
+        if t.id in self.resizing:
+            return
+        self.resizing.add(t.id)
+        try:
+            while not t.running:
+                parts = self.tournament_descriptions(t)
+                ids = list(t.continuation_ids)
+                if len(parts) > 1 + len(ids):
+                    message = await self.open_tournament_channel.send(parts[1 + len(ids)])
+                    self.messages[message.id] = message
+                    ids.append(message.id)
+                elif len(parts) < 1 + len(ids):
+                    message = await self.edits.message(self.open_tournament_channel, ids.pop())
+                    await message.delete()
+                    self.messages.pop(message.id, None)
+                else:
+                    break
+                self.set(t, continuation_ids=ids)
+        finally:
+            self.resizing.discard(t.id)
+
+    def tournament_descriptions(self, tournament):
+        return self.descriptions.render(tournament)
+
+    def tournament_description(self, tournament, part=0):
+        parts = self.tournament_descriptions(tournament)
+        # parts that are about to be deleted by resize_description
+        return parts[part] if part < len(parts) else rendering.CONTINUED
 
     @commands.Cog.listener()
+    @metrics.REGISTRY.instrument('bot_listener_seconds', name='on_raw_reaction_add')
     async def on_raw_reaction_add(self, payload):
+        key = self.tournament_key(payload.message_id)
         if payload.channel_id == self.open_tournament_channel.id:
-            await self.tournament_registration(payload.message_id, payload.user_id, payload.emoji, add=True)
+            await self.actors.run(key, 'join', self.tournament_registration, payload.message_id, payload.user_id, payload.emoji, True)
 
         if payload.channel_id == self.approve_tournament_channel.id:
-            await self.approve_tournament(payload.message_id, payload.user_id, payload.emoji)
+            await self.actors.run(key, 'approve', self.approve_tournament, payload.message_id, payload.user_id, payload.emoji)
 
     @commands.Cog.listener()
+    @metrics.REGISTRY.instrument('bot_listener_seconds', name='on_raw_reaction_remove')
     async def on_raw_reaction_remove(self, payload):
         if payload.channel_id == self.open_tournament_channel.id:
-            await self.tournament_registration(payload.message_id, payload.user_id, payload.emoji, add=False)
+            key = self.tournament_key(payload.message_id)
+            await self.actors.run(key, 'leave', self.tournament_registration, payload.message_id, payload.user_id, payload.emoji, False)
+
+    def tournament_key(self, message_id):
+        # Queue for reactions on the message, see actors.py. The handler looks
+        # the tournament up again once it runs, reactions on unknown messages
+        # share one queue.
+        t = self.tournaments.find('message_id', message_id)
+        return t.id if t else None
 
     @commands.Cog.listener()
+    @metrics.REGISTRY.instrument('bot_listener_seconds', name='on_message')
     async def on_message(self, ctx):
         if ctx.author == self.bot.user:
             return
 
-        if ctx.channel in self.wizards:
+        if isinstance(ctx.channel, discord.DMChannel) and ctx.author.id in self.wizards:
             try:
-                await self.wizards[ctx.channel].on_message(ctx)
+                await self.wizards[ctx.author.id].on_message(ctx)
             except:
                 logging.error("Wizard failed in channel %s. Removing wizard. Traceback: \n%s", ctx.channel, traceback.format_exc())
-                del self.wizards[ctx.channel]
+                self.wizards.pop(ctx.author.id)
 
     @commands.command()
     @commands.has_permissions(administrator=True)
@@ -299,36 +572,138 @@ class TournamentCog(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def _save(self, ctx):
         self.save()
-        await ctx.channel.send("Saved state!")
+        await self.writer.flush()
+        await ctx.channel.send(f"Saved state! {self.writer.report()}")
 
     @commands.command(name='load')
     @commands.has_permissions(administrator=True)
     async def _load(self, ctx):
+        await self.writer.flush()
         self.load()
         await ctx.channel.send("Loaded previous state!")
 
+    @commands.command(name='stats')
+    @commands.has_permissions(administrator=True)
+    async def _stats(self, ctx):
+        await ctx.channel.send(metrics.summary())
+
+    @commands.command(name='profile')
+    @commands.has_permissions(administrator=True)
+    async def _profile(self, ctx, *args):
+        usage = "Usage: `!profile <seconds>`, `!profile <number> events` or `!profile stop`"
+        if args == ('stop',):
+            if not self.profiler:
+                await ctx.channel.send("The profiler is not running.")
+                return
+            await self.finish_profile()
+            return
+
+        if not args or not args[0].isdigit() or not args[1:] in [(), ('events',)] or int(args[0]) == 0:
+            await ctx.channel.send(usage)
+            return
+        if self.profiler:
+            await ctx.channel.send("The profiler is already running, see `!profile stop`.")
+            return
+
+        amount = int(args[0])
+        self.profiler = profiling.SamplingProfiler()
+        self.profile_channel = ctx.channel
+        self.profiler.start()
+        if args[1:] == ('events',):
+            self.profile_events = amount
+            await ctx.channel.send(f"Profiling the next {amount} events.")
+        else:
+            profiler = self.profiler
+            await ctx.channel.send(f"Profiling for {amount} seconds.")
+            await asyncio.sleep(amount)
+            if self.profiler is profiler:
+                await self.finish_profile()
+
+    async def finish_profile(self):
+        profile = self.profiler.stop()
+        self.profiler = None
+        self.profile_events = None
+        loop = asyncio.get_running_loop()
+        path = await loop.run_in_executor(None, lambda: profiling.write_report(REPORT_DIRECTORY, 'profile', profile.summary()))
+        await self.profile_channel.send(f"Profile of {profile.seconds:.1f}s written to `{path}`.", file=discord.File(path))
+
+    @commands.Cog.listener()
+    async def on_socket_response(self, msg):
+        if self.profile_events is None:
+            return
+        self.profile_events -= 1
+        if self.profile_events == 0:
+            self.profile_events = None
+            await self.finish_profile()
+
+    @commands.command(name='memory')
+    @commands.has_permissions(administrator=True)
+    async def _memory(self, ctx, *args):
+        usage = "Usage: `!memory start [frames]`, `!memory baseline`, `!memory snapshot` or `!memory stop`"
+        memory = profiling.MEMORY
+        if args[:1] == ('start',) and all(x.isdigit() for x in args[1:2]) and len(args) <= 2:
+            frames = int(args[1]) if len(args) == 2 else 1
+            memory.start(frames)
+            await ctx.channel.send(f"Tracing memory allocations with {frames} frames per traceback, baseline taken.")
+        elif not args in [('baseline',), ('snapshot',), ('stop',)]:
+            await ctx.channel.send(usage)
+        elif not memory.tracing:
+            await ctx.channel.send("Memory allocations are not traced, see `!memory start`.")
+        elif args == ('baseline',):
+            memory.reset_baseline()
+            await ctx.channel.send("New baseline taken.")
+        elif args == ('snapshot',):
+            loop = asyncio.get_running_loop()
+            path = await loop.run_in_executor(None, lambda: profiling.write_report(REPORT_DIRECTORY, 'memory', memory.summary()))
+            await ctx.channel.send(f"Memory report written to `{path}`.", file=discord.File(path))
+        else:
+            memory.stop()
+            await ctx.channel.send("Stopped tracing memory allocations.")
+
+    def set(self, t, **attributes):
+        # attribute changes go through the registry so its indexes stay valid
+        self.tournaments.set(t, attributes)
+        self.record('set', t, attributes)
+
+    def record(self, op, t, *args):
+        # Every change is encoded into the journal right away and written by
+        # the background writer, the snapshot is only rewritten once enough
+        # changes have piled up.
+        self.writer.submit_record(self.journal.encode(op, t, *args))
+        if self.journal.needs_compaction():
+            self.save()
+
     def save(self):
         logging.info("Saving bot data")
-        f = open('tournaments.p', 'wb')
-        pickle.dump(self.tournaments, f)
-        f.close()
+        self.writer.submit_snapshot(self.journal.encode_snapshot(self.tournaments, self.wizards.dump()))
 
     def load(self):
         logging.info("Loading bot data")
         try:
-            f = open('tournaments.p', 'rb')
-            self.tournaments = pickle.load(f)
-            f.close()
+            self.tournaments = self.journal.load()
+            self.wizards = sessions.SessionStore()
+            self.wizards.restore(self.journal.sessions, self.restore_wizard)
         except:
             logging.info("Loading bot data failed")
 
+    def restore_wizard(self, user_id, kind, state):
+        person = self.bot.get_user(user_id)
+        if person is None:
+            return None
+        return tournament.WIZARDS[kind].restore(self, person, state)
+
 def setup(bot):
-    imp.reload(tournament)
+    # only modules without state of their own, and only if they were edited
+    imports.reload_changed(wizard, rendering, tournament)
     cog = TournamentCog(bot)
     bot.add_cog(cog)
+    metrics.install(bot)
     logging.info('Tournament cog loaded.')
 
 def teardown(bot):
-    bot.get_cog("TournamentCog").save()
+    cog = bot.get_cog("TournamentCog")
+    cog.save()
+    cog.writer.close()
     bot.remove_cog("TournamentCog")
+    metrics.uninstall(bot)
     logging.info('Tournament cog unloaded.')
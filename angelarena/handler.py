@@ -1,3 +1,7 @@
+from angelarena import imports
+
+system = imports.module('angelarena.system')
+
 class Player(object):
     def __init__(self, discord_member):
         self.member = discord_member
@@ -8,12 +12,15 @@ class Deck(object):
     pass
 
 class TournamentHandler(object):
-    def __init__(self):
+    def __init__(self, system=None):
         self.players = []
         self.rounds = []
+        self.system = system # pairs the rounds, see angelarena.system
 
     def populate(self, members):
         self.players = [Player(m) for m in members]
+        for m in members:
+            self.system.add_new_player(m)
 
     def get_player(self, member):
         return next(filter(lambda p: p.member == member, self.players), None)
@@ -24,8 +31,14 @@ class TournamentHandler(object):
         p.runner = runner
 
     def pair_round(self):
-        pass
+        round = self.system.pair_new_round()
+        self.rounds.append(round)
+        return round
 
 class SSSHandler(TournamentHandler):
-    def __init__(self):
-        self.players = []
+    def __init__(self, max_losses=3, max_rounds=None):
+        super().__init__(system.SSSSystem(max_losses, max_rounds))
+
+class DSSHandler(TournamentHandler):
+    def __init__(self, max_rounds=None):
+        super().__init__(system.DSSSystem(max_rounds))
@@ -0,0 +1,59 @@
+import importlib
+import logging
+import os
+import sys
+
+# The pairing stack (numpy, networkx) takes longer to import than the rest of
+# the bot together, but is only needed once a tournament starts. Modules the
+# bot needs right away refer to it through LazyModule, which imports it on
+# first use. This module is not reloaded with the cog, so it remembers which
+# source files were already loaded.
+
+class LazyModule(object):
+    # Stands in for the module `name` until one of its attributes is used
+    def __init__(self, name):
+        self.__dict__['name'] = name
+        self.__dict__['module'] = None
+
+    @property
+    def loaded(self):
+        return self.module is not None or self.name in sys.modules
+
+    def load(self):
+        if self.module is None:
+            self.__dict__['module'] = importlib.import_module(self.name)
+        return self.module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self.load(), attribute, value)
+
+    def __repr__(self):
+        return f"<lazy module '{self.name}'{' (loaded)' if self.module is not None else ''}>"
+
+def module(name):
+    return LazyModule(name)
+
+def warm(*modules):
+    # Imports lazy modules ahead of time, meant to run in an executor
+    for m in modules:
+        m.load()
+
+mtimes = {} # module name -> modification time of the source when it was loaded
+
+def reload_changed(*modules):
+    # Reloads the modules whose source changed since they were loaded. The
+    # modules come in import order, everything after a reloaded module is
+    # reloaded too since it may hold on to its old classes. Returns the
+    # reloaded modules.
+    reloaded = []
+    for m in modules:
+        mtime = os.path.getmtime(m.__file__)
+        if reloaded or m.__name__ in mtimes and mtimes[m.__name__] != mtime:
+            importlib.reload(m)
+            reloaded.append(m)
+            logging.info(f"Reloaded {m.__name__}")
+        mtimes[m.__name__] = mtime
+    return reloaded
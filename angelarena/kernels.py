@@ -0,0 +1,85 @@
+import numpy as np
+
+class PairingKernel(object):
+    # Computes the pairing weights of the Swiss systems
+    #
+    #   (20000 - score penalty - side penalty - repair penalty) * bye bonus + noise
+    #
+    # Systems where everyone plays both sides every round leave out the side
+    # penalty.
+    # with in-place ufuncs on buffers that are kept between calls. Buffers only
+    # grow, smaller fields of later rounds use views on the same memory.
+    def __init__(self, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        if not self.dtype in (np.dtype(np.float64), np.dtype(np.float32)):
+            raise Exception(f"Unsupported pairing matrix dtype {self.dtype}")
+        self.buffers = {}
+
+    def __getstate__(self):
+        return {'dtype': self.dtype, 'buffers': {}}
+
+    def buffer(self, name, shape, dtype):
+        size = int(np.prod(shape))
+        flat = self.buffers.get(name)
+        if flat is None or len(flat) < size or flat.dtype != dtype:
+            flat = np.empty(max(size, 2*len(flat) if flat is not None else 0), dtype=dtype)
+            self.buffers[name] = flat
+        return flat[:size].reshape(shape)
+
+    def __call__(self, score, side_balance, byes, opponents, idx, rng, score_factor=1, repair_penalty=10000, out=None, side_penalty=True):
+        n = len(idx)
+        if out is None:
+            out = self.buffer('out', (n, n), self.dtype)
+        w = out
+        tmp = self.buffer('tmp', (n, n), self.dtype)
+        same = self.buffer('same', (n, n), bool)
+        rows = self.buffer('rows', (n, opponents.shape[1]), opponents.dtype)
+        pairs = self.buffer('pairs', (n, n), opponents.dtype)
+
+        s = score[idx].astype(self.dtype)
+        d = side_balance[idx]
+        b = byes[idx].astype(self.dtype)
+
+        # score penalty
+        np.subtract(s[:, None], s[None, :], out=w)
+        np.abs(w, out=w)
+        if score_factor != 1:
+            w *= score_factor
+
+        # side penalty: 8**min(|bias|) for players biased to the same side
+        if side_penalty:
+            sign = np.sign(d)
+            np.equal(sign[:, None], sign[None, :], out=same)
+            same &= (sign != 0)[:, None]
+            np.fill_diagonal(same, False)
+            bias = np.abs(d).astype(self.dtype)
+            np.minimum(bias[:, None], bias[None, :], out=tmp)
+            tmp *= 3
+            np.exp2(tmp, out=tmp)
+            np.multiply(tmp, same, out=tmp)
+            w += tmp
+
+        # repair penalty
+        np.take(opponents, idx, axis=0, out=rows, mode='clip')
+        np.take(rows, idx, axis=1, out=pairs, mode='clip')
+        np.multiply(pairs, repair_penalty, out=tmp, dtype=self.dtype)
+        w += tmp
+
+        np.subtract(20000, w, out=w)
+
+        # bye bonus
+        np.subtract(b[:, None], b[None, :], out=tmp)
+        np.abs(tmp, out=tmp)
+        tmp += 1
+        w *= tmp
+
+        noise(rng, tmp)
+        w += tmp
+        return w
+
+def noise(rng, out):
+    # uniform integers 0..9 drawn straight into a float buffer
+    rng.random(out=out, dtype=out.dtype)
+    out *= 10
+    np.floor(out, out=out)
+    return out
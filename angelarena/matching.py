@@ -0,0 +1,363 @@
+import collections
+
+import networkx as nx
+import numpy as np
+
+class MatchingEngine(object):
+    name = "undefined"
+
+    def match(self, weights, mask=None):
+        # Returns a maximum cardinality matching with maximum total weight as a
+        # list of index pairs (i, j) with i < j. Only the upper triangle of
+        # `weights` is used. `mask` restricts the candidate edges, by default
+        # the graph is complete.
+        raise NotImplementedError
+
+    @staticmethod
+    def symmetric(weights):
+        upper = np.triu(weights, 1)
+        return upper + upper.T
+
+    @staticmethod
+    def edge_mask(weights, mask):
+        if mask is None:
+            mask = np.ones(weights.shape, dtype=bool)
+        else:
+            mask = mask | mask.T
+        np.fill_diagonal(mask, False)
+        return mask
+
+class NetworkXEngine(MatchingEngine):
+    name = "networkx"
+
+    def match(self, weights, mask=None):
+        mask = self.edge_mask(weights, mask)
+        rows, cols = np.nonzero(np.triu(mask, 1))
+
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(weights)))
+        graph.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(), weights[rows, cols].tolist()))
+        pairings = nx.max_weight_matching(graph, maxcardinality=True)
+        return sorted(tuple(sorted(p)) for p in pairings)
+
+class BlossomEngine(MatchingEngine):
+    name = "blossom"
+
+    def match(self, weights, mask=None):
+        n = len(weights)
+        if n < 2:
+            return []
+
+        mask = self.edge_mask(weights, mask)
+        if not mask.any():
+            return []
+
+        # Integer weights shifted so that every candidate edge is positive and a
+        # matching with more edges always outweighs one with fewer. That turns
+        # the maximum weight matching into a maximum cardinality one.
+        w = np.rint(self.symmetric(weights)).astype(np.int64)
+        w_min = w[mask].min()
+        w_range = w[mask].max() - w_min
+        shifted = np.where(mask, w - w_min + (n//2)*w_range + 1, 0)
+
+        mate = DenseBlossom(shifted).solve()
+        return [(i, int(j)) for i, j in enumerate(mate) if i < j]
+
+# Dense O(n^3) primal-dual blossom algorithm for maximum weight matching in a
+# general graph. Vertices are 1..n, blossoms n+1..2n and 0 means "none".
+# Labels are kept doubled (lab = 2*dual) so all arithmetic stays integral.
+# The per-vertex edge scans, slack bookkeeping and dual updates work on whole
+# rows of the matrix at once, everything else follows the textbook algorithm.
+class DenseBlossom(object):
+    def __init__(self, weights):
+        n = len(weights)
+        size = 2*n + 1
+        self.n = n
+        self.n_x = n
+
+        # g[a][b] is the edge (gu, gv, gw) used between vertices/blossoms a and b
+        self.gw = np.zeros((size, size), dtype=np.int64)
+        self.gw[1:n+1, 1:n+1] = 2*weights
+        idx = np.arange(size, dtype=np.int64)
+        self.gu = np.zeros((size, size), dtype=np.int64)
+        self.gu[1:n+1, 1:n+1] = idx[1:n+1, None]
+        self.gv = np.zeros((size, size), dtype=np.int64)
+        self.gv[1:n+1, 1:n+1] = idx[None, 1:n+1]
+
+        self.lab = np.zeros(size, dtype=np.int64)
+        self.match = np.zeros(size, dtype=np.int64)
+        self.slack = np.zeros(size, dtype=np.int64)
+        self.st = np.arange(size, dtype=np.int64)
+        self.st[n+1:] = 0
+        self.pa = np.zeros(size, dtype=np.int64)
+        self.S = np.full(size, -1, dtype=np.int64)
+        self.vis = np.zeros(size, dtype=np.int64)
+        self.vis_stamp = 0
+
+        self.flower = [[] for _ in range(size)]
+        self.flower_from = np.zeros((size, n+1), dtype=np.int64)
+        self.flower_from[idx[1:n+1], idx[1:n+1]] = idx[1:n+1]
+
+        self.queue = collections.deque()
+
+    def solve(self):
+        n = self.n
+        self.lab[1:n+1] = self.gw[1:n+1, 1:n+1].max()
+        while self.matching():
+            pass
+        return self.match[1:n+1] - 1
+
+    def e_delta(self, a, b):
+        return self.lab[self.gu[a, b]] + self.lab[self.gv[a, b]] - 2*self.gw[a, b]
+
+    def update_slack(self, u, x):
+        sx = self.slack[x]
+        if not sx or self.e_delta(u, x) < self.e_delta(sx, x):
+            self.slack[x] = u
+
+    def set_slack(self, x):
+        n = self.n
+        st = self.st[1:n+1]
+        candidates = (self.gw[1:n+1, x] > 0) & (st != x) & (self.S[st] == 0)
+        if not candidates.any():
+            self.slack[x] = 0
+            return
+        us = np.flatnonzero(candidates) + 1
+        delta = self.e_delta(us, x)
+        self.slack[x] = us[np.argmin(delta)]
+
+    def q_push(self, x):
+        if x <= self.n:
+            self.queue.append(x)
+        else:
+            for y in self.flower[x]:
+                self.q_push(y)
+
+    def set_st(self, x, b):
+        self.st[x] = b
+        if x > self.n:
+            for y in self.flower[x]:
+                self.set_st(y, b)
+
+    def get_pr(self, b, xr):
+        flower = self.flower[b]
+        pr = flower.index(xr)
+        if pr % 2 == 1:
+            flower[1:] = flower[:0:-1]
+            return len(flower) - pr
+        return pr
+
+    def set_match(self, u, v):
+        self.match[u] = self.gv[u, v]
+        if u > self.n:
+            xr = self.flower_from[u, self.gu[u, v]]
+            pr = self.get_pr(u, xr)
+            flower = self.flower[u]
+            for i in range(pr):
+                self.set_match(flower[i], flower[i ^ 1])
+            self.set_match(xr, v)
+            flower[:] = flower[pr:] + flower[:pr]
+
+    def augment(self, u, v):
+        while True:
+            xnv = self.st[self.match[u]]
+            self.set_match(u, v)
+            if not xnv:
+                return
+            self.set_match(xnv, self.st[self.pa[xnv]])
+            u, v = self.st[self.pa[xnv]], xnv
+
+    def get_lca(self, u, v):
+        self.vis_stamp += 1
+        while u or v:
+            if u:
+                if self.vis[u] == self.vis_stamp:
+                    return u
+                self.vis[u] = self.vis_stamp
+                u = self.st[self.match[u]]
+                if u:
+                    u = self.st[self.pa[u]]
+            u, v = v, u
+        return 0
+
+    def add_blossom(self, u, lca, v):
+        n = self.n
+        b = n + 1
+        while b <= self.n_x and self.st[b]:
+            b += 1
+        if b > self.n_x:
+            self.n_x += 1
+
+        self.lab[b] = 0
+        self.S[b] = 0
+        self.match[b] = self.match[lca]
+        flower = [lca]
+        x = u
+        while x != lca:
+            y = self.st[self.match[x]]
+            flower += [x, y]
+            self.q_push(y)
+            x = self.st[self.pa[y]]
+        flower[1:] = flower[:0:-1]
+        x = v
+        while x != lca:
+            y = self.st[self.match[x]]
+            flower += [x, y]
+            self.q_push(y)
+            x = self.st[self.pa[y]]
+        self.flower[b] = flower
+        self.set_st(b, b)
+
+        n_x = self.n_x
+        self.gw[b, 1:n_x+1] = 0
+        self.gw[1:n_x+1, b] = 0
+        self.flower_from[b, 1:] = 0
+        xs_range = np.arange(1, n_x+1)
+        for xs in flower:
+            current = self.e_delta(b, xs_range)
+            better = (self.gw[b, 1:n_x+1] == 0) | (self.e_delta(xs, xs_range) < current)
+            cols = xs_range[better]
+            self.gu[b, cols] = self.gu[xs, cols]
+            self.gv[b, cols] = self.gv[xs, cols]
+            self.gw[b, cols] = self.gw[xs, cols]
+            self.gu[cols, b] = self.gu[cols, xs]
+            self.gv[cols, b] = self.gv[cols, xs]
+            self.gw[cols, b] = self.gw[cols, xs]
+            self.flower_from[b, 1:][self.flower_from[xs, 1:] != 0] = xs
+        self.set_slack(b)
+
+    def expand_blossom(self, b):
+        flower = self.flower[b]
+        for x in flower:
+            self.set_st(x, x)
+        xr = self.flower_from[b, self.gu[b, self.pa[b]]]
+        pr = self.get_pr(b, xr)
+        for i in range(0, pr, 2):
+            xs = flower[i]
+            xns = flower[i+1]
+            self.pa[xs] = self.gu[xns, xs]
+            self.S[xs] = 1
+            self.S[xns] = 0
+            self.slack[xs] = 0
+            self.set_slack(xns)
+            self.q_push(xns)
+        self.S[xr] = 1
+        self.pa[xr] = self.pa[b]
+        for xs in flower[pr+1:]:
+            self.S[xs] = -1
+            self.set_slack(xs)
+        self.st[b] = 0
+
+    def on_found_edge(self, eu, ev):
+        u = self.st[eu]
+        v = self.st[ev]
+        if self.S[v] == -1:
+            self.pa[v] = eu
+            self.S[v] = 1
+            nu = self.st[self.match[v]]
+            self.slack[v] = 0
+            self.slack[nu] = 0
+            self.S[nu] = 0
+            self.q_push(nu)
+        elif self.S[v] == 0:
+            lca = self.get_lca(u, v)
+            if not lca:
+                self.augment(u, v)
+                self.augment(v, u)
+                return True
+            self.add_blossom(u, lca, v)
+        return False
+
+    def scan(self, u):
+        n = self.n
+        st = self.st[1:n+1]
+        row = self.gw[u, 1:n+1]
+        candidates = (row > 0) & (st != self.st[u])
+        delta = self.lab[u] + self.lab[1:n+1] - 2*row
+
+        for v in np.flatnonzero(candidates & (delta == 0)) + 1:
+            if self.st[u] != self.st[v] and self.on_found_edge(u, v):
+                return True
+
+        xs = self.st[np.flatnonzero(candidates & (delta != 0)) + 1]
+        xs = xs[xs != self.st[u]]
+        if len(xs):
+            sx = self.slack[xs]
+            better = (sx == 0) | (self.e_delta(u, xs) < self.e_delta(sx, xs))
+            self.slack[xs[better]] = u
+        return False
+
+    def matching(self):
+        n = self.n
+        n_x = self.n_x
+        self.S[1:n_x+1] = -1
+        self.slack[1:n_x+1] = 0
+        self.queue.clear()
+        for x in range(1, n_x+1):
+            if self.st[x] == x and not self.match[x]:
+                self.pa[x] = 0
+                self.S[x] = 0
+                self.q_push(x)
+        if not self.queue:
+            return False
+
+        while True:
+            while self.queue:
+                u = self.queue.popleft()
+                if self.S[self.st[u]] == 1:
+                    continue
+                if self.scan(u):
+                    return True
+
+            n_x = self.n_x
+            xs = np.arange(1, n_x+1)
+            st = self.st[1:n_x+1]
+            S = self.S[1:n_x+1]
+            slack = self.slack[1:n_x+1]
+            outer = st == xs
+
+            d = np.iinfo(np.int64).max
+            blossoms = outer & (xs > n) & (S == 1)
+            if blossoms.any():
+                d = min(d, (self.lab[1:n_x+1][blossoms] // 2).min())
+            with_slack = outer & (slack != 0)
+            delta = self.e_delta(slack, xs)
+            free = with_slack & (S == -1)
+            if free.any():
+                d = min(d, delta[free].min())
+            even = with_slack & (S == 0)
+            if even.any():
+                d = min(d, (delta[even] // 2).min())
+
+            vertex_S = self.S[self.st[1:n+1]]
+            lab = self.lab[1:n+1]
+            if (lab[vertex_S == 0] <= d).any():
+                return False
+            lab[vertex_S == 0] -= d
+            lab[vertex_S == 1] += d
+            outer_blossoms = np.arange(n+1, n_x+1)[outer[n:]]
+            self.lab[outer_blossoms[self.S[outer_blossoms] == 0]] += 2*d
+            self.lab[outer_blossoms[self.S[outer_blossoms] == 1]] -= 2*d
+
+            self.queue.clear()
+            delta = self.e_delta(slack, xs)
+            tight = with_slack & (self.st[slack] != xs) & (delta == 0)
+            for x in xs[tight]:
+                sx = self.slack[x]
+                if self.st[x] == x and sx and self.st[sx] != x and self.e_delta(sx, x) == 0:
+                    if self.on_found_edge(self.gu[sx, x], self.gv[sx, x]):
+                        return True
+
+            for b in range(n+1, self.n_x+1):
+                if self.st[b] == b and self.S[b] == 1 and self.lab[b] == 0:
+                    self.expand_blossom(b)
+
+ENGINES = {\
+        BlossomEngine.name: BlossomEngine,\
+        NetworkXEngine.name: NetworkXEngine,\
+        }
+
+def get_engine(name):
+    if not name in ENGINES:
+        raise Exception(f"Unknown matching engine '{name}'")
+    return ENGINES[name]()
@@ -0,0 +1,230 @@
+import bisect
+import collections
+import contextlib
+import functools
+import logging
+import os
+import time
+
+# In-process metrics in the Prometheus text format: latency histograms and
+# counters, both with labels. There is one registry per process, REGISTRY,
+# which survives reloads of the cog since this module is not reloaded.
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Histogram(object):
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0]*(len(BUCKETS)+1) # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # upper bound of the bucket the quantile falls into
+        rank = q*self.count
+        total = 0
+        for bound, n in zip(BUCKETS + (float('inf'),), self.counts):
+            total += n
+            if total >= rank:
+                return bound
+        return float('inf')
+
+    def mean(self):
+        return self.sum/self.count if self.count else 0.0
+
+def key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+def label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = ((k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+class Metrics(object):
+    def __init__(self):
+        self.histograms = collections.defaultdict(Histogram)
+        self.counters = collections.Counter()
+        self.gauges = {}
+        self.started = time.time()
+
+    # `metric` rather than `name` since commands and listeners are labeled
+    # by name
+    def observe(self, metric, value, **labels):
+        self.histograms[key(metric, labels)].observe(value)
+
+    def inc(self, metric, value=1, **labels):
+        self.counters[key(metric, labels)] += value
+
+    def set(self, metric, value, **labels):
+        self.gauges[key(metric, labels)] = value
+
+    @contextlib.contextmanager
+    def timed(self, metric, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(metric, time.perf_counter() - start, **labels)
+
+    def instrument(self, metric, **labels):
+        # decorator timing every call of a coroutine function
+        def decorator(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with self.timed(metric, **labels):
+                    return await function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self):
+        lines = []
+        names = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if not name in names:
+                lines.append(f"# TYPE {name} counter")
+                names.add(name)
+            lines.append(f"{name}{label_text(labels)} {value}")
+
+        for (name, labels), value in sorted(self.gauges.items()):
+            if not name in names:
+                lines.append(f"# TYPE {name} gauge")
+                names.add(name)
+            lines.append(f"{name}{label_text(labels)} {value}")
+
+        for (name, labels), h in sorted(self.histograms.items()):
+            if not name in names:
+                lines.append(f"# TYPE {name} histogram")
+                names.add(name)
+            total = 0
+            for bound, n in zip(BUCKETS + (float('inf'),), h.counts):
+                total += n
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{label_text(labels, [('le', le)])} {total}")
+            lines.append(f"{name}_sum{label_text(labels)} {h.sum}")
+            lines.append(f"{name}_count{label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        # for the node exporter textfile collector, which must never see a
+        # partially written file
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def select(self, metric):
+        # {labels: histogram, counter or gauge value} of one metric
+        found = {}
+        for (name, labels), value in list(self.histograms.items()) + list(self.counters.items()) + list(self.gauges.items()):
+            if name == metric:
+                found[labels] = value
+        return found
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+        self.gauges.clear()
+        self.started = time.time()
+
+REGISTRY = Metrics()
+
+def instrument_http(http, metrics=REGISTRY):
+    # Wraps discord.py's HTTPClient.request to time every API call by route.
+    # The time includes waiting for the route's rate limit bucket.
+    if hasattr(http.request, 'uninstrumented'):
+        return
+    request = http.request
+
+    async def instrumented(route, **kwargs):
+        name = f"{route.method} {route.path}"
+        metrics.inc('discord_api_calls_total', route=name)
+        try:
+            with metrics.timed('discord_api_seconds', route=name):
+                return await request(route, **kwargs)
+        except Exception as e:
+            metrics.inc('discord_api_errors_total', route=name, status=getattr(e, 'status', type(e).__name__))
+            raise
+    instrumented.uninstrumented = request
+    http.request = instrumented
+
+def uninstrument_http(http):
+    if hasattr(http.request, 'uninstrumented'):
+        http.request = http.request.uninstrumented
+
+class RateLimitHandler(logging.Handler):
+    # Counts the 429 responses discord.py reports on its 'discord.http'
+    # logger together with how long it waits for them, by route.
+    def __init__(self, metrics=REGISTRY):
+        super().__init__(logging.WARNING)
+        self.metrics = metrics
+
+    def emit(self, record):
+        if record.msg.startswith('We are being rate limited'):
+            retry_after, bucket = record.args
+            route = str(bucket).split(':', 2)[-1]
+        elif record.msg.startswith('Global rate limit has been hit'):
+            retry_after, = record.args
+            route = 'global'
+        else:
+            return
+        self.metrics.inc('discord_rate_limited_total', route=route)
+        self.metrics.observe('discord_rate_limit_wait_seconds', retry_after, route=route)
+
+RATE_LIMIT_HANDLER = RateLimitHandler()
+SERVER = None
+
+def install(bot):
+    instrument_http(bot.http)
+    logger = logging.getLogger('discord.http')
+    if not RATE_LIMIT_HANDLER in logger.handlers:
+        logger.addHandler(RATE_LIMIT_HANDLER)
+
+def uninstall(bot):
+    uninstrument_http(bot.http)
+    logging.getLogger('discord.http').removeHandler(RATE_LIMIT_HANDLER)
+
+async def serve(host, port, metrics=REGISTRY):
+    # Local HTTP endpoint for Prometheus at /metrics. Started once per
+    # process, it keeps running across reloads of the cog.
+    global SERVER
+    if SERVER is not None:
+        return SERVER
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(body=metrics.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    SERVER = web.AppRunner(app)
+    await SERVER.setup()
+    await web.TCPSite(SERVER, host, port).start()
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return SERVER
+
+def summary(metrics=REGISTRY, top=8):
+    # Short text for the !stats command
+    def rows(name):
+        found = sorted(metrics.select(name).items(), key=lambda item: -item[1].sum)[:top]
+        return [f"`{' '.join(str(v) for _, v in labels)}` {h.count}x,"
+                f" mean {h.mean()*1000:.0f}ms, p95 < {h.quantile(0.95)*1000:.0f}ms" for labels, h in found]
+
+    uptime = time.time() - metrics.started
+    lines = [f"**Metrics** (last {uptime/3600:.1f}h)", "**Commands**"] + rows('bot_command_seconds')
+    lines += ["**Listeners**"] + rows('bot_listener_seconds')
+    lines += ["**Discord API**"] + rows('discord_api_seconds')
+    limited = sorted(metrics.select('discord_rate_limited_total').items(), key=lambda item: -item[1])[:top]
+    lines += ["**Rate limited**"] + [f"`{dict(labels)['route']}` {n}x" for labels, n in limited]
+    lines += ["**Pairing stages**"] + rows('sss_stage_seconds')
+    queued = sum(metrics.select('tournament_events_queued').values())
+    blocked = sum(metrics.select('tournament_events_blocked_total').values())
+    lines += [f"**Tournament queues** {queued} events queued, {blocked} waited for a full queue"] + rows('tournament_event_wait_seconds')
+    return "\n".join(lines)[:2000]
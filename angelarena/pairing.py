@@ -0,0 +1,246 @@
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import logging
+import os
+import pickle
+import time
+
+from angelarena import metrics
+
+# Pairing a round of a large event takes seconds of CPU, which would stall
+# the event loop and with it heartbeats, reactions and every other
+# tournament. The service sends a pickled copy of the tournament's system to
+# a worker process, which finishes the open round and pairs the next one.
+# Only the pairing comes back. It is applied to the real system in one go,
+# and only if the system did not change in the meantime, by replaying the
+# cheap parts (finish_round, add_round) just like the journal does.
+#
+# While the last results of a round come in, the next round is paired ahead
+# of time for every possible outcome of the few matches still open. Once the
+# last result lands the matching speculation is applied right away.
+
+OPEN = 0 # SSSResults.open
+
+class Outcome(object):
+    __slots__ = ('finished', 'corp', 'runner', 'rng_state', 'stage_times', 'pairing_stats')
+
+    def __init__(self, finished, corp, runner, rng_state, stage_times, pairing_stats):
+        self.finished = finished # the open round was finished
+        self.corp = corp # rows of the new round's corp players by table, None if no round was paired
+        self.runner = runner
+        self.rng_state = rng_state
+        self.stage_times = stage_times
+        self.pairing_stats = pairing_stats
+
+def base(system):
+    # Everything a pairing depends on besides the results of the open round
+    store = system.store
+    return (len(system.rounds), system.finished_matches, store.match_count, store.count, len(system.players), len(system.dropped))
+
+def open_results(system):
+    store = system.store
+    return store.match_result[system.finished_matches:store.match_count]
+
+def generation(system):
+    # Results of the open round can change without any counter moving, so
+    # they are compared as a whole.
+    return base(system) + (open_results(system).tobytes(),)
+
+def prepare_worker():
+    import angelarena.system
+
+def advance(data, finish, pair, results=()):
+    # Runs in a worker process on a copy of the system. `results` are
+    # assumed for the open round's remaining matches.
+    system = pickle.loads(data)
+    system.stage_times.clear()
+    system.pairing_stats.clear()
+    if results:
+        system.report_results(results)
+    if finish:
+        system.finish_round()
+
+    corp = runner = None
+    if pair and not system.over():
+        system.pair_new_round()
+        start = system.finished_matches
+        corp = system.store.match_corp[start:system.store.match_count].copy()
+        runner = system.store.match_runner[start:system.store.match_count].copy()
+    return Outcome(finish, corp, runner, system.rng.bit_generator.state, dict(system.stage_times), system.pairing_stats)
+
+def apply(system, outcome):
+    if outcome.finished:
+        system.finish_round()
+    round = None
+    if outcome.corp is not None:
+        round = system.add_round(outcome.corp, outcome.runner)
+    system.rng.bit_generator.state = outcome.rng_state
+    system.pairing_stats.update(outcome.pairing_stats)
+    for stage, seconds in outcome.stage_times.items():
+        system.stage_times[stage] += seconds
+        metrics.REGISTRY.observe('sss_stage_seconds', seconds, stage=stage)
+    return round
+
+class PairingService(object):
+    # Pairs many tournaments in parallel, at most one job per tournament.
+    # Jobs that take longer than `timeout` seconds or are cancelled leave
+    # the system untouched. A job that is already running cannot be taken
+    # back from its worker, so the pool is replaced and its processes are
+    # stopped as soon as no other job runs there.
+    def __init__(self, workers=None, timeout=120.0, max_outcomes=9):
+        self.workers = workers or os.cpu_count()
+        self.timeout = timeout
+        self.max_outcomes = max_outcomes # most outcomes of the open matches that are paired ahead
+        self.executor = None
+        self.jobs = {} # key -> (executor, concurrent future, asyncio future)
+        self.speculations = {} # key -> (base, {final results of the round as bytes: (executor, concurrent future, final results)})
+        self.cancelled = set()
+        self.stats = collections.Counter()
+
+    def pool(self):
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=prepare_worker)
+        return self.executor
+
+    def busy(self, key):
+        return key in self.jobs
+
+    async def advance(self, key, system, finish=False, pair=True, timeout=None):
+        # Finishes the open round of the system if `finish`, then pairs the
+        # next round if `pair` and the tournament is not over. Returns the
+        # new round or None.
+        if key in self.jobs:
+            raise Exception("This tournament is already being paired.")
+        timeout = timeout or self.timeout
+
+        start = time.perf_counter()
+        before = generation(system)
+        executor, future = self.speculated(key, system, finish, pair)
+        if future is None:
+            executor = self.pool()
+            future = executor.submit(advance, pickle.dumps(system, protocol=pickle.HIGHEST_PROTOCOL), finish, pair)
+        waiter = asyncio.wrap_future(future)
+        self.jobs[key] = (executor, future, waiter)
+        try:
+            outcome = await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            self.abandon(key)
+            raise Exception(f"Pairing took longer than {timeout:g} seconds and was stopped.")
+        except asyncio.CancelledError:
+            self.abandon(key)
+            if key in self.cancelled:
+                self.stats['cancelled'] += 1
+                raise Exception("Pairing was cancelled.")
+            raise
+        finally:
+            self.jobs.pop(key, None)
+            self.cancelled.discard(key)
+            metrics.REGISTRY.observe('pairing_job_seconds', time.perf_counter() - start)
+
+        if generation(system) != before:
+            self.stats['stale'] += 1
+            raise Exception("The tournament changed while it was being paired, please try again.")
+        self.stats['applied'] += 1
+        return apply(system, outcome)
+
+    def speculate(self, key, system):
+        # Called whenever results of the open round changed. Speculations that
+        # contradict the results known now are dropped, and if few enough
+        # outcomes are left, the missing ones are started.
+        if key in self.jobs or not system.round_in_progress():
+            self.forget(key)
+            return
+
+        results = open_results(system)
+        known = results != OPEN
+        tables = (~known).nonzero()[0]
+        if len(tables) == 0:
+            return
+
+        b = base(system)
+        if key in self.speculations and self.speculations[key][0] != b:
+            self.forget(key)
+        jobs = self.speculations.setdefault(key, (b, {}))[1]
+
+        for final, job in list(jobs.items()):
+            if (job[2][known] != results[known]).any():
+                self.drop(jobs.pop(final))
+
+        if len(system.reportable)**len(tables) > self.max_outcomes:
+            return
+        data = None
+        for outcome in itertools.product(system.reportable, repeat=len(tables)):
+            final = results.copy()
+            final[tables] = outcome
+            if final.tobytes() in jobs:
+                continue
+            if data is None:
+                data = pickle.dumps(system, protocol=pickle.HIGHEST_PROTOCOL)
+            executor = self.pool()
+            assumed = [(int(table) + 1, value) for table, value in zip(tables, outcome)]
+            jobs[final.tobytes()] = (executor, executor.submit(advance, data, True, True, assumed), final)
+            self.stats['speculated'] += 1
+
+    def speculated(self, key, system, finish, pair):
+        # The speculative job for the round as it ended, if there is one
+        b, jobs = self.speculations.pop(key, (None, {}))
+        job = None
+        if finish and pair and b == base(system):
+            job = jobs.pop(open_results(system).tobytes(), None)
+        for other in jobs.values():
+            self.drop(other)
+        if job is None or job[1].cancelled():
+            if b is not None:
+                self.stats['speculation_misses'] += 1
+            return None, None
+        self.stats['speculation_hits'] += 1
+        return job[:2]
+
+    @staticmethod
+    def drop(job):
+        # a speculative job that already runs is left to finish, its outcome is not used
+        job[1].cancel()
+
+    def forget(self, key):
+        for job in self.speculations.pop(key, (None, {}))[1].values():
+            self.drop(job)
+
+    def cancel(self, key):
+        # Returns whether there was a job to cancel
+        if not key in self.jobs:
+            return False
+        self.cancelled.add(key)
+        self.jobs[key][2].cancel()
+        return True
+
+    def abandon(self, key):
+        executor, future, waiter = self.jobs.pop(key)
+        if future.cancel() or future.done():
+            return
+        # the job keeps its worker busy, new jobs go to a new pool
+        logging.warning(f"Abandoning the pairing job of {key}, replacing the worker pool")
+        if executor is self.executor:
+            self.executor = None
+        if not any(job[0] is executor for job in self.jobs.values()):
+            self.stop(executor)
+
+    @staticmethod
+    def stop(executor):
+        # ProcessPoolExecutor has no way to stop running work, so its
+        # processes are terminated
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def close(self):
+        for key in list(self.speculations):
+            self.forget(key)
+        executors = [job[0] for job in self.jobs.values()] + [self.executor]
+        for executor in set(e for e in executors if e is not None):
+            self.stop(executor)
+        self.jobs.clear()
+        self.executor = None
@@ -0,0 +1,287 @@
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import os
+import pickle
+import time
+
+from angelarena import registry
+
+# Tournament state is kept as a snapshot of all tournaments plus a journal of
+# the changes made since. Every change appends one small record to the
+# journal, so saving does not get more expensive as tournaments grow. Once
+# enough records have piled up the journal is compacted into a new snapshot.
+#
+# Records are pickled tuples (sequence, op, tournament id, args). The snapshot
+# remembers the sequence number it includes, so records that made it into a
+# snapshot are skipped if the journal could not be truncated afterwards.
+
+def apply_add(tournaments, t, tournament):
+    tournaments.add(tournament)
+
+def apply_archive(tournaments, t):
+    tournaments.archive(t)
+
+def apply_remove(tournaments, t):
+    tournaments.remove(t)
+
+def apply_set(tournaments, t, attributes):
+    tournaments.set(t, attributes)
+
+def apply_join(tournaments, t, user_id):
+    t.add_participant(user_id)
+
+def apply_leave(tournaments, t, user_id):
+    t.remove_participant(user_id)
+
+def apply_add_player(tournaments, t, member):
+    t.system.add_new_player(member)
+
+def apply_drop(tournaments, t, index):
+    t.system.drop_player(t.system.store.views[index])
+
+def apply_pair(tournaments, t, corp, runner):
+    t.system.add_round(corp, runner)
+
+def apply_results(tournaments, t, results):
+    t.system.report_results(results)
+
+def apply_finish(tournaments, t):
+    t.system.finish_round()
+
+def apply_cut(tournaments, t):
+    t.start_cut()
+
+OPS = {
+        'add': apply_add,
+        'archive': apply_archive,
+        'remove': apply_remove,
+        'set': apply_set,
+        'join': apply_join,
+        'leave': apply_leave,
+        'add_player': apply_add_player,
+        'drop': apply_drop,
+        'pair': apply_pair,
+        'results': apply_results,
+        'finish': apply_finish,
+        'cut': apply_cut,
+        }
+
+class Journal(object):
+    def __init__(self, snapshot_path='tournaments.p', journal_path='tournaments.journal', compact_every=500, sync=True):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.sync = sync # fsync every record, not only flush it to the OS
+
+        self.sequence = 0
+        self.pending = 0 # records written since the last snapshot
+        self.sessions = [] # wizard sessions of the last loaded snapshot, see SessionStore.dump
+        self.file = None
+
+    def load(self):
+        self.close()
+
+        tournaments = registry.TournamentRegistry()
+        snapshot_sequence = 0
+        self.sessions = []
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                state = pickle.load(f)
+            if isinstance(state, list):
+                tournaments = registry.TournamentRegistry(state) # plain list written before the journal existed
+            else:
+                tournaments = state['tournaments']
+                snapshot_sequence = state['sequence']
+                self.sessions = state.get('sessions', [])
+        except FileNotFoundError:
+            logging.info("No snapshot found, starting without tournaments")
+
+        self.sequence = snapshot_sequence
+        self.pending = 0
+        end = self.replay(tournaments, snapshot_sequence)
+
+        self.file = open(self.journal_path, 'ab')
+        if self.file.tell() != end:
+            # a record was only partially written when the bot went down
+            logging.warning(f"Dropping {self.file.tell() - end} bytes of incomplete journal record")
+            self.file.truncate(end)
+            self.file.seek(end)
+        return tournaments
+
+    def replay(self, tournaments, snapshot_sequence):
+        # Applies all journal records newer than the snapshot and returns the
+        # offset after the last complete record.
+        end = 0
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return end
+
+        with f:
+            while True:
+                try:
+                    sequence, op, tournament_id, args = pickle.load(f)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError, AttributeError):
+                    break
+                end = f.tell()
+                if sequence <= snapshot_sequence:
+                    continue
+
+                t = args[0] if op == 'add' else tournaments.get(tournament_id)
+                try:
+                    OPS[op](tournaments, t, *args)
+                except Exception:
+                    logging.exception(f"Could not replay journal record {sequence} ({op}) for tournament {tournament_id}")
+
+                self.sequence = sequence
+                self.pending += 1
+        return end
+
+    # Encoding and writing are separate steps. Encoding has to happen right
+    # when the change is made, writing can be left to a StateWriter.
+
+    def encode(self, op, tournament, *args):
+        if not op in OPS:
+            raise Exception(f"Unknown journal record '{op}'")
+        self.sequence += 1
+        self.pending += 1
+        return pickle.dumps((self.sequence, op, tournament.id, args), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def encode_snapshot(self, tournaments, sessions=()):
+        self.pending = 0
+        return pickle.dumps({'sequence': self.sequence, 'tournaments': tournaments, 'sessions': list(sessions)}, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def write_records(self, records):
+        if self.file is None:
+            self.file = open(self.journal_path, 'ab')
+        self.file.write(b''.join(records))
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def write_snapshot(self, data):
+        # Written next to the old snapshot and moved over it, so there always
+        # is a complete snapshot on disk.
+        tmp = self.snapshot_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.journal_path, 'wb')
+
+    def record(self, op, tournament, *args):
+        self.write_records([self.encode(op, tournament, *args)])
+
+    def needs_compaction(self):
+        return self.pending >= self.compact_every
+
+    def snapshot(self, tournaments, sessions=()):
+        self.write_snapshot(self.encode_snapshot(tournaments, sessions))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class StateWriter(object):
+    # Writes encoded journal records and snapshots on a worker thread so disk
+    # I/O and fsync never block the event loop. Everything submitted while a
+    # write is running goes to disk together in the next one, records that
+    # are followed by a snapshot in the same batch are not written at all.
+    def __init__(self, journal):
+        self.journal = journal
+        self.queue = collections.deque()
+        self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='state-writer')
+        self.task = None
+        self.wakeup = None
+        self.idle = None
+
+        self.stats = collections.Counter()
+        self.latencies = collections.deque(maxlen=100) # seconds per write
+
+    def submit_record(self, data):
+        self.submit(('record', data))
+
+    def submit_snapshot(self, data):
+        self.submit(('snapshot', data))
+
+    def submit(self, item):
+        self.queue.append(item)
+        self.stats['submitted'] += 1
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], len(self.queue))
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.idle = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run())
+        self.idle.clear()
+        self.wakeup.set()
+
+    def take_batch(self):
+        batch = list(self.queue)
+        self.queue.clear()
+        last_snapshot = max((k for k, (kind, _) in enumerate(batch) if kind == 'snapshot'), default=None)
+        if last_snapshot is not None:
+            self.stats['coalesced'] += last_snapshot
+            batch = batch[last_snapshot:]
+        return batch
+
+    def write(self, batch):
+        start = time.perf_counter()
+        snapshot = [data for kind, data in batch if kind == 'snapshot']
+        records = [data for kind, data in batch if kind == 'record']
+        if snapshot:
+            self.journal.write_snapshot(snapshot[-1])
+        if records:
+            self.journal.write_records(records)
+        return time.perf_counter() - start
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.queue:
+                batch = self.take_batch()
+                try:
+                    latency = await loop.run_in_executor(self.executor, self.write, batch)
+                except Exception:
+                    logging.exception(f"Writing {len(batch)} state changes failed")
+                    self.stats['errors'] += 1
+                    continue
+                self.latencies.append(latency)
+                self.stats['writes'] += 1
+                self.stats['written'] += len(batch)
+                if latency > 1:
+                    logging.warning(f"Writing {len(batch)} state changes took {latency:.2f}s")
+            self.idle.set()
+
+    async def flush(self):
+        if self.idle is not None:
+            await self.idle.wait()
+
+    def close(self):
+        # Synchronous so it can be used from extension teardown. Waits for the
+        # running write and writes what is left on the calling thread.
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.executor.shutdown(wait=True)
+        if self.queue:
+            self.write(self.take_batch())
+        self.journal.close()
+
+    def report(self):
+        latencies = sorted(self.latencies)
+        mean = sum(latencies)/len(latencies) if latencies else 0
+        worst = latencies[-1] if latencies else 0
+        return (f"{self.stats['writes']} writes of {self.stats['written']} changes"
+                f" ({self.stats['coalesced']} coalesced into snapshots), write latency mean {mean*1000:.1f}ms"
+                f" max {worst*1000:.1f}ms, queue depth {len(self.queue)} (max {self.stats['max_queue_depth']})")
@@ -0,0 +1,161 @@
+import collections
+import datetime
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# Diagnostics for the running bot without restarting it: a sampling profiler
+# for the event loop thread and tracemalloc snapshots compared against a
+# baseline. Both produce plain text reports that are written to disk.
+
+IDLE = {('selectors.py', 'select'), ('selectors.py', 'poll')} # the event loop waiting for something to do
+
+def location(frame):
+    code = frame.f_code
+    return (code.co_filename, code.co_name, frame.f_lineno)
+
+def function_name(entry):
+    filename, name, line = entry
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+class Profile(object):
+    def __init__(self, stacks, idle, seconds, interval):
+        self.stacks = stacks # Counter of stacks, outermost frame first
+        self.idle = idle
+        self.seconds = seconds
+        self.interval = interval
+
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def summary(self, top=30):
+        total = self.samples()
+        own = collections.Counter()
+        cumulative = collections.Counter()
+        for stack, n in self.stacks.items():
+            own[stack[-1]] += n
+            for entry in set(stack):
+                cumulative[entry] += n
+
+        busy = total/(total + self.idle) if total + self.idle else 0.0
+        lines = [f"Sampled for {self.seconds:.1f}s every {self.interval*1000:g}ms: {total} busy and {self.idle} idle samples ({busy:.0%} busy)", ""]
+        for title, counts in [("Own time", own), ("Including callees", cumulative)]:
+            lines.append(f"{title}:")
+            for entry, n in counts.most_common(top):
+                lines.append(f"{n:8} {n/total:6.1%}  {function_name(entry)}")
+            lines.append("")
+
+        # for flamegraph.pl and speedscope
+        lines.append("Collapsed stacks:")
+        for stack, n in self.stacks.most_common():
+            lines.append(";".join(f"{name} ({os.path.basename(filename)})" for filename, name, _ in stack) + f" {n}")
+        return "\n".join(lines) + "\n"
+
+class SamplingProfiler(object):
+    # Samples the stack of one thread, the event loop by default, from a
+    # background thread. Stacks ending in the selector are counted as idle.
+    def __init__(self, thread_id=None, interval=0.005, depth=50):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.depth = depth
+        self.stacks = collections.Counter()
+        self.idle = 0
+        self.started = None
+        self.stopping = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.sample(frame)
+
+    def sample(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.depth:
+            stack.append(location(frame))
+            frame = frame.f_back
+        filename, name, _ = stack[0]
+        if (os.path.basename(filename), name) in IDLE:
+            self.idle += 1
+        else:
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+        return Profile(self.stacks, self.idle, time.perf_counter() - self.started, self.interval)
+
+class MemoryTracker(object):
+    # tracemalloc snapshots compared against a baseline snapshot. Tracing is
+    # process wide, so there is a single tracker, MEMORY, which is kept when
+    # the cog is reloaded.
+    def __init__(self):
+        self.baseline = None
+        self.baseline_time = None
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=1):
+        if not self.tracing:
+            tracemalloc.start(frames)
+        self.reset_baseline()
+
+    def stop(self):
+        tracemalloc.stop()
+        self.baseline = None
+
+    def take(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+            ])
+
+    def reset_baseline(self):
+        self.baseline = self.take()
+        self.baseline_time = datetime.datetime.now()
+
+    def summary(self, top=30, key_type='lineno'):
+        # biggest growth since the baseline, then the biggest allocations
+        snapshot = self.take()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced memory: {current/2**20:.1f} MiB, peak {peak/2**20:.1f} MiB",
+                 f"Compared to the baseline from {self.baseline_time:%Y-%m-%d %H:%M:%S}", "",
+                 "Growth since the baseline:"]
+        for stat in snapshot.compare_to(self.baseline, key_type)[:top]:
+            lines.append(str(stat))
+        lines += ["", "Largest allocations:"]
+        for stat in snapshot.statistics(key_type)[:top]:
+            lines.append(str(stat))
+        if tracemalloc.get_traceback_limit() > 1:
+            lines += ["", "Tracebacks of the largest growth:"]
+            for stat in snapshot.compare_to(self.baseline, 'traceback')[:5]:
+                lines.append(f"{stat.size_diff/1024:+.1f} KiB in {stat.count_diff:+} blocks")
+                lines += stat.traceback.format()
+        return "\n".join(lines) + "\n"
+
+MEMORY = MemoryTracker()
+
+def write_report(directory, kind, text):
+    # Returns the path of the new report file
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{kind}-{datetime.datetime.now():%Y%m%d-%H%M%S}.txt")
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
@@ -0,0 +1,111 @@
+import collections
+
+# Tournaments by id plus lookup indexes for everything events are routed by.
+# Only active tournaments are indexed for routing, archived ones are kept
+# for their history and can only be looked up by id or organizer. All
+# changes to indexed attributes have to go through `set` so the indexes stay
+# in sync; they are rebuilt from the tournaments when unpickled.
+
+INDEXED = ['message_id', 'category_id', 'lobby_id', 'results_id', 'check_in_id', 'bot_commands_id']
+CHANNELS = ['category_id', 'lobby_id', 'results_id', 'check_in_id', 'bot_commands_id']
+
+class TournamentRegistry(object):
+    def __init__(self, tournaments=(), archived=()):
+        self.active = {}
+        self.archived = {}
+        self.indexes = {name: {} for name in INDEXED}
+        self.titles = collections.defaultdict(list)
+        self.organizers = collections.defaultdict(list)
+
+        for t in tournaments:
+            self.add(t)
+        for t in archived:
+            self.add(t)
+            self.archive(t)
+
+    def __getstate__(self):
+        return {'active': list(self.active.values()), 'archived': list(self.archived.values())}
+
+    def __setstate__(self, state):
+        self.__init__(state['active'], state['archived'])
+
+    def __iter__(self):
+        return iter(list(self.active.values()))
+
+    def __len__(self):
+        return len(self.active)
+
+    def __contains__(self, t):
+        return t.id in self.active
+
+    def index(self, t):
+        for name in INDEXED:
+            value = getattr(t, name, None)
+            if value is not None:
+                self.indexes[name][value] = t
+        self.titles[t.title].append(t)
+
+    def unindex(self, t):
+        for name in INDEXED:
+            value = getattr(t, name, None)
+            if self.indexes[name].get(value) is t:
+                del self.indexes[name][value]
+        self.titles[t.title].remove(t)
+        if not self.titles[t.title]:
+            del self.titles[t.title]
+
+    def add(self, t):
+        if t.id in self.active or t.id in self.archived:
+            raise Exception(f"Tournament {t} is already registered")
+        self.active[t.id] = t
+        self.organizers[t.organizer_id].append(t)
+        self.index(t)
+
+    def archive(self, t):
+        self.unindex(t)
+        del self.active[t.id]
+        self.archived[t.id] = t
+
+    def remove(self, t):
+        if t.id in self.active:
+            self.unindex(t)
+            del self.active[t.id]
+        else:
+            del self.archived[t.id]
+        self.organizers[t.organizer_id].remove(t)
+        if not self.organizers[t.organizer_id]:
+            del self.organizers[t.organizer_id]
+
+    def set(self, t, attributes):
+        indexed = t.id in self.active
+        if indexed:
+            self.unindex(t)
+        for name, value in attributes.items():
+            setattr(t, name, value)
+        t.version += 1
+        if indexed:
+            self.index(t)
+
+    def get(self, tournament_id):
+        return self.active.get(tournament_id) or self.archived.get(tournament_id)
+
+    def find(self, name, value):
+        # Active tournament whose attribute `name` (see INDEXED) is `value`
+        if value is None:
+            return None
+        return self.indexes[name].get(value)
+
+    def by_channel(self, channel):
+        # Active tournament the channel or its category belongs to
+        for name in CHANNELS:
+            t = self.find(name, channel.id)
+            if t:
+                return t
+        return self.find('category_id', getattr(channel, 'category_id', None))
+
+    def by_title(self, title):
+        titles = self.titles.get(title)
+        return titles[0] if titles else None
+
+    def by_organizer(self, organizer_id, archived=False):
+        return [t for t in self.organizers.get(organizer_id, []) if archived or t.id in self.active]
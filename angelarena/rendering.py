@@ -0,0 +1,129 @@
+# Tournament descriptions for the sign-up messages. Rendering is cached per
+# tournament and keyed on its version counter. Participant mentions are kept
+# as a list that is only extended or cut at the first changed participant,
+# and the text is split into messages below Discord's 2000 character limit,
+# keeping the split points in front of the first change.
+
+LIMIT = 2000
+CONTINUED = "**Participants (continued):** "
+SEPARATOR = ", "
+
+def mention(user_id):
+    return f"<@{user_id}>"
+
+def header(t, limit=LIMIT):
+    desc = '\n'.join(['> %s'%x for x in t.desc.split('\n')])
+    text = f"**Title:** {t.title}\n**Organizer:** {mention(t.organizer_id)}\n**Format:** {t.format}\n**Tournament system:** {t.system_text}\nAdditional information:\n{desc}"
+    # leave room for the participant count and at least one mention
+    if len(text) > limit - 100:
+        text = text[:limit - 101] + "…"
+    return text
+
+class Rendering(object):
+    __slots__ = ('version', 'header_key', 'header', 'participants', 'mentions', 'prefix_length', 'starts', 'chunks')
+
+    def __init__(self):
+        self.version = None
+        self.header_key = None
+        self.header = None
+        self.participants = []
+        self.mentions = []
+        self.prefix_length = None
+        self.starts = [0] # index of the first mention of every message
+        self.chunks = []
+
+class DescriptionCache(object):
+    def __init__(self, limit=LIMIT):
+        self.limit = limit
+        self.entries = {}
+
+    def forget(self, t):
+        self.entries.pop(t.id, None)
+
+    def render(self, t):
+        # Returns the list of message texts for the tournament
+        entry = self.entries.get(t.id)
+        if entry is None:
+            entry = self.entries[t.id] = Rendering()
+        elif entry.version == t.version:
+            return entry.chunks
+
+        header_key = (t.title, t.organizer_id, t.format, t.desc, t.system_text)
+        if entry.header_key != header_key:
+            entry.header_key = header_key
+            entry.header = header(t, self.limit)
+            entry.prefix_length = None
+
+        old = entry.participants
+        new = t.participants
+        if new[:len(old)] == old:
+            first = len(old)
+        else:
+            first = next((i for i, (a, b) in enumerate(zip(old, new)) if a != b), min(len(old), len(new)))
+        entry.mentions[first:] = [mention(p) for p in new[first:]]
+        entry.participants = list(new)
+
+        self.pack(entry, first)
+        entry.version = t.version
+        return entry.chunks
+
+    def first_prefix(self, entry):
+        return f"{entry.header}\n**Participants ({len(entry.mentions)}):** "
+
+    def pack(self, entry, first):
+        mentions = entry.mentions
+        if not mentions:
+            entry.prefix_length = None
+            entry.starts = [0]
+            entry.chunks = [entry.header]
+            return
+
+        # Messages ending before the first changed mention are kept. If the
+        # participant count in the first message changed its length,
+        # everything is packed again.
+        prefix = self.first_prefix(entry)
+        k = 0
+        if entry.prefix_length == len(prefix):
+            while k+1 < len(entry.starts) and entry.starts[k+1] < first:
+                k += 1
+        entry.prefix_length = len(prefix)
+        starts = entry.starts[:k+1]
+
+        size = len(prefix) if k == 0 else len(CONTINUED)
+        for i in range(starts[k], len(mentions)):
+            add = len(mentions[i]) + (len(SEPARATOR) if i > starts[-1] else 0)
+            if size + add > self.limit and i > starts[-1]:
+                starts.append(i)
+                size = len(CONTINUED) + len(mentions[i])
+            else:
+                size += add
+        entry.starts = starts
+
+        ends = starts[1:] + [len(mentions)]
+        chunks = entry.chunks[:k]
+        for j in range(k, len(starts)):
+            chunks.append(CONTINUED + SEPARATOR.join(mentions[starts[j]:ends[j]]))
+        chunks[0] = prefix + SEPARATOR.join(mentions[starts[0]:ends[0]])
+        entry.chunks = chunks
+
+def split(lines, limit=LIMIT):
+    # Joins lines into as few messages below the limit as possible
+    messages = []
+    for line in lines:
+        if messages and len(messages[-1]) + 1 + len(line) <= limit:
+            messages[-1] += "\n" + line
+        else:
+            messages.append(line[:limit])
+    return messages
+
+def pairings(round_number, matches, limit=LIMIT):
+    # Messages with the tables of a round, players are mentioned by the
+    # user id the tournament system knows them by
+    lines = [f"**Round {round_number} pairings:**"]
+    for table, m in enumerate(matches, 1):
+        if m.corp.index == 0 or m.runner.index == 0:
+            player = m.runner if m.corp.index == 0 else m.corp
+            lines.append(f"Table {table}: {mention(player.member)} has a bye")
+        else:
+            lines.append(f"Table {table}: {mention(m.corp.member)} (Corp) vs {mention(m.runner.member)} (Runner)")
+    return split(lines, limit)
@@ -0,0 +1,73 @@
+import collections
+import logging
+import time
+
+class SessionStore(object):
+    # Wizard sessions by user id, least recently active first. Sessions idle
+    # for longer than `ttl` seconds are dropped, and so are the least recently
+    # active ones beyond `capacity`. Looking a session up counts as activity.
+    def __init__(self, ttl=3*24*3600, capacity=2000, clock=time.time):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.clock = clock
+        self.sessions = collections.OrderedDict() # user_id -> [wizard, last active]
+        self.stats = collections.Counter()
+
+    def evict(self):
+        now = self.clock()
+        while self.sessions:
+            user_id, (wizard, last_active) = next(iter(self.sessions.items()))
+            if now - last_active <= self.ttl and len(self.sessions) <= self.capacity:
+                break
+            del self.sessions[user_id]
+            self.stats['expired' if now - last_active > self.ttl else 'evicted'] += 1
+            logging.info(f"Dropped idle {type(wizard).__name__} of {user_id}")
+
+    def __contains__(self, user_id):
+        self.evict()
+        return user_id in self.sessions
+
+    def __getitem__(self, user_id):
+        session = self.sessions[user_id]
+        session[1] = self.clock()
+        self.sessions.move_to_end(user_id)
+        return session[0]
+
+    def __setitem__(self, user_id, wizard):
+        self.sessions[user_id] = [wizard, self.clock()]
+        self.sessions.move_to_end(user_id)
+        self.evict()
+
+    def __delitem__(self, user_id):
+        del self.sessions[user_id]
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get(self, user_id):
+        return self[user_id] if user_id in self else None
+
+    def pop(self, user_id, default=None):
+        session = self.sessions.pop(user_id, None)
+        return session[0] if session else default
+
+    def dump(self):
+        # (user_id, last active, kind, state) of every wizard that can be
+        # restored, see Wizard.state
+        self.evict()
+        dumped = []
+        for user_id, (wizard, last_active) in self.sessions.items():
+            state = wizard.state()
+            if state is not None:
+                dumped.append((user_id, last_active, wizard.kind, state))
+        return dumped
+
+    def restore(self, dumped, make):
+        # make(user_id, kind, state) returns the wizard or None if it cannot
+        # be restored any more
+        for user_id, last_active, kind, state in dumped:
+            wizard = make(user_id, kind, state)
+            if wizard is not None:
+                self.sessions[user_id] = [wizard, last_active]
+                self.sessions.move_to_end(user_id)
+        self.evict()
@@ -0,0 +1,193 @@
+import argparse
+import concurrent.futures
+import math
+
+from angelarena import imports
+
+np = imports.module('numpy') # the bot itself only needs the precomputed TABLE
+
+# Monte-Carlo estimates for Single Sided Swiss elimination tournaments. Every
+# array has one row per simulated tournament so a whole batch of tournaments
+# is played with a handful of NumPy operations per round. Pairing is
+# approximated by pairing neighbours in score order with random tie breaks,
+# rematches and side balance do not change how long a tournament runs.
+
+ROUND_MINUTES = 45
+
+class SimulationResult(object):
+    def __init__(self, players, max_losses, rounds_to_winner, rounds_to_undefeated, curve):
+        self.players = players
+        self.max_losses = max_losses
+        self.rounds_to_winner = rounds_to_winner # rounds until at most one player is left
+        self.rounds_to_undefeated = rounds_to_undefeated # rounds until at most one player is undefeated
+        self.curve = curve # mean number of active players after each round
+
+    @staticmethod
+    def merge(results):
+        length = max(len(r.curve) for r in results)
+        weights = np.array([len(r.rounds_to_winner) for r in results])
+        curves = np.array([np.pad(r.curve, (0, length - len(r.curve)), mode='edge') for r in results])
+        return SimulationResult(results[0].players, results[0].max_losses,
+                np.concatenate([r.rounds_to_winner for r in results]),
+                np.concatenate([r.rounds_to_undefeated for r in results]),
+                weights @ curves / weights.sum())
+
+    def summary(self, round_minutes=ROUND_MINUTES):
+        rounds = self.rounds_to_winner
+        return {
+                'players': self.players,
+                'max_losses': self.max_losses,
+                'median': int(np.median(rounds)),
+                'p10': int(np.percentile(rounds, 10)),
+                'p90': int(np.percentile(rounds, 90)),
+                'undefeated': int(np.median(self.rounds_to_undefeated)),
+                'hours': round(float(np.median(rounds))*round_minutes/60, 1),
+                }
+
+def simulate_batch(players, sims, max_losses=3, max_rounds=None, draw_rate=0.02, drop_rate=0.0, seed=None):
+    rng = np.random.default_rng(seed)
+    if max_rounds is None:
+        max_rounds = 4*players + 4
+
+    score = np.zeros((sims, players), dtype=np.int32)
+    losses = np.zeros((sims, players), dtype=np.int32)
+    active = np.ones((sims, players), dtype=bool)
+    rows = np.arange(sims)[:, None]
+    slots = np.arange(players//2)
+
+    rounds_to_winner = np.full(sims, max_rounds, dtype=np.int32)
+    rounds_to_undefeated = np.full(sims, max_rounds, dtype=np.int32)
+    curve = []
+
+    for round_number in range(1, max_rounds+1):
+        n_active = active.sum(axis=1)
+        running = n_active > 1
+        if not running.any():
+            break
+
+        # active players first, highest score first, random order within a score
+        key = np.where(active, score + rng.random((sims, players)), -1.0)
+        order = np.argsort(-key, axis=1)
+        a = order[:, 0:2*len(slots):2]
+        b = order[:, 1:2*len(slots):2]
+        paired = (2*slots + 1 < n_active[:, None]) & running[:, None]
+
+        outcome = rng.random((sims, len(slots)))
+        draw = outcome < draw_rate
+        a_wins = ~draw & (outcome < draw_rate + (1 - draw_rate)/2)
+        b_wins = ~draw & ~a_wins
+        score[rows, a] += a_wins & paired
+        score[rows, b] += b_wins & paired
+        losses[rows, a] += (b_wins | draw) & paired
+        losses[rows, b] += (a_wins | draw) & paired
+
+        # the lowest ranked player of an odd field gets the bye
+        bye = running & (n_active % 2 == 1)
+        score[bye, order[bye, n_active[bye]-1]] += 1
+
+        active &= losses <= max_losses
+        if drop_rate:
+            active &= ~((rng.random((sims, players)) < drop_rate) & running[:, None])
+
+        n_active = active.sum(axis=1)
+        undefeated = (active & (losses == 0)).sum(axis=1)
+        rounds_to_winner[running & (n_active <= 1)] = round_number
+        done = (rounds_to_undefeated == max_rounds) & (undefeated <= 1)
+        rounds_to_undefeated[done] = round_number
+        curve.append(n_active.mean())
+
+    return SimulationResult(players, max_losses, rounds_to_winner, rounds_to_undefeated, np.array(curve))
+
+def simulate(players, sims=1000, max_losses=3, max_rounds=None, draw_rate=0.02, drop_rate=0.0, seed=None, workers=None):
+    if not workers or workers == 1:
+        return simulate_batch(players, sims, max_losses, max_rounds, draw_rate, drop_rate, seed)
+
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    sizes = [len(chunk) for chunk in np.array_split(np.arange(sims), workers) if len(chunk)]
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(simulate_batch, players, size, max_losses, max_rounds, draw_rate, drop_rate, s)
+                for size, s in zip(sizes, seeds)]
+        return SimulationResult.merge([f.result() for f in futures])
+
+# Precomputed with `python -m angelarena.simulator --table` (2000 tournaments
+# per field size, 3 losses, 2% draws, no drops).
+TABLE_MAX_LOSSES = 3
+TABLE = {
+        4: {'max_losses': 3, 'median': 9, 'p10': 8, 'p90': 11, 'undefeated': 2},
+        6: {'max_losses': 3, 'median': 10, 'p10': 9, 'p90': 11, 'undefeated': 2},
+        8: {'max_losses': 3, 'median': 11, 'p10': 10, 'p90': 12, 'undefeated': 3},
+        12: {'max_losses': 3, 'median': 12, 'p10': 11, 'p90': 13, 'undefeated': 3},
+        16: {'max_losses': 3, 'median': 12, 'p10': 11, 'p90': 13, 'undefeated': 4},
+        24: {'max_losses': 3, 'median': 13, 'p10': 12, 'p90': 14, 'undefeated': 4},
+        32: {'max_losses': 3, 'median': 14, 'p10': 13, 'p90': 15, 'undefeated': 5},
+        48: {'max_losses': 3, 'median': 15, 'p10': 14, 'p90': 15, 'undefeated': 5},
+        64: {'max_losses': 3, 'median': 15, 'p10': 14, 'p90': 16, 'undefeated': 6},
+        96: {'max_losses': 3, 'median': 16, 'p10': 15, 'p90': 17, 'undefeated': 6},
+        128: {'max_losses': 3, 'median': 16, 'p10': 16, 'p90': 17, 'undefeated': 7},
+        192: {'max_losses': 3, 'median': 17, 'p10': 17, 'p90': 18, 'undefeated': 7},
+        256: {'max_losses': 3, 'median': 18, 'p10': 17, 'p90': 19, 'undefeated': 8},
+        384: {'max_losses': 3, 'median': 18, 'p10': 18, 'p90': 19, 'undefeated': 8},
+        512: {'max_losses': 3, 'median': 19, 'p10': 18, 'p90': 20, 'undefeated': 9},
+        768: {'max_losses': 3, 'median': 20, 'p10': 19, 'p90': 21, 'undefeated': 9},
+        1024: {'max_losses': 3, 'median': 20, 'p10': 20, 'p90': 21, 'undefeated': 10},
+        2048: {'max_losses': 3, 'median': 22, 'p10': 21, 'p90': 22, 'undefeated': 11},
+        }
+
+def suggest(players, max_losses=3, round_minutes=ROUND_MINUTES):
+    if players < 2:
+        return None
+
+    if max_losses == TABLE_MAX_LOSSES and TABLE:
+        sizes = sorted(TABLE)
+        size = next((s for s in sizes if s >= players), sizes[-1])
+        entry = dict(TABLE[size])
+        if players > size:
+            # beyond the table every doubling of the field adds about a round
+            extra = math.ceil(math.log2(players/size))
+            for key in ['median', 'p10', 'p90', 'undefeated']:
+                entry[key] += extra
+        entry['players'] = players
+        entry['hours'] = round(entry['median']*round_minutes/60, 1)
+        return entry
+
+    return simulate(players, sims=200, max_losses=max_losses, seed=0).summary(round_minutes)
+
+def suggestion_text(players, max_losses=3):
+    s = suggest(players, max_losses)
+    if not s:
+        return "Not enough participants for a suggestion."
+    return (f"With {s['players']} participants and {s['max_losses']} losses allowed, expect about {s['median']} rounds "
+            f"(90% of tournaments finish within {s['p90']}, roughly {s['hours']} hours). "
+            f"Usually only one undefeated player is left after {s['undefeated']} rounds.")
+
+def table_text(sizes=(8, 16, 32, 64, 128)):
+    return ', '.join(f"{size} players ~{suggest(size)['median']}" for size in sizes)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate Single Sided Swiss elimination tournaments")
+    parser.add_argument('--players', type=int, nargs='+', default=[8, 16, 32, 64, 128])
+    parser.add_argument('--sims', type=int, default=2000)
+    parser.add_argument('--max-losses', type=int, default=3)
+    parser.add_argument('--draw-rate', type=float, default=0.02)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--table', action='store_true', help="print a suggestion table for this module")
+    args = parser.parse_args(argv)
+
+    if args.table:
+        args.players = [4, 6, 8, 12, 16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512, 768, 1024, 2048]
+
+    for players in args.players:
+        result = simulate(players, args.sims, args.max_losses, None, args.draw_rate, args.drop_rate, args.seed, args.workers)
+        summary = result.summary()
+        if args.table:
+            print(f"        {players}: {{'max_losses': {summary['max_losses']}, 'median': {summary['median']}, "
+                    f"'p10': {summary['p10']}, 'p90': {summary['p90']}, 'undefeated': {summary['undefeated']}}},")
+        else:
+            curve = ' '.join(f"{x:.0f}" for x in result.curve[:summary['p90']])
+            print(f"{players:>5} players: median {summary['median']} rounds (p10 {summary['p10']}, p90 {summary['p90']}),"
+                    f" undefeated after {summary['undefeated']}, ~{summary['hours']}h | active: {curve}")
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,66 @@
 import uuid
 import itertools
-import random
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import logging
+import math
+import time
 from enum import Enum
-import networkx as nx
 import numpy as np
-import pandas as pd
+
+from angelarena import matching, kernels, metrics
 
 class Player(object):
-    def __init__(self, member):
-        self.id = uuid.uuid4()
-        self.member = member
-        self.matches = []
+    __slots__ = ()
 
     def __str__(self):
         return f"<..{str(self.id)[-3:]}>"
 
 class SSSPlayer(Player):
-    def __init__(self, member):
-        super().__init__(member)
-        self.matches = []
-        self.side_balance = 0 # pos = more corp than runner
-        self.score = 0
-        self.byes = 0
+    # Lightweight view on one row of an SSSStore
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index # row in the store and row/column in SSSSystem.opponents
+
+    @property
+    def id(self):
+        return self.store.ids[self.index]
+
+    @property
+    def member(self):
+        return self.store.members[self.index]
+
+    @property
+    def score(self):
+        return int(self.store.score[self.index])
+
+    @score.setter
+    def score(self, value):
+        self.store.score[self.index] = value
+
+    @property
+    def side_balance(self): # pos = more corp than runner
+        return int(self.store.side_balance[self.index])
+
+    @side_balance.setter
+    def side_balance(self, value):
+        self.store.side_balance[self.index] = value
+
+    @property
+    def byes(self):
+        return int(self.store.byes[self.index])
+
+    @byes.setter
+    def byes(self, value):
+        self.store.byes[self.index] = value
+
+    @property
+    def matches(self):
+        return [self.store.match_views[m] for m in self.store.matches_of(self.index)]
 
     def __str__(self):
         return f"<..{str(self.id)[-3:]}: {self.score}>"
@@ -30,16 +69,7 @@ class SSSPlayer(Player):
         return self.__str__()
 
 class SSSByePlayer(SSSPlayer):
-    def __init__(self):
-        super().__init__(None)
-
-    def __getattribute__(self, attr):
-        if attr == "score":
-            return -1
-        elif attr == "side_balance":
-            return 0
-        else:
-            return super().__getattribute__(attr)
+    __slots__ = ()
 
     def __str__(self):
         return f"<BYE>"
@@ -48,15 +78,35 @@ class SSSByePlayer(SSSPlayer):
         return self.__str__()
 
 class Match(object):
-    pass
+    __slots__ = ()
 
 class SSSMatch(Match):
-    def __init__(self, corp, runner, round_number):
-        self.corp = corp
-        self.runner = runner
-        self.round_number = round_number
+    # Lightweight view on one entry of the SSSStore match log
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
 
-        self.result = SSSResults.open
+    @property
+    def corp(self):
+        return self.store.views[self.store.match_corp[self.index]]
+
+    @property
+    def runner(self):
+        return self.store.views[self.store.match_runner[self.index]]
+
+    @property
+    def round_number(self):
+        return int(self.store.match_round[self.index])
+
+    @property
+    def result(self):
+        return SSSResults(self.store.match_result[self.index])
+
+    @result.setter
+    def result(self, value):
+        self.store.match_result[self.index] = value.value
 
     def opponent(self, p):
         if p == self.corp:
@@ -93,130 +143,504 @@ class SSSResults(Enum):
     draw = 3
     bye = 4
 
-class System(object):
-    pass
-
-class SSSSystem(System):
-    bye_player = SSSByePlayer()
+class SSSStatus(Enum):
+    active = 0
+    eliminated = 1
+    dropped = 2
+
+class SSSStore(object):
+    # Struct-of-arrays storage for the players and the match log of a System.
+    # A top cut keeps using the store of the Swiss rounds before it.
+    # Row 0 is the bye player, it always has score -1 and side balance 0.
+    def __init__(self, capacity=16):
+        self.count = 0
+        self.ids = []
+        self.members = []
+        self.views = []
+        self.score = np.zeros(capacity, dtype=np.int64)
+        self.side_balance = np.zeros(capacity, dtype=np.int64)
+        self.byes = np.zeros(capacity, dtype=np.int64)
+        self.status = np.zeros(capacity, dtype=np.int8)
+
+        # opponents[i][j] counts matches between the players in rows i and j
+        self.opponents = np.zeros((capacity, capacity), dtype=np.uint8)
+
+        self.match_count = 0
+        self.match_views = []
+        self.match_corp = np.zeros(capacity, dtype=np.int32)
+        self.match_runner = np.zeros(capacity, dtype=np.int32)
+        self.match_round = np.zeros(capacity, dtype=np.int32)
+        self.match_result = np.zeros(capacity, dtype=np.int8)
+
+        self.add_player(None, SSSByePlayer)
+        self.score[0] = -1
+
+    @staticmethod
+    def grown(array, capacity):
+        new = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        new[:len(array)] = array
+        return new
+
+    def add_player(self, member, view=SSSPlayer):
+        if self.count == len(self.score):
+            capacity = 2*len(self.score)
+            for name in ['score', 'side_balance', 'byes', 'status']:
+                setattr(self, name, self.grown(getattr(self, name), capacity))
+            opponents = np.zeros((capacity, capacity), dtype=self.opponents.dtype)
+            opponents[:self.count, :self.count] = self.opponents
+            self.opponents = opponents
+
+        index = self.count
+        self.count += 1
+        self.ids.append(uuid.uuid4())
+        self.members.append(member)
+        self.views.append(view(self, index))
+        return self.views[index]
+
+    def add_matches(self, corp, runner, round_number, result):
+        n = len(corp)
+        if self.match_count + n > len(self.match_corp):
+            capacity = max(2*len(self.match_corp), self.match_count + n)
+            for name in ['match_corp', 'match_runner', 'match_round', 'match_result']:
+                setattr(self, name, self.grown(getattr(self, name), capacity))
+
+        rows = slice(self.match_count, self.match_count + n)
+        self.match_corp[rows] = corp
+        self.match_runner[rows] = runner
+        self.match_round[rows] = round_number
+        self.match_result[rows] = result
+        self.match_views += [SSSMatch(self, m) for m in range(self.match_count, self.match_count + n)]
+        self.match_count += n
+
+        np.add.at(self.opponents, (corp, runner), 1)
+        np.add.at(self.opponents, (runner, corp), 1)
+        return self.match_views[rows]
+
+    def __getstate__(self):
+        # only pickle the used part of the arrays, they grow again on demand
+        state = self.__dict__.copy()
+        for name in ['score', 'side_balance', 'byes', 'status']:
+            state[name] = state[name][:self.count].copy()
+        state['opponents'] = state['opponents'][:self.count, :self.count].copy()
+        for name in ['match_corp', 'match_runner', 'match_round', 'match_result']:
+            state[name] = state[name][:self.match_count].copy()
+        return state
+
+    def matches_of(self, index):
+        n = self.match_count
+        return np.flatnonzero((self.match_corp[:n] == index) | (self.match_runner[:n] == index))
+
+SSSStanding = collections.namedtuple('SSSStanding', ['rank', 'player', 'score', 'sos', 'esos', 'side_balance'])
 
-    def __init__(self, max_losses = 3, max_rounds = None):
+class System(object):
+    # Shared pairing core of all tournament systems. Players and matches live
+    # in an SSSStore, pairing weights come from the PairingKernel and
+    # matchings from one of the engines in matching.py. Subclasses decide how
+    # a round is paired and what its results are worth.
+    win_points = 1
+    draw_points = 0
+    bye_points = 1
+    games_per_round = 1 # matches every paired player plays per round
+    side_penalty = True # whether the weights keep side bias in check
+    reportable = (1, 2, 3) # SSSResults.win_corp, win_runner and draw
+
+    def __init__(self, engine = 'blossom', pairing_mode = 'dense', pairing_workers = None, dtype = np.float64, seed = None, store = None):
+        # Indices into the store are never reused so dropped and eliminated
+        # players keep their history.
+        self.store = SSSStore() if store is None else store
+        self.bye_player = self.store.views[0]
         self.players = []
         self.eliminated = []
         self.dropped = []
         self.rounds = []
-        self.max_losses = max_losses
-        self.max_rounds = max_rounds
 
         self.score_factor = 1
         self.repair_penalty = 10000
+        self.engine = matching.get_engine(engine)
+        self.kernel = kernels.PairingKernel(dtype)
+        self.rng = np.random.default_rng(seed)
+
+        # 'dense' solves one problem over all players, 'brackets' solves each
+        # score bracket on its own, optionally across `pairing_workers` processes
+        self.pairing_mode = pairing_mode
+        self.pairing_workers = pairing_workers
+
+        # 'sparse' only offers each player its `sparse_k` closest opponents and
+        # widens that until a perfect matching exists, see pairing_stats
+        self.sparse_k = 8
+        self.pairing_stats = collections.Counter()
+
+        # seconds spent per pairing stage, accumulated until cleared
+        self.stage_times = collections.defaultdict(float)
+
+        # Matches of finished rounds form a prefix of the store's match log.
+        # Standings are cached until results_version changes.
+        self.finished_matches = self.store.match_count
+        self.results_version = 0
+
+        # current_matches[i] is the match of player row i in the open round
+        # or -1, see match_index
+        self.current_matches = np.zeros(0, dtype=np.intp)
+        self.standings_cache = None
+
+    @property
+    def opponents(self):
+        return self.store.opponents
 
     def add_new_player(self, member):
-        p = SSSPlayer(member)
+        p = self.store.add_player(member)
         self.players.append(p)
 
-    def make_score_penalty_array(self):
-        df = np.array([[player.score for player in self.players]])
+    def player_indices(self, players=None):
+        players = self.players if players is None else players
+        return np.fromiter((player.index for player in players), dtype=np.intp, count=len(players))
+
+    def make_score_penalty_array(self, players=None):
+        df = self.store.score[None, self.player_indices(players)]
         df = abs(df - df.T)*self.score_factor
         return df
 
-    def make_side_penalty_array(self):
-        df = np.array([[player.side_balance for player in self.players]])
+    def make_side_penalty_array(self, players=None):
+        df = self.store.side_balance[None, self.player_indices(players)]
         same_bias = ((df * df.T)> 0)
         np.fill_diagonal(same_bias,0)
         min_bias = np.minimum(abs(df), abs(df.T))
         return (8**(min_bias))*same_bias
 
-    def make_repair_penalty_array(self):
-        penalty = np.zeros((len(self.players), len(self.players)))
-        for i in range(len(self.players)):
-            for j in range(i, len(self.players)):
-                p1 = self.players[i]
-                p2 = self.players[j]
-                penalty[j][i] = len(list(filter(lambda match: p2 in match, p1.matches)))
-        penalty = penalty + penalty.T - np.diag(np.diag(penalty)) # fill other triangle
-        np.fill_diagonal(penalty, 0)
-        penalty *= self.repair_penalty
-        return penalty
-
-    def make_bye_bonus_array(self):
-        df = np.array([[player.byes for player in self.players]])
+    def make_repair_penalty_array(self, players=None):
+        idx = self.player_indices(players)
+        return self.opponents[np.ix_(idx, idx)].astype(np.int64) * self.repair_penalty
+
+    def make_bye_bonus_array(self, players=None):
+        df = self.store.byes[None, self.player_indices(players)]
         bonus = abs(df - df.T)+1
         return bonus
 
-    def make_pairings_matrix(self):
-        pairing_matrix = 20000 \
-                - self.make_score_penalty_array() \
-                - self.make_side_penalty_array() \
-                - self.make_repair_penalty_array()
-        pairing_matrix *= self.make_bye_bonus_array()
-        pairing_matrix += np.random.randint(0,10,size=(len(self.players), len(self.players)))
-        pairing_matrix = pd.DataFrame(pairing_matrix, \
-                index = [player for player in self.players], \
-                columns = [player for player in self.players])
-        return pairing_matrix
-
-    def pair_new_round(self):
-        round = []
-        round_number = len(self.rounds)+1
-
+    @contextlib.contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.stage_times[stage] += seconds
+            metrics.REGISTRY.observe('sss_stage_seconds', seconds, stage=stage)
+
+    def make_pairings_matrix(self, players=None, out=None):
+        # The returned matrix lives in a buffer reused by the next call unless
+        # `out` is given.
+        store = self.store
+        with self.timed('matrix'):
+            return self.kernel(store.score, store.side_balance, store.byes, store.opponents,
+                    self.player_indices(players), self.rng, self.score_factor, self.repair_penalty, out, self.side_penalty)
+
+    def solve(self, pairing_matrix, mask=None):
+        with self.timed('matching'):
+            return self.engine.match(pairing_matrix, mask)
+
+    def make_pairings(self):
+        if self.pairing_mode == 'dense':
+            pairing_matrix = self.make_pairings_matrix()
+            return [(self.players[i], self.players[j]) for i, j in self.solve(pairing_matrix)]
+        elif self.pairing_mode == 'brackets':
+            return self.make_bracket_pairings()
+        elif self.pairing_mode == 'sparse':
+            return self.make_sparse_pairings()
+        else:
+            raise Exception(f"Unknown pairing mode '{self.pairing_mode}'")
+
+    def make_candidate_mask(self, pairing_matrix, k):
+        # The k best weighted opponents per player are its closest ones by
+        # score and side penalties, the noise term breaks ties randomly.
+        n = len(self.players)
+        cost = -pairing_matrix.astype(float)
+        cost[self.make_repair_penalty_array() > 0] = np.inf
+        np.fill_diagonal(cost, np.inf)
+
+        nearest = np.argpartition(cost, k-1, axis=1)[:, :k]
+        rows = np.repeat(np.arange(n), k)
+        cols = nearest.ravel()
+        valid = np.isfinite(cost[rows, cols])
+
+        mask = np.zeros((n, n), dtype=bool)
+        mask[rows[valid], cols[valid]] = True
+        return mask | mask.T
+
+    def make_sparse_pairings(self):
+        n = len(self.players)
+        pairing_matrix = self.make_pairings_matrix()
+        self.pairing_stats['sparse'] += 1
+
+        k = self.sparse_k
+        while k < n-1:
+            pairings = self.solve(pairing_matrix, self.make_candidate_mask(pairing_matrix, k))
+            if 2*len(pairings) == n:
+                return [(self.players[i], self.players[j]) for i, j in pairings]
+            k *= 2
+            self.pairing_stats['sparse_widened'] += 1
+
+        # Either only matchings with rematches are left or the field is small
+        # enough that the candidate graph would be complete anyway
+        if k != self.sparse_k:
+            logging.info(f"Sparse pairing fell back to the dense matrix for {n} players")
+            self.pairing_stats['dense_fallback'] += 1
+        return [(self.players[i], self.players[j]) for i, j in self.solve(pairing_matrix)]
+
+    def make_bracket_groups(self):
+        # Split into score brackets from the top down. A bracket floats some of
+        # its own players into the next one if it has an odd number of players
+        # or more players biased to one side than it can pair corp against
+        # runner while the next bracket is short of exactly those players.
+        # Floaters coming from above are always paired in their new bracket.
+        players = sorted(self.players, key=lambda player: player.score, reverse=True)
+        brackets = [list(g) for _, g in itertools.groupby(players, key=lambda player: player.score)]
+
+        groups = []
+        floaters = []
+        for k, natives in enumerate(brackets):
+            group = floaters + natives
+            floaters = []
+
+            count = 0
+            if k+1 < len(brackets):
+                surplus, neutral = self.side_surplus(group)
+                below, _ = self.side_surplus(brackets[k+1])
+                if surplus*below < 0:
+                    count = min(max(abs(surplus) - neutral, 0), abs(below), len(natives))
+            if (len(group) - count) % 2 == 1:
+                count += 1 if count < len(natives) else -1
+
+            for _ in range(count):
+                candidates = [player for player in natives if player in group]
+                floater = self.choose_floater(group, candidates, brackets[k+1])
+                group.remove(floater)
+                floaters.append(floater)
+            if group:
+                groups.append(group)
+        return groups
+
+    def side_surplus(self, players):
+        signs = np.sign(self.store.side_balance[self.player_indices(players)])
+        return int(signs.sum()), int((signs == 0).sum())
+
+    def choose_floater(self, group, candidates, below):
+        # Float from the side that is over-represented in the bracket so the
+        # remaining players can still be paired corp against runner.
+        surplus, _ = self.side_surplus(group)
+        if surplus:
+            balancing = [player for player in candidates if np.sign(player.side_balance) == np.sign(surplus)]
+            candidates = balancing or candidates
+
+        weights = self.make_pairings_matrix(candidates + below)
+        best = weights[:len(candidates), len(candidates):].max(axis=1)
+        return candidates[int(np.argmax(best))]
+
+    def has_rematch(self, pairings):
+        return any(self.store.opponents[p0.index, p1.index] for p0, p1 in pairings)
+
+    def make_bracket_pairings(self):
+        groups = self.make_bracket_groups()
+        solutions = [None]*len(groups)
+
+        executor = None
+        if self.pairing_workers and len(groups) > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(self.pairing_workers)
+
+        try:
+            while True:
+                todo = [k for k, solution in enumerate(solutions) if solution is None]
+                matrices = [self.make_pairings_matrix(groups[k]).copy() for k in todo]
+                with self.timed('matching'):
+                    if executor and len(todo) > 1:
+                        results = list(executor.map(self.engine.match, matrices))
+                    else:
+                        results = [self.engine.match(m) for m in matrices]
+                for k, result in zip(todo, results):
+                    solutions[k] = [(groups[k][i], groups[k][j]) for i, j in result]
+
+                # A rematch inside a bracket might be avoidable with players of
+                # the neighbouring bracket. Merge and solve again until no
+                # rematches are left or everything is one dense problem.
+                k = next((k for k, solution in enumerate(solutions) if self.has_rematch(solution)), None)
+                if k is None or len(groups) == 1:
+                    return [p for solution in solutions for p in solution]
+
+                k = min(k, len(groups)-2)
+                groups[k:k+2] = [groups[k] + groups[k+1]]
+                solutions[k:k+2] = [None]
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def seat_bye_player(self):
         if self.bye_player in self.players:
             self.players.remove(self.bye_player)
 
         if len(self.players) % 2 == 1:
             self.players.append(self.bye_player)
 
-        pairing_matrix = self.make_pairings_matrix()
-        pairing_graph = nx.convert_matrix.from_pandas_adjacency(pairing_matrix)
-        pairings = nx.max_weight_matching(pairing_graph,maxcardinality=True)
-
-        for p in pairings:
-            p0corps = (p[1].side_balance-p[0].side_balance > 0)
-            if p[1].side_balance-p[0].side_balance == 0:
-                p0corps = bool(random.getrandbits(1))
-
-            if p0corps:
-                corp = p[0]
-                runner = p[1]
-            else:
-                corp = p[1]
-                runner = p[0]
-
-            match = SSSMatch(corp, runner, round_number)
-            round.append(match)
-            corp.side_balance += 1
-            corp.matches.append(match)
-            runner.side_balance -= 1
-            runner.matches.append(match)
-
-            if self.bye_player in match:
-                match.result = SSSResults.bye
+    def add_round(self, corp, runner):
+        # Starts a round with the given corp and runner rows, table by table.
+        # Used by pair_new_round and to replay recorded rounds.
+        self.seat_bye_player()
+        corp = np.asarray(corp, dtype=np.intp)
+        runner = np.asarray(runner, dtype=np.intp)
+
+        round_number = len(self.rounds)+1
+        result = np.where((corp == 0) | (runner == 0), SSSResults.bye.value, SSSResults.open.value)
+        start = self.store.match_count
+        round = self.store.add_matches(corp, runner, round_number, result)
+
+        self.current_matches = np.full(self.store.count, -1, dtype=np.intp)
+        self.current_matches[corp] = np.arange(start, start + len(corp))
+        self.current_matches[runner] = np.arange(start, start + len(runner))
+
+        side = self.store.side_balance
+        np.add.at(side, corp, 1)
+        np.add.at(side, runner, -1)
+        side[0] = 0
 
         self.rounds.append(round)
+        return round
+
+    def match_index(self, key):
+        # Position in the match log of the current round's match of a player
+        # or at a table. Tables are numbered from 1 in pairing order.
+        store = self.store
+        if store.match_count == self.finished_matches:
+            raise Exception("No round in progress.")
+
+        if isinstance(key, Player):
+            if key.index >= len(self.current_matches) or self.current_matches[key.index] < 0:
+                raise Exception(f"{key} is not paired in the current round.")
+            return int(self.current_matches[key.index])
+
+        table = int(key)
+        if not 1 <= table <= store.match_count - self.finished_matches:
+            raise Exception(f"There is no table {table} in the current round.")
+        return self.finished_matches + table - 1
+
+    def current_match(self, key):
+        return self.store.match_views[self.match_index(key)]
+
+    def report_results(self, results):
+        # Records many results of the current round at once. `results` maps
+        # players or table numbers to SSSResults, either as dict or as
+        # sequence of pairs. Nothing is written unless every result is valid.
+        # Returns the number of matches of the round that are still open.
+        if isinstance(results, dict):
+            results = results.items()
+
+        matches = []
+        values = []
+        for key, result in results:
+            result = SSSResults(result)
+            if not result.value in self.reportable:
+                raise Exception(f"Result '{result.name}' cannot be reported.")
+            matches.append(self.match_index(key))
+            values.append(result.value)
+
+        store = self.store
+        matches = np.array(matches, dtype=np.intp)
+        values = np.array(values, dtype=store.match_result.dtype)
+
+        byes = store.match_result[matches] == SSSResults.bye.value
+        if byes.any():
+            raise Exception(f"Table {matches[byes][0] - self.finished_matches + 1} is a bye.")
+
+        order = np.argsort(matches, kind='stable')
+        same = matches[order][1:] == matches[order][:-1]
+        conflicts = same & (values[order][1:] != values[order][:-1])
+        if conflicts.any():
+            raise Exception(f"Conflicting results for table {matches[order][1:][conflicts][0] - self.finished_matches + 1}.")
+
+        store.match_result[matches] = values
+        return self.open_matches()
+
+    def open_matches(self):
+        # matches of the current round without a result
+        store = self.store
+        return int((store.match_result[self.finished_matches:store.match_count] == SSSResults.open.value).sum())
+
+    def round_in_progress(self):
+        return self.store.match_count > self.finished_matches
+
+    def over(self):
+        # no further round is paired once a single player is left
+        return len(self.players) - (self.bye_player in self.players) <= 1
 
     def finish_round(self):
-        round = self.rounds[-1]
+        store = self.store
+        rows = slice(self.finished_matches, store.match_count)
+        result = store.match_result[rows]
 
-        if next(filter(lambda match: match.result == SSSResults.open, round), None):
+        if (result == SSSResults.open.value).any():
             raise Exception("Tried to finish round with open results.")
 
         if self.bye_player in self.players:
             self.players.remove(self.bye_player)
 
-        for match in round:
-            if match.result == SSSResults.win_corp:
-                match.corp.score += 1
-            elif match.result == SSSResults.win_runner:
-                match.runner.score += 1
-            elif match.result == SSSResults.bye:
-                player = match.opponent(self.bye_player)
-                player.byes += 1
-                player.score += 1
-
-        for player in self.players:
-            losses = len(self.rounds)-player.score
-            if losses > self.max_losses:
-                self.players.remove(player)
-                self.eliminated.append(player)
+        # Everyone plays each side at most once per round, so the fancy
+        # indexed increments below never hit a row twice. The bye player is
+        # row 0, so corp + runner of a bye match is the player who got the bye.
+        corp = store.match_corp[rows]
+        runner = store.match_runner[rows]
+        store.score[corp[result == SSSResults.win_corp.value]] += self.win_points
+        store.score[runner[result == SSSResults.win_runner.value]] += self.win_points
+        draw = result == SSSResults.draw.value
+        store.score[corp[draw]] += self.draw_points
+        store.score[runner[draw]] += self.draw_points
+        bye = (corp + runner)[result == SSSResults.bye.value]
+        store.byes[bye] += 1
+        store.score[bye] += self.bye_points
+
+        self.eliminate(corp, runner, result)
+
+        self.finished_matches = store.match_count
+        self.current_matches = np.zeros(0, dtype=np.intp)
+        self.results_version += 1
+
+    def eliminate(self, corp, runner, result):
+        # Called with the matches of a round as it finishes, after scoring.
+        # Systems that knock players out move them to self.eliminated here.
+        pass
+
+    def standings(self):
+        if self.standings_cache and self.standings_cache[0] == self.results_version:
+            return self.standings_cache[1]
+
+        # Points per round of each player, strength of schedule as the mean
+        # over all opponents and extended SoS as the mean of their SoS. Byes
+        # count as played rounds but not as opponents.
+        store = self.store
+        n = store.count
+        corp = store.match_corp[:self.finished_matches]
+        runner = store.match_runner[:self.finished_matches]
+        real = (corp != 0) & (runner != 0)
+        corp = corp[real]
+        runner = runner[real]
+
+        games = np.bincount(corp, minlength=n) + np.bincount(runner, minlength=n)
+        played = games/self.games_per_round + store.byes[:n]
+        score = store.score[:n]
+        points = np.divide(score, played, out=np.zeros(n), where=played > 0)
+
+        def opponent_mean(values):
+            total = np.bincount(corp, weights=values[runner], minlength=n) \
+                    + np.bincount(runner, weights=values[corp], minlength=n)
+            return np.divide(total, games, out=np.zeros(n), where=games > 0)
+
+        sos = opponent_mean(points)
+        esos = opponent_mean(sos)
+        side = np.abs(store.side_balance[:n])
+
+        idx = np.arange(1, n)
+        order = idx[np.lexsort((idx, side[idx], -esos[idx], -sos[idx], -score[idx]))]
+        standings = [SSSStanding(rank+1, store.views[i], int(score[i]), float(sos[i]), float(esos[i]), int(store.side_balance[i]))
+                for rank, i in enumerate(order)]
+
+        self.standings_cache = (self.results_version, standings)
+        return standings
 
     def drop_player(self, player):
         if not player in self.players:
@@ -224,3 +648,301 @@ class SSSSystem(System):
 
         self.players.remove(player)
         self.dropped.append(player)
+        self.store.status[player.index] = SSSStatus.dropped.value
+
+    def top_cut(self, size, double=False):
+        # Elimination bracket on the same store, seeded with the best `size`
+        # players of the standings who did not drop
+        if self.round_in_progress():
+            raise Exception("Finish the round before starting the cut.")
+        dropped = SSSStatus.dropped.value
+        seeds = [s.player.index for s in self.standings() if self.store.status[s.player.index] != dropped][:size]
+        cut = EliminationSystem(self.store, seeds, double)
+        cut.rng = self.rng
+        return cut
+
+class SSSSystem(System):
+    # Single-Sided Swiss: one game per round, players are eliminated after
+    # `max_losses` losses
+    def __init__(self, max_losses = 3, max_rounds = None, engine = 'blossom', pairing_mode = 'dense', pairing_workers = None, dtype = np.float64, seed = None):
+        super().__init__(engine, pairing_mode, pairing_workers, dtype, seed)
+        self.max_losses = max_losses
+        self.max_rounds = max_rounds
+
+    def pair_new_round(self):
+        self.seat_bye_player()
+
+        pairings = self.make_pairings()
+        p0 = np.array([p[0].index for p in pairings], dtype=np.intp)
+        p1 = np.array([p[1].index for p in pairings], dtype=np.intp)
+
+        # the player with less corp games so far plays corp, coin flip on ties
+        side = self.store.side_balance
+        p0corps = side[p1] - side[p0] > 0
+        ties = side[p1] == side[p0]
+        p0corps[ties] = self.rng.integers(0, 2, size=ties.sum()).astype(bool)
+
+        corp = np.where(p0corps, p0, p1)
+        runner = np.where(p0corps, p1, p0)
+        return self.add_round(corp, runner)
+
+    def over(self):
+        # no further round is paired once a single player is left or the
+        # round limit is reached
+        return super().over() or self.max_rounds is not None and len(self.rounds) >= self.max_rounds
+
+    def eliminate(self, corp, runner, result):
+        store = self.store
+        idx = self.player_indices()
+        out = len(self.rounds) - store.score[idx] > self.max_losses
+        if out.any():
+            store.status[idx[out]] = SSSStatus.eliminated.value
+            self.eliminated += [player for player, o in zip(self.players, out) if o]
+            self.players = [player for player, o in zip(self.players, out) if not o]
+
+class DSSSystem(System):
+    # Double-Sided Swiss: paired players play one game on each side per round.
+    # A won game is worth 3 points, a draw 1 and a bye 6. Tables count games,
+    # the two games of a pairing are on neighbouring tables.
+    win_points = 3
+    draw_points = 1
+    bye_points = 6
+    games_per_round = 2
+    side_penalty = False # everyone plays both sides every round
+
+    def __init__(self, max_rounds = None, engine = 'blossom', pairing_mode = 'dense', pairing_workers = None, dtype = np.float64, seed = None):
+        super().__init__(engine, pairing_mode, pairing_workers, dtype, seed)
+        self.max_rounds = max_rounds
+
+    def planned_rounds(self):
+        # log2 of the number of registered players unless a limit was set
+        if self.max_rounds is not None:
+            return self.max_rounds
+        return max(1, math.ceil(math.log2(max(self.store.count - 1, 2))))
+
+    def pair_new_round(self):
+        self.seat_bye_player()
+
+        pairings = self.make_pairings()
+        p0 = np.array([p[0].index for p in pairings], dtype=np.intp)
+        p1 = np.array([p[1].index for p in pairings], dtype=np.intp)
+
+        real = (p0 != 0) & (p1 != 0)
+        corp = np.stack([p0[real], p1[real]], axis=1).ravel()
+        runner = np.stack([p1[real], p0[real]], axis=1).ravel()
+        bye = (p0 + p1)[~real]
+        corp = np.concatenate([corp, bye])
+        runner = np.concatenate([runner, np.zeros_like(bye)])
+        return self.add_round(corp, runner)
+
+    def add_round(self, corp, runner):
+        round = super().add_round(corp, runner)
+        # a bye is no game on either side
+        corp = np.asarray(corp, dtype=np.intp)
+        runner = np.asarray(runner, dtype=np.intp)
+        side = self.store.side_balance
+        side[corp[runner == 0]] -= 1
+        side[runner[corp == 0]] += 1
+        side[0] = 0
+        return round
+
+    def over(self):
+        return super().over() or len(self.rounds) >= self.planned_rounds()
+
+def seed_order(slots):
+    # Seeds of a bracket of `slots` players from the top, neighbours meet in
+    # the first round. 1 meets `slots` and the top two can only meet in the
+    # final.
+    order = [1]
+    while len(order) < slots:
+        total = 2*len(order) + 1
+        order = [s for seed in order for s in (seed, total - seed)]
+    return order
+
+@functools.lru_cache(maxsize=None)
+def bracket(size, double=False):
+    # The matches of an elimination bracket for `size` seeds in the order
+    # they can be played. Every match is (source, source, stage), a source
+    # being ('seed', n), ('winner', match) or ('loser', match). Missing seeds
+    # are byes. Double elimination ends with a grand final and its reset,
+    # which is only played if the player from the losers bracket wins.
+    slots = 2**math.ceil(math.log2(size))
+    order = seed_order(slots)
+    matches = []
+
+    def add(a, b, stage):
+        matches.append((a, b, stage))
+        return len(matches) - 1
+
+    current = [add(('seed', order[k]), ('seed', order[k+1]), 'winners') for k in range(0, slots, 2)]
+    winners = [current]
+    while len(current) > 1:
+        current = [add(('winner', current[k]), ('winner', current[k+1]), 'winners') for k in range(0, len(current), 2)]
+        winners.append(current)
+    if not double:
+        return tuple(matches)
+
+    first = winners[0]
+    losers = [add(('loser', first[k]), ('loser', first[k+1]), 'losers') for k in range(0, len(first), 2)]
+    for r in range(1, len(winners)):
+        # players dropping from the winners bracket come in reversed every
+        # other round to put off rematches
+        drops = winners[r] if r % 2 else winners[r][::-1]
+        losers = [add(('winner', m), ('loser', d), 'losers') for m, d in zip(losers, drops)]
+        if len(losers) > 1:
+            losers = [add(('winner', losers[k]), ('winner', losers[k+1]), 'losers') for k in range(0, len(losers), 2)]
+    final = add(('winner', winners[-1][0]), ('winner', losers[0]), 'final')
+    add(('winner', final), ('loser', final), 'reset')
+    return tuple(matches)
+
+class EliminationSystem(System):
+    # Single or double elimination top cut. It shares the store of the Swiss
+    # rounds before it, so the match log and every player's history carry
+    # over. The bracket only depends on the number of seeds and is built once
+    # per size, seeding it from the standings takes no pairing at all. Every
+    # round plays the matches whose players are known. The player with fewer
+    # corp games so far plays corp, the higher seed on ties.
+    win_points = 0
+    bye_points = 0
+    reportable = (1, 2) # SSSResults.win_corp and win_runner, no draws in the cut
+
+    def __init__(self, store, seeds, double=False):
+        super().__init__(store=store)
+        if len(seeds) < (4 if double else 2):
+            raise Exception(f"A {'double' if double else 'single'} elimination cut needs at least {4 if double else 2} players.")
+        self.double = double
+        self.seeds = np.asarray(seeds, dtype=np.intp) # player rows by seed
+        self.seed_of = np.full(store.count, len(seeds) + 1, dtype=np.intp)
+        self.seed_of[self.seeds] = np.arange(1, len(seeds) + 1)
+        self.bracket = bracket(len(seeds), double)
+
+        # per bracket match: player rows of winner and loser once decided
+        # (0 for a bye), the row in the match log once it is played
+        self.winners = np.full(len(self.bracket), -1, dtype=np.intp)
+        self.losers = np.full(len(self.bracket), -1, dtype=np.intp)
+        self.rows = np.full(len(self.bracket), -1, dtype=np.intp)
+
+        self.players = [store.views[i] for i in self.seeds]
+        self.resolve()
+
+    def source(self, source):
+        # Player row a source stands for, 0 for a bye and -1 while unknown.
+        # Players who dropped out of the cut are byes from then on.
+        kind, value = source
+        if kind == 'seed':
+            row = self.seeds[value-1] if value <= len(self.seeds) else 0
+        elif kind == 'winner':
+            row = self.winners[value]
+        else:
+            row = self.losers[value]
+        if row > 0 and self.store.status[row] == SSSStatus.dropped.value:
+            return 0
+        return int(row)
+
+    def resolve(self):
+        # Decides the matches that need not be played: byes and the reset of
+        # a grand final won by the winners bracket. Sources only refer to
+        # earlier matches, so one pass settles everything.
+        for m, (a, b, stage) in enumerate(self.bracket):
+            if self.winners[m] >= 0 or self.rows[m] >= 0:
+                continue
+            a, b = self.source(a), self.source(b)
+            if a < 0 or b < 0:
+                continue
+            if stage == 'reset' and a == self.source(self.bracket[self.bracket[m][0][1]][0]):
+                self.winners[m], self.losers[m] = a, b
+            elif a == 0 or b == 0:
+                self.winners[m], self.losers[m] = a or b, 0
+
+    def ready(self):
+        # bracket matches that can be played now
+        return [m for m, (a, b, stage) in enumerate(self.bracket)
+                if self.winners[m] < 0 and self.rows[m] < 0 and self.source(a) > 0 and self.source(b) > 0]
+
+    def seat_bye_player(self):
+        # byes are settled in the bracket, no bye matches are played
+        pass
+
+    def pair_new_round(self):
+        with self.timed('bracket'):
+            ready = self.ready()
+            if not ready:
+                raise Exception("No match of the bracket can be played.")
+            a = np.array([self.source(self.bracket[m][0]) for m in ready], dtype=np.intp)
+            b = np.array([self.source(self.bracket[m][1]) for m in ready], dtype=np.intp)
+
+            side = self.store.side_balance
+            a_corps = (side[a] < side[b]) | ((side[a] == side[b]) & (self.seed_of[a] < self.seed_of[b]))
+            corp = np.where(a_corps, a, b)
+            runner = np.where(a_corps, b, a)
+        return self.add_round(corp, runner)
+
+    def add_round(self, corp, runner):
+        # Recorded rounds are replayed through here too, so the bracket match
+        # of every table is looked up by its players.
+        ready = {frozenset((self.source(self.bracket[m][0]), self.source(self.bracket[m][1]))): m for m in self.ready()}
+        matches = []
+        for c, r in zip(corp, runner):
+            m = ready.pop(frozenset((int(c), int(r))), None)
+            if m is None:
+                raise Exception(f"{self.store.views[c]} against {self.store.views[r]} is not a match of the bracket.")
+            matches.append(m)
+
+        start = self.store.match_count
+        self.rows[matches] = np.arange(start, start + len(matches))
+        return super().add_round(corp, runner)
+
+    def eliminate(self, corp, runner, result):
+        played = np.flatnonzero(self.rows >= self.finished_matches)
+        tables = self.rows[played] - self.finished_matches
+        corp_won = result[tables] == SSSResults.win_corp.value
+        self.winners[played] = np.where(corp_won, corp[tables], runner[tables])
+        self.losers[played] = np.where(corp_won, runner[tables], corp[tables])
+        self.resolve()
+
+        alive = self.alive()
+        out = [player for player in self.players if not player.index in alive]
+        if out:
+            self.store.status[self.player_indices(out)] = SSSStatus.eliminated.value
+            self.eliminated += out
+            self.players = [player for player in self.players if player.index in alive]
+
+    def alive(self):
+        # rows of the players who still have a match to play or won the cut
+        if self.over():
+            return {int(self.winners[-1])}
+        return {self.source(s) for m, match in enumerate(self.bracket) if self.winners[m] < 0 for s in match[:2]}
+
+    def drop_player(self, player):
+        super().drop_player(player)
+        self.resolve()
+
+    def over(self):
+        return self.winners[-1] >= 0
+
+    def champion(self):
+        return self.store.views[self.winners[-1]] if self.over() and self.winners[-1] > 0 else None
+
+    def standings(self):
+        if self.standings_cache and self.standings_cache[0] == self.results_version:
+            return self.standings_cache[1]
+
+        # Players still in the cut first, the others by how late they lost
+        # their last match, ties by seed. Score counts the matches won in the
+        # cut, there is no strength of schedule.
+        store = self.store
+        played = np.flatnonzero((self.rows >= 0) & (self.winners >= 0))
+        wins = np.bincount(self.winners[played], minlength=store.count)
+        out_at = np.full(store.count, len(self.bracket), dtype=np.intp)
+        eliminated = self.player_indices(self.eliminated)
+        last_loss = np.full(store.count, -1, dtype=np.intp)
+        np.maximum.at(last_loss, self.losers[played], played)
+        out_at[eliminated] = last_loss[eliminated]
+
+        idx = self.seeds
+        order = idx[np.lexsort((self.seed_of[idx], -out_at[idx]))]
+        standings = [SSSStanding(rank+1, store.views[i], int(wins[i]), 0.0, 0.0, int(store.side_balance[i]))
+                for rank, i in enumerate(order)]
+
+        self.standings_cache = (self.results_version, standings)
+        return standings
@@ -2,15 +2,19 @@ import logging
 
 import uuid
 
-from angelarena import wizard, system
+from angelarena import wizard, simulator, rendering, imports
+
+system = imports.module('angelarena.system') # the pairing stack, imported when a tournament starts
 
 SYSTEMS = {\
         'SSS': 'Single Sided Swiss',\
-        #  'DSS': 'Double Sided Swiss (no cut)',\
-        #  'DSS+Cut': 'Double Sided Swiss with a top cut',\
+        'DSS': 'Double Sided Swiss (no cut)',\
+        'DSS+Cut': 'Double Sided Swiss with a top cut',\
         }
 
 class TournamentCreationWizard(wizard.DMWizard):
+    kind = 'creation'
+
     def __init__(self, cog, person):
         self.cog = cog
         self.person = person
@@ -18,6 +22,16 @@ class TournamentCreationWizard(wizard.DMWizard):
 
         self.data = {'organizer': person.id}
 
+    def state(self):
+        return {'stage': self.stage, 'data': self.data}
+
+    @staticmethod
+    def restore(cog, person, state):
+        w = TournamentCreationWizard(cog, person)
+        w.stage = state['stage']
+        w.data = state['data']
+        return w
+
     async def on_message(self, ctx):
         if self.stage == 0:
             await self.person.send("Hi, I can help you start a tournament on Angel Arena. Since you are not in the list of trusted TOs, this tournament will need to be accepted by an administrator before it goes live.\n\nYou can always go back one step by saying `!back` or cancel the tournament creation entirely by saying `!cancel`.\n\n**Step 1**\nWhat's the name of the tournament?")
@@ -42,34 +56,39 @@ class TournamentCreationWizard(wizard.DMWizard):
             else:
                 self.data['system'] = ctx.content
 
-                await self.person.send("Tournament system is:\n> {1}\n\n**Step 4**\nPlease give us some additional information about your tournament.".format(self.data, SYSTEMS[self.data['system']]))
+                hint = ""
+                if self.data['system'] == 'SSS':
+                    hint = "\nWith 3 losses allowed, expected number of rounds: {0}.".format(simulator.table_text())
+
+                await self.person.send("Tournament system is:\n> {1}{2}\n\n**Step 4**\nPlease give us some additional information about your tournament.".format(self.data, SYSTEMS[self.data['system']], hint))
                 self.stage += 1
 
         elif self.stage == 4:
             self.data['desc'] = ctx.content
 
             t = Tournament.create_from_data(self.data)
-            await self.person.send("The information you entered is:\n{0}\n\n If this is correct, answer `yes`.".format(t.description()))
+            await self.person.send("The information you entered is:\n{0}\n\n If this is correct, answer `yes`.".format(rendering.header(t)))
             self.stage += 1
 
         elif self.stage == 5:
             if ctx.content == "yes":
                 await self.create_tournament()
                 await self.person.send("Your tournament has been submitted. Good luck and have fun!")
-                del self.cog.wizards[ctx.channel]
+                self.cog.wizards.pop(self.person.id)
             else:
                 await self.person.send("Cancelling tournament creation.")
-                del self.cog.wizards[ctx.channel]
+                self.cog.wizards.pop(self.person.id)
         else:
             await self.person.send("This should not have happened... Please try again.")
-            del self.cog.wizards[ctx.channel]
+            self.cog.wizards.pop(self.person.id)
 
     async def create_tournament(self):
-        if self.data['system'] == 'SSS':
-            t = SSSTournament.create_from_data(self.data)
+        t = TOURNAMENTS[self.data['system']].create_from_data(self.data)
         await self.cog.add_tournament(t)
 
 class TournamentCheckInWizard(wizard.DMWizard):
+    kind = 'check_in'
+
     def __init__(self, cog, tournament, person):
         self.cog = cog
         self.tournament = tournament
@@ -79,6 +98,20 @@ class TournamentCheckInWizard(wizard.DMWizard):
         self.runner_deck = None
         self.stage = 0
 
+    def state(self):
+        return {'tournament_id': self.tournament.id, 'stage': self.stage, 'corp_deck': self.corp_deck, 'runner_deck': self.runner_deck}
+
+    @staticmethod
+    def restore(cog, person, state):
+        t = cog.tournaments.get(state['tournament_id'])
+        if t is None:
+            return None
+        w = TournamentCheckInWizard(cog, t, person)
+        w.stage = state['stage']
+        w.corp_deck = state['corp_deck']
+        w.runner_deck = state['runner_deck']
+        return w
+
     async def on_message(self, ctx):
         if self.stage == 0:
             await self.person.send(f"Welcome to {self.tournament.title}! Please check in by sending me both your Runner and Corp decklist in the form of a NetrunnerDB link.")
@@ -92,8 +125,15 @@ class TournamentCheckInWizard(wizard.DMWizard):
             self.stage = 0
             await self.on_message(ctx)
 
+WIZARDS = {
+        TournamentCreationWizard.kind: TournamentCreationWizard,
+        TournamentCheckInWizard.kind: TournamentCheckInWizard,
+        }
+
 class Tournament(object):
     system_text = "Undefined system"
+    version = 0 # bumped on every change, keys the description rendering
+    continuation_ids = [] # further messages the description is split across
 
     def __init__(self, title, organizer_id, desc, format):
         self.id = uuid.uuid4()
@@ -113,16 +153,112 @@ class Tournament(object):
         self.check_in_id = None
         self.bot_commands_id = None
 
-    @staticmethod
-    def create_from_data(data):
-        return Tournament(data['title'], data['organizer'], data['desc'], data['format'])
+    @classmethod
+    def create_from_data(cls, data):
+        return cls(data['title'], data['organizer'], data['desc'], data['format'])
+
+    def add_participant(self, user_id):
+        if not user_id in self.participants:
+            self.participants.append(user_id)
+            self.version += 1
+
+    def remove_participant(self, user_id):
+        if user_id in self.participants:
+            self.participants.remove(user_id)
+            self.version += 1
 
     def __str__(self):
         return "{0.title} ({0.id})".format(self)
 
-class SSSTournament(Tournament):
+class PairedTournament(Tournament):
+    # A tournament the bot pairs, see system.System
+
+    def __getattr__(self, name):
+        # The system is only created when it is first used, so tournaments
+        # that are still open for registration can be created and unpickled
+        # without importing the pairing stack.
+        if name != 'system':
+            raise AttributeError(name)
+        self.system = self.make_system()
+        return self.system
+
+    def make_system(self):
+        raise NotImplementedError
+
+    RESULT_WORDS = {
+            'c': 'win_corp',
+            'corp': 'win_corp',
+            'r': 'win_runner',
+            'runner': 'win_runner',
+            'd': 'draw',
+            'draw': 'draw',
+            }
+
+    def parse_results(self, args):
+        # args alternate table number and result word, e.g. `1 c 2 r 3 d`,
+        # so a whole list of results can be pasted into one command
+        if len(args) % 2 == 1:
+            raise Exception("Results come in pairs of table number and `c`, `r` or `d`.")
+
+        results = []
+        for table, word in zip(args[0::2], args[1::2]):
+            if not table.isdigit():
+                raise Exception(f"`{table}` is not a table number.")
+            if not word.lower() in self.RESULT_WORDS:
+                raise Exception(f"`{word}` is not a result. Use `c`, `r` or `d`.")
+            results.append((int(table), system.SSSResults[self.RESULT_WORDS[word.lower()]]))
+        return results
+
+class SSSTournament(PairedTournament):
     system_text = "Single Sided Swiss"
+    max_losses = 3
+    max_rounds = None
 
-    def __init__(self, title, organizer_id, desc, format):
+    def __init__(self, title, organizer_id, desc, format, max_losses=3, max_rounds=None):
         super().__init__(title, organizer_id, desc, format)
-        self.system = system.SSSSystem(3, None)
+        self.max_losses = max_losses
+        self.max_rounds = max_rounds
+
+    def make_system(self):
+        return system.SSSSystem(self.max_losses, self.max_rounds)
+
+    def suggestion(self):
+        return simulator.suggestion_text(len(self.participants), self.max_losses)
+
+class DSSTournament(PairedTournament):
+    system_text = "Double Sided Swiss"
+    max_rounds = None
+
+    def __init__(self, title, organizer_id, desc, format, max_rounds=None):
+        super().__init__(title, organizer_id, desc, format)
+        self.max_rounds = max_rounds
+
+    def make_system(self):
+        return system.DSSSystem(self.max_rounds)
+
+class DSSCutTournament(DSSTournament):
+    # Swiss rounds followed by an elimination cut of the top `cut_size`. The
+    # Swiss system stays around as `swiss` once the cut started.
+    system_text = "Double Sided Swiss with a top cut"
+    cut_size = 8
+    double_elimination = True
+
+    def __init__(self, title, organizer_id, desc, format, max_rounds=None, cut_size=8, double_elimination=True):
+        super().__init__(title, organizer_id, desc, format, max_rounds)
+        self.cut_size = cut_size
+        self.double_elimination = double_elimination
+
+    def in_cut(self):
+        return 'swiss' in self.__dict__
+
+    def start_cut(self):
+        swiss = self.system
+        size = min(self.cut_size, len(swiss.players))
+        self.system = swiss.top_cut(size, self.double_elimination and size >= 4)
+        self.swiss = swiss
+
+TOURNAMENTS = {
+        'SSS': SSSTournament,
+        'DSS': DSSTournament,
+        'DSS+Cut': DSSCutTournament,
+        }
@@ -1,7 +1,14 @@
 class Wizard(object):
+    kind = None # key in tournament.WIZARDS for wizards that can be restored
+
     async def on_message(self, ctx):
         print("Wizard: ", ctx.channel)
 
+    def state(self):
+        # Compact picklable progress of the wizard or None if it cannot be
+        # restored after a reload
+        return None
+
 class DMWizard(Wizard):
     async def on_message(self, ctx):
         print("DMWizard: ", ctx.channel)
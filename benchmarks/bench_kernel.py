@@ -0,0 +1,81 @@
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from angelarena import system
+
+# Micro-benchmark of the pairing-matrix kernel against composing the matrix
+# from the separate penalty arrays as before. Run from the repository root:
+#
+#   python -m benchmarks.bench_kernel --sizes 256 1000 2000
+
+def make_system(size, rounds=4, dtype=np.float64):
+    random.seed(0)
+    sys = system.SSSSystem(3, None, dtype=dtype, seed=0)
+    for i in range(size):
+        sys.add_new_player(None)
+    for i in range(rounds):
+        sys.pair_new_round()
+        for m in sys.rounds[-1]:
+            if m.result == system.SSSResults.open:
+                m.result = random.choice([system.SSSResults.win_corp, system.SSSResults.win_runner])
+        sys.finish_round()
+    return sys
+
+def composed(sys):
+    n = len(sys.players)
+    pairing_matrix = 20000 \
+            - sys.make_score_penalty_array() \
+            - sys.make_side_penalty_array() \
+            - sys.make_repair_penalty_array()
+    pairing_matrix = pairing_matrix * sys.make_bye_bonus_array()
+    pairing_matrix = pairing_matrix + np.random.randint(0, 10, size=(n, n))
+    return pairing_matrix
+
+def measure(function, repeat):
+    function() # warm up buffers
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(times)), peak
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pairing-matrix kernel")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 256, 1000, 2000])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', default='bench_kernel.json')
+    args = parser.parse_args(argv)
+
+    runs = []
+    for size in args.sizes:
+        for dtype in [np.float64, np.float32]:
+            sys = make_system(size, dtype=dtype)
+            old_time, old_peak = measure(lambda: composed(sys), args.repeat)
+            new_time, new_peak = measure(lambda: sys.make_pairings_matrix(), args.repeat)
+            runs.append({
+                'size': len(sys.players),
+                'dtype': np.dtype(dtype).name,
+                'composed_seconds': old_time,
+                'composed_peak_bytes': old_peak,
+                'kernel_seconds': new_time,
+                'kernel_peak_bytes': new_peak,
+                })
+            print(f"{len(sys.players):>5} {np.dtype(dtype).name:>7}: composed {old_time*1000:8.2f}ms {old_peak/2**20:8.2f}MiB,"
+                    f" kernel {new_time*1000:8.2f}ms {new_peak/2**20:8.2f}MiB")
+
+    with open(args.output, 'w') as f:
+        json.dump({'runs': runs}, f, indent=1)
+
+if __name__ == '__main__':
+    main()
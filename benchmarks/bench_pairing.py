@@ -0,0 +1,179 @@
+import argparse
+import collections
+import json
+import math
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from angelarena import system
+
+# Simulates complete SSS tournaments and records stage timings, memory and
+# pairing quality. Run from the repository root:
+#
+#   python -m benchmarks.bench_pairing --sizes 16 64 256 --output bench.json
+#   python -m benchmarks.bench_pairing --compare old.json new.json
+
+DEFAULT_SIZES = [16, 64, 256, 1000, 2000]
+
+def play_match(match, results, rng):
+    if results == 'skill':
+        # players carry their skill as discord member in the simulation
+        p_corp = 1/(1 + math.exp(match.runner.member - match.corp.member))
+    else:
+        p_corp = 0.5
+
+    ran = rng.random()
+    if ran < 0.02:
+        return system.SSSResults.draw
+    elif ran < 0.02 + 0.98*p_corp:
+        return system.SSSResults.win_corp
+    else:
+        return system.SSSResults.win_runner
+
+def simulate(size, mode='dense', engine='blossom', results='random', drop_rate=0.0, seed=0, max_rounds=50, memory=False):
+    rng = random.Random(seed)
+    random.seed(seed)
+    np.random.seed(seed)
+
+    if memory:
+        tracemalloc.start()
+
+    sss = system.SSSSystem(3, None, engine=engine, pairing_mode=mode)
+    stages = collections.defaultdict(float)
+
+    start = time.perf_counter()
+    for i in range(size):
+        sss.add_new_player(rng.gauss(0, 1))
+    stages['add_new_player'] = time.perf_counter() - start
+
+    rounds = []
+    rematches = 0
+    cross_score = 0
+    while len(sss.players) > 1 and len(sss.rounds) < max_rounds:
+        sss.stage_times.clear()
+        scores = {player.index: player.score for player in sss.players}
+
+        start = time.perf_counter()
+        sss.pair_new_round()
+        pair_time = time.perf_counter() - start
+
+        for m in sss.rounds[-1]:
+            if sss.opponents[m.corp.index, m.runner.index] > 1:
+                rematches += 1
+            if m.result == system.SSSResults.open:
+                if scores[m.corp.index] != scores[m.runner.index]:
+                    cross_score += 1
+                m.result = play_match(m, results, rng)
+
+        start = time.perf_counter()
+        sss.finish_round()
+        finish_time = time.perf_counter() - start
+
+        for player in list(sss.players):
+            if rng.random() < drop_rate:
+                sss.drop_player(player)
+
+        round_stages = dict(sss.stage_times)
+        round_stages['pair_new_round'] = pair_time
+        round_stages['finish_round'] = finish_time
+        for stage, seconds in round_stages.items():
+            stages[stage] += seconds
+        rounds.append({'players': len(scores), 'stages': round_stages})
+
+    peak_memory = None
+    if memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    everyone = sss.players + sss.eliminated + sss.dropped
+    return {
+            'size': size,
+            'mode': mode,
+            'engine': engine,
+            'results': results,
+            'drop_rate': drop_rate,
+            'seed': seed,
+            'rounds': len(sss.rounds),
+            'stages': dict(stages),
+            'per_round': rounds,
+            'peak_traced_memory': peak_memory,
+            'quality': {
+                'rematches': rematches,
+                'cross_score_pairings': cross_score,
+                'side_balance': histogram(abs(player.side_balance) for player in everyone),
+                'byes': histogram(player.byes for player in everyone),
+                'pairing_stats': dict(sss.pairing_stats),
+                },
+            }
+
+def histogram(values):
+    return {str(k): v for k, v in sorted(collections.Counter(values).items())}
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = {(r['size'], r['mode'], r['engine']): r for r in json.load(f)['runs']}
+    with open(new_path) as f:
+        new = {(r['size'], r['mode'], r['engine']): r for r in json.load(f)['runs']}
+
+    for key in sorted(old.keys() & new.keys()):
+        a = old[key]['stages'].get('pair_new_round', 0)
+        b = new[key]['stages'].get('pair_new_round', 0)
+        ratio = b/a if a else float('nan')
+        print(f"{key[0]:>5} {key[1]:>8} {key[2]:>8}: pair_new_round {a:8.3f}s -> {b:8.3f}s ({ratio:5.2f}x)"
+                f"  rematches {old[key]['quality']['rematches']} -> {new[key]['quality']['rematches']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate SSS tournaments and benchmark pairing")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--modes', nargs='+', default=['dense'])
+    parser.add_argument('--engines', nargs='+', default=['blossom'])
+    parser.add_argument('--results', choices=['random', 'skill'], default='random')
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-rounds', type=int, default=50)
+    parser.add_argument('--memory', action='store_true', help="trace peak memory (slower)")
+    parser.add_argument('--output', default='bench_pairing.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    runs = []
+    for size in args.sizes:
+        for mode in args.modes:
+            for engine in args.engines:
+                run = simulate(size, mode, engine, args.results, args.drop_rate, args.seed, args.max_rounds, args.memory)
+                runs.append(run)
+                print(f"{size:>5} {mode:>8} {engine:>8}: {run['rounds']:2d} rounds,"
+                        f" pairing {run['stages']['pair_new_round']:.3f}s,"
+                        f" matching {run['stages'].get('matching', 0):.3f}s,"
+                        f" rematches {run['quality']['rematches']}", file=sys.stderr)
+
+    report = {
+            'commit': git_commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'runs': runs,
+            }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+
+if __name__ == '__main__':
+    main()
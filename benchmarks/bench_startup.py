@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Startup benchmark: time until on_ready is handled in a fresh interpreter and
+# time per !reload, with a saved state of open tournaments. Every cold start
+# runs in its own process. Discord is not contacted, the bot is only set up
+# the way bot.py does it and channel reconciliation is skipped. Run from the
+# repository root:
+#
+#   python -m benchmarks.bench_startup --tournaments 50 --running 2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_state(directory, tournaments, running, players=64):
+    # snapshot with open tournaments and `running` ones that were paired
+    from angelarena import persistence, registry, tournament
+
+    state = registry.TournamentRegistry()
+    for i in range(tournaments + running):
+        t = tournament.SSSTournament(f"Tournament {i}", 1000 + i, "Description", "Standard")
+        t.approval = True
+        for p in range(players):
+            t.add_participant(10**6 + p)
+        if i >= tournaments:
+            t.running = True
+            for p in t.participants:
+                t.system.add_new_player(p)
+            t.system.pair_new_round()
+        state.add(t)
+
+    journal = persistence.Journal(os.path.join(directory, 'tournaments.p'), os.path.join(directory, 'tournaments.journal'))
+    journal.snapshot(state)
+    journal.close()
+
+def child(reloads):
+    # One cold start followed by `reloads` reloads, prints the timings as JSON
+    timings = {}
+    start = time.perf_counter()
+    import discord
+    from discord.ext import commands
+    timings['import_discord'] = time.perf_counter() - start
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    bot = commands.Bot(command_prefix="!", intents=discord.Intents.default(), loop=loop)
+
+    async def skip(self, ch, wanted, header=None):
+        return None, {}
+
+    async def on_ready():
+        # as in bot.py
+        bot.load_extension('angelarena.cog')
+        cog = bot.get_cog("TournamentCog")
+        type(cog).reconcile_channel = skip
+        await cog.init()
+
+    async def reload():
+        # as the !reload command
+        bot.reload_extension('angelarena.cog')
+        cog = bot.get_cog("TournamentCog")
+        type(cog).reconcile_channel = skip
+        cog.load()
+        await cog.init()
+
+    before = time.perf_counter()
+    loop.run_until_complete(on_ready())
+    timings['on_ready'] = time.perf_counter() - before
+    timings['ready'] = time.perf_counter() - start
+
+    from angelarena import tournament
+    timings['pairing_loaded_at_ready'] = 'angelarena.system' in sys.modules
+    before = time.perf_counter()
+    tournament.system.load()
+    timings['pairing_import'] = time.perf_counter() - before
+
+    times = []
+    for i in range(reloads):
+        before = time.perf_counter()
+        loop.run_until_complete(reload())
+        times.append(time.perf_counter() - before)
+    timings['reloads'] = times
+
+    bot.unload_extension('angelarena.cog')
+    loop.run_until_complete(asyncio.sleep(0.1))
+    print(json.dumps(timings))
+
+def median(values):
+    values = sorted(values)
+    return values[len(values)//2]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bot startup and !reload")
+    parser.add_argument('--tournaments', type=int, default=50, help="open tournaments in the saved state")
+    parser.add_argument('--running', type=int, default=0, help="running tournaments in the saved state")
+    parser.add_argument('--repeat', type=int, default=5, help="cold starts")
+    parser.add_argument('--reloads', type=int, default=10, help="reloads after every cold start")
+    parser.add_argument('--output', default='bench_startup.json')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.reloads)
+        return
+
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        write_state(directory, args.tournaments, args.running)
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child', '--reloads', str(args.reloads)],
+                    cwd=directory, env=env, check=True, capture_output=True, text=True).stdout
+            timings = json.loads(out.strip().splitlines()[-1])
+            timings['process'] = time.perf_counter() - start
+            runs.append(timings)
+
+    summary = {
+            'tournaments': args.tournaments,
+            'running': args.running,
+            'process_seconds': median([r['process'] for r in runs]),
+            'ready_seconds': median([r['ready'] for r in runs]),
+            'on_ready_seconds': median([r['on_ready'] for r in runs]),
+            'pairing_loaded_at_ready': runs[0]['pairing_loaded_at_ready'],
+            'pairing_import_seconds': median([r['pairing_import'] for r in runs]),
+            'reload_seconds': median([t for r in runs for t in r['reloads']]) if args.reloads else None,
+            }
+    print(f"cold start: process {summary['process_seconds']*1000:.0f}ms, ready {summary['ready_seconds']*1000:.0f}ms"
+            f" (on_ready {summary['on_ready_seconds']*1000:.0f}ms), pairing stack loaded: {summary['pairing_loaded_at_ready']}")
+    print(f"pairing stack import afterwards: {summary['pairing_import_seconds']*1000:.0f}ms")
+    if args.reloads:
+        print(f"!reload: {summary['reload_seconds']*1000:.1f}ms")
+
+    with open(args.output, 'w') as f:
+        json.dump({'summary': summary, 'runs': runs}, f, indent=1)
+
+if __name__ == '__main__':
+    main()
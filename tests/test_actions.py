@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+import collections
+import time
+
+import discord
+
+from angelarena import actions
+
+Response = collections.namedtuple('Response', ['status', 'reason'])
+
+class TestActionExecutor(unittest.TestCase):
+    def test_concurrency_limit(self):
+        """
+        Actions run concurrently but never more than the limit at once
+        """
+
+        in_flight = 0
+        most = 0
+
+        async def action(item):
+            nonlocal in_flight, most
+            in_flight += 1
+            most = max(most, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+        async def run():
+            executor = actions.ActionExecutor(limit=4, route_limits={'test': (1000, 1)})
+            start = time.perf_counter()
+            failed = await executor.run('test', action, range(40))
+            return failed, time.perf_counter() - start
+
+        failed, seconds = asyncio.run(run())
+        self.assertEqual(failed, [])
+        self.assertEqual(most, 4,
+                "Concurrency is bounded")
+        self.assertLess(seconds, 0.3,
+                "Faster than running one after another")
+
+    def test_rate_budget(self):
+        """
+        Routes do not exceed their budget
+        """
+
+        async def run():
+            executor = actions.ActionExecutor(limit=10, route_limits={'test': (5, 0.1)})
+            start = time.perf_counter()
+            await executor.run('test', lambda item: asyncio.sleep(0), range(20))
+            return time.perf_counter() - start
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.25,
+                "15 calls beyond the burst need 0.3s of budget")
+
+    def test_retries_and_progress(self):
+        """
+        Transient failures are retried, others reported
+        """
+
+        attempts = collections.Counter()
+        reports = []
+
+        async def action(item):
+            attempts[item] += 1
+            if item == 1 and attempts[item] < 3:
+                raise discord.HTTPException(Response(503, "Service Unavailable"), "try again")
+            if item == 2:
+                raise discord.Forbidden(Response(403, "Forbidden"), "no")
+
+        async def progress(done, total, failed):
+            reports.append((done, total, failed))
+
+        async def run():
+            executor = actions.ActionExecutor(route_limits={'test': (1000, 1)}, backoff=0)
+            return await executor.run('test', action, range(5), progress), executor
+
+        failed, executor = asyncio.run(run())
+        self.assertEqual(attempts[1], 3)
+        self.assertEqual(attempts[2], 1,
+                "Permanent errors are not retried")
+        self.assertEqual([item for item, e in failed], [2])
+        self.assertEqual(executor.stats['retries'], 2)
+        self.assertEqual(reports[-1], (5, 5, 1),
+                "Final progress report")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import asyncio
+
+from angelarena import actors, metrics
+
+class TestTournamentActors(unittest.TestCase):
+    def setUp(self):
+        self.metrics = metrics.Metrics()
+
+    def test_order_and_concurrency(self):
+        """
+        Events of one tournament run one after another, different tournaments at the same time
+        """
+
+        log = []
+        running = set()
+
+        async def handler(key, n):
+            self.assertNotIn(key, running,
+                    "Only one event per tournament runs at a time")
+            running.add(key)
+            await asyncio.sleep(0.01)
+            log.append((key, n))
+            running.discard(key)
+            return n
+
+        async def run():
+            a = actors.TournamentActors(metrics=self.metrics)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            results = await asyncio.gather(*[a.run(key, 'test', handler, key, n) for n in range(5) for key in 'ab'])
+            self.assertLess(loop.time() - start, 0.09,
+                    "The two tournaments did not wait for each other")
+            self.assertEqual(a.queues, {},
+                    "Idle queues are removed")
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(results, [n for n in range(5) for key in 'ab'])
+        for key in 'ab':
+            self.assertEqual([n for k, n in log if k == key], list(range(5)))
+        self.assertEqual(self.metrics.select('tournament_events_queued'), {(): 0})
+        self.assertEqual(self.metrics.select('tournament_event_seconds')[(('name', 'test'),)].count, 10)
+
+    def test_backpressure(self):
+        """
+        A full queue holds back new events of its tournament only
+        """
+
+        release = None
+
+        async def blocked():
+            await release.wait()
+
+        async def quick():
+            return 'done'
+
+        async def run():
+            nonlocal release
+            release = asyncio.Event()
+            a = actors.TournamentActors(maxsize=2, metrics=self.metrics)
+            jobs = [asyncio.create_task(a.run('a', 'blocked', blocked)) for i in range(4)]
+            await asyncio.sleep(0.01)
+            self.assertEqual(a.depth('a'), 2,
+                    "One event runs, two are queued and one waits for room")
+            self.assertEqual(a.stats['blocked'], 2,
+                    "The third event waited until the worker took the first")
+            self.assertEqual(self.metrics.select('tournament_events_queued'), {(): 4})
+            self.assertEqual(await a.run('b', 'quick', quick), 'done',
+                    "Other tournaments are not held back")
+
+            release.set()
+            await asyncio.gather(*jobs)
+            self.assertEqual(a.queued, 0)
+
+        asyncio.run(run())
+        self.assertEqual(self.metrics.select('tournament_events_blocked_total'), {(): 2})
+
+    def test_errors_and_nesting(self):
+        """
+        A failing event reaches its caller without stopping the queue, and events may run events of their own tournament
+        """
+
+        async def fail():
+            raise Exception("broken")
+
+        async def inner():
+            return 'inner'
+
+        async def outer(a):
+            return await a.run('t', 'inner', inner)
+
+        async def run():
+            a = actors.TournamentActors(metrics=self.metrics)
+            failing = asyncio.create_task(a.run('t', 'fail', fail))
+            nested = await asyncio.wait_for(a.run('t', 'outer', outer, a), 1)
+            with self.assertRaisesRegex(Exception, "broken"):
+                await failing
+            return nested
+
+        self.assertEqual(asyncio.run(run()), 'inner')
+
+if __name__ == '__main__':
+    unittest.main()
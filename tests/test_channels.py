@@ -0,0 +1,117 @@
+import unittest
+import asyncio
+import collections
+
+from angelarena import channels
+
+Author = collections.namedtuple('Author', ['id'])
+Message = collections.namedtuple('Message', ['id', 'content', 'author'])
+
+BOT = Author(1)
+USER = Author(2)
+
+class TestReconciliation(unittest.TestCase):
+    def test_unchanged(self):
+        """
+        An unchanged channel needs no writes
+        """
+
+        history = [Message(10, "top", BOT), Message(11, "a", BOT), Message(12, "b", BOT)]
+        plan = channels.plan_reconciliation(history, [(11, "a"), (12, "b")], BOT.id, "top")
+        self.assertEqual(channels.writes(plan), 0)
+        self.assertEqual(plan.header, ('keep', history[0], "top"))
+        self.assertEqual([e[1] for e in plan.entries], history[1:])
+
+    def test_differences(self):
+        """
+        Only changed, missing and unwanted messages are touched
+        """
+
+        history = [Message(9, "hello", USER), Message(10, "old top", BOT), Message(11, "a", BOT),
+                Message(12, "gone", BOT), Message(13, "c", BOT)]
+        plan = channels.plan_reconciliation(history, [(11, "a"), (13, "c2"), (None, "d"), (99, "e")], BOT.id, "top")
+        self.assertEqual(plan.header, ('edit', history[1], "top"))
+        self.assertEqual([e[0] for e in plan.entries], ['keep', 'edit', 'create', 'create'])
+        self.assertEqual([m.id for m in plan.delete], [9, 12],
+                "Foreign and unwanted messages are deleted")
+        self.assertEqual(channels.writes(plan), 6)
+
+    def test_duplicate_ids(self):
+        """
+        A message is only used for one entry
+        """
+
+        history = [Message(11, "a", BOT)]
+        plan = channels.plan_reconciliation(history, [(11, "a"), (11, "a")], BOT.id)
+        self.assertEqual([e[0] for e in plan.entries], ['keep', 'create'])
+
+    def test_rebuild(self):
+        """
+        The channel is rebuilt if the header cannot stay the oldest message
+        """
+
+        history = [Message(11, "a", BOT), Message(12, "top", BOT)]
+        plan = channels.plan_reconciliation(history, [(11, "a")], BOT.id, "top")
+        self.assertEqual(plan.header[0], 'create')
+        self.assertEqual([e[0] for e in plan.entries], ['create'])
+        self.assertEqual(plan.delete, history)
+
+        plan = channels.plan_reconciliation([], [(11, "a")], BOT.id, "top")
+        self.assertEqual(plan.header[0], 'create',
+                "Empty channels get a new header")
+
+class FakeMessage(object):
+    def __init__(self, id, content):
+        self.id = id
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content):
+        self.content = content
+        self.edits += 1
+
+class FakeChannel(object):
+    def __init__(self, messages):
+        self.messages = {m.id: m for m in messages}
+        self.fetches = 0
+
+    async def fetch_message(self, message_id):
+        self.fetches += 1
+        return self.messages[message_id]
+
+class TestEditScheduler(unittest.TestCase):
+    def test_coalescing(self):
+        """
+        A burst of edits becomes one edit per message with the latest content
+        """
+
+        a, b = FakeMessage(1, "a"), FakeMessage(2, "b")
+        ch = FakeChannel([a, b])
+        edits = channels.EditScheduler(delay=0.01, interval=0)
+        participants = []
+
+        async def burst():
+            for user_id in range(80):
+                participants.append(user_id)
+                edits.schedule(ch, 1, lambda: f"a {len(participants)}")
+                await asyncio.sleep(0)
+            edits.schedule(ch, 2, lambda: "b")
+            await edits.flush()
+
+        asyncio.run(burst())
+        self.assertEqual(a.content, "a 80")
+        self.assertEqual(a.edits, 1,
+                "One edit for 80 sign-ups")
+        self.assertEqual(b.edits, 0,
+                "Unchanged content is not sent")
+        self.assertEqual(ch.fetches, 2,
+                "Each message is fetched once")
+        self.assertEqual(edits.stats['scheduled'], 81)
+
+        asyncio.run(burst())
+        self.assertEqual(ch.fetches, 2,
+                "Messages are cached")
+        self.assertEqual(a.content, "a 160")
+
+if __name__ == '__main__':
+    unittest.main()
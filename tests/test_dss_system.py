@@ -0,0 +1,225 @@
+import unittest
+import pickle
+
+import numpy as np
+
+from angelarena import system, tournament
+
+def make_dss(size, seed=0):
+    sys = system.DSSSystem(seed=seed)
+    for i in range(size):
+        sys.add_new_player(1000 + i)
+    return sys
+
+def report_all(sys):
+    # the corp wins every game
+    open_tables = [k+1 for k, m in enumerate(sys.rounds[-1]) if m.result == system.SSSResults.open]
+    sys.report_results([(table, system.SSSResults.win_corp) for table in open_tables])
+
+def tables(sys):
+    store = sys.store
+    start = store.match_count - len(sys.rounds[-1])
+    return list(zip(store.match_corp[start:store.match_count].tolist(), store.match_runner[start:store.match_count].tolist()))
+
+class TestDSSSystem(unittest.TestCase):
+    def test_both_sides(self):
+        """
+        Paired players meet once on each side, a bye is a single match
+        """
+
+        sys = make_dss(7)
+        sys.pair_new_round()
+        pairs = tables(sys)
+
+        self.assertEqual(len(pairs), 7,
+                "Three pairings with two games each and a bye")
+        for (c0, r0), (c1, r1) in zip(pairs[0:6:2], pairs[1:6:2]):
+            self.assertEqual((c0, r0), (r1, c1),
+                    "The second game swaps sides")
+        self.assertEqual(pairs[6][1], 0)
+
+        sys.report_results([(1, system.SSSResults.win_corp), (2, system.SSSResults.win_corp),
+                (3, system.SSSResults.draw), (4, system.SSSResults.win_runner)])
+        report_all(sys)
+        sys.finish_round()
+
+        store = sys.store
+        self.assertEqual(store.score[pairs[0][0]], 3,
+                "A split is worth 3 points each")
+        self.assertEqual(store.score[pairs[0][1]], 3)
+        self.assertEqual(store.score[pairs[2][0]], 1 + 3)
+        self.assertEqual(store.score[pairs[2][1]], 1)
+        self.assertEqual(store.score[pairs[6][0]], 6,
+                "A bye is worth two wins")
+        self.assertEqual(store.side_balance[1:store.count].tolist(), [0]*7,
+                "Nobody leans to one side")
+
+    def test_full_tournament(self):
+        """
+        Swiss rounds without rematches until the planned number of rounds is played
+        """
+
+        sys = make_dss(16)
+        self.assertEqual(sys.planned_rounds(), 4)
+        while not sys.over():
+            sys.pair_new_round()
+            report_all(sys)
+            sys.finish_round()
+
+        self.assertEqual(len(sys.rounds), 4)
+        pairs = [(m.corp.index, m.runner.index) for round in sys.rounds for m in round]
+        self.assertEqual(len(pairs), len(set(pairs)),
+                "No rematches")
+        standings = sys.standings()
+        self.assertEqual(len(standings), 16)
+        self.assertEqual([s.score for s in standings], sorted([s.score for s in standings], reverse=True))
+        self.assertEqual(sum(s.score for s in standings), 4*8*2*3)
+
+class TestElimination(unittest.TestCase):
+    def test_seed_order(self):
+        """
+        The top seeds can only meet late in the bracket
+        """
+
+        self.assertEqual(system.seed_order(8), [1, 8, 4, 5, 2, 7, 3, 6])
+        for slots in [16, 32, 64]:
+            order = system.seed_order(slots)
+            self.assertEqual(sorted(order), list(range(1, slots+1)))
+            self.assertEqual([a + b for a, b in zip(order[0::2], order[1::2])], [slots + 1]*(slots//2))
+
+    def test_bracket_size(self):
+        """
+        Single elimination plays n-1 matches, double elimination 2n-1 plus the reset
+        """
+
+        for size in [16, 32, 64]:
+            self.assertEqual(len(system.bracket(size)), size - 1)
+            self.assertEqual(len(system.bracket(size, True)), 2*size - 1)
+            self.assertIs(system.bracket(size, True), system.bracket(size, True),
+                    "Brackets are built once per size")
+
+    def cut(self, size, cut_size, double):
+        swiss = make_dss(size)
+        while not swiss.over():
+            swiss.pair_new_round()
+            report_all(swiss)
+            swiss.finish_round()
+        return swiss, swiss.top_cut(cut_size, double)
+
+    def test_single_elimination(self):
+        """
+        The cut is seeded from the standings and halves the field every round
+        """
+
+        swiss, cut = self.cut(32, 16, False)
+        top = [s.player.index for s in swiss.standings()[:16]]
+        self.assertEqual(cut.seeds.tolist(), top)
+        self.assertIs(cut.store, swiss.store,
+                "The cut shares the match log of the Swiss rounds")
+
+        cut.pair_new_round()
+        first = tables(cut)
+        self.assertEqual(len(first), 8)
+        self.assertEqual(set(first[0]), {top[0], top[15]},
+                "Seed 1 meets seed 16")
+
+        rounds = 1
+        report_all(cut)
+        cut.finish_round()
+        while not cut.over():
+            self.assertEqual(len(cut.players), 16 // 2**rounds)
+            cut.pair_new_round()
+            report_all(cut)
+            cut.finish_round()
+            rounds += 1
+
+        self.assertEqual(rounds, 4)
+        self.assertEqual(len(cut.eliminated), 15)
+        self.assertEqual(cut.champion(), cut.players[0])
+        self.assertEqual(cut.standings()[0].player, cut.champion())
+        self.assertEqual(cut.store.score[cut.champion().index], swiss.store.score[cut.champion().index],
+                "Cut matches do not change Swiss points")
+
+    def test_double_elimination(self):
+        """
+        Everyone is out after two losses and the grand final is reset if the losers bracket wins it
+        """
+
+        swiss, cut = self.cut(20, 8, True)
+        losses = {p.index: 0 for p in cut.players}
+        while not cut.over():
+            round = cut.pair_new_round()
+            for match in round:
+                a, b, stage = cut.bracket[int(np.flatnonzero(cut.rows == match.index)[0])]
+                if stage == 'final':
+                    # the player from the losers bracket wins the grand final
+                    winner = cut.source(b)
+                    match.result = system.SSSResults.win_corp if match.corp.index == winner else system.SSSResults.win_runner
+                else:
+                    match.result = system.SSSResults.win_corp
+                loser = match.runner if match.result == system.SSSResults.win_corp else match.corp
+                losses[loser.index] += 1
+            cut.finish_round()
+
+        self.assertGreaterEqual(cut.rows[-1], 0,
+                "The reset was played")
+        self.assertEqual(sum(losses.values()), 7 + 7 + 1)
+        champion = cut.champion()
+        self.assertEqual(losses[champion.index], 1)
+        for player in cut.eliminated:
+            self.assertEqual(losses[player.index], 2)
+
+    def test_no_draws(self):
+        """
+        Cut matches cannot end in a draw
+        """
+
+        swiss, cut = self.cut(8, 4, True)
+        cut.pair_new_round()
+        with self.assertRaisesRegex(Exception, "cannot be reported"):
+            cut.report_results([(1, system.SSSResults.draw)])
+
+    def test_byes_and_replay(self):
+        """
+        Missing seeds are byes for the top seeds and recorded rounds replay onto a copy
+        """
+
+        swiss, cut = self.cut(12, 6, False)
+        copy = pickle.loads(pickle.dumps(cut))
+        cut.pair_new_round()
+        self.assertEqual(len(tables(cut)), 2,
+                "Seeds 1 and 2 have a bye")
+        self.assertNotIn(cut.seeds[0], [p for table in tables(cut) for p in table])
+
+        corp, runner = zip(*tables(cut))
+        copy.add_round(corp, runner)
+        with self.assertRaisesRegex(Exception, "not a match of the bracket"):
+            pickle.loads(pickle.dumps(cut)).add_round(runner[:1] + runner[:1], corp[:1] + runner[:1])
+        self.assertEqual(copy.rows.tolist(), cut.rows.tolist())
+
+class TestCutTournament(unittest.TestCase):
+    def test_start_cut(self):
+        """
+        A DSS+Cut tournament moves on to its cut once the Swiss rounds are over
+        """
+
+        t = tournament.TOURNAMENTS['DSS+Cut'].create_from_data({'title': "Cut", 'organizer': 1, 'desc': "", 'format': "Standard"})
+        self.assertIsInstance(t, tournament.DSSCutTournament)
+        for i in range(10):
+            t.system.add_new_player(100 + i)
+        while not t.system.over():
+            t.system.pair_new_round()
+            report_all(t.system)
+            t.system.finish_round()
+
+        self.assertFalse(t.in_cut())
+        t.start_cut()
+        self.assertTrue(t.in_cut())
+        self.assertIsInstance(t.system, system.EliminationSystem)
+        self.assertEqual(len(t.system.seeds), 8)
+        self.assertTrue(t.system.double)
+        t = pickle.loads(pickle.dumps(t))
+        self.assertIs(t.system.store, t.swiss.store)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+from angelarena import imports, tournament
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code):
+    return subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, capture_output=True, text=True).stdout.strip()
+
+class TestImports(unittest.TestCase):
+    def test_lazy_module(self):
+        """
+        A lazy module is imported on first attribute access
+        """
+
+        module = imports.module('json')
+        self.assertIsNone(module.module)
+        self.assertEqual(module.dumps([1]), "[1]")
+        self.assertIs(module.module, sys.modules['json'])
+
+    def test_startup_without_pairing_stack(self):
+        """
+        Neither the cog nor open tournaments import numpy or networkx
+        """
+
+        t = tournament.SSSTournament("Open", 1, "Description", "Standard")
+        t.add_participant(2)
+        self.assertNotIn('system', t.__dict__,
+                "The pairing system is only created when it is used")
+        data = pickle.dumps(t)
+
+        loaded = run(f"import sys, pickle, angelarena.cog; t = pickle.loads({data!r}); "
+                "print(t.participants, [m for m in ['numpy', 'networkx', 'angelarena.system'] if m in sys.modules])")
+        self.assertEqual(loaded, "[2] []")
+
+        t.system.add_new_player(2)
+        self.assertIn('system', t.__dict__)
+        loaded = run(f"import pickle, angelarena.tournament; t = pickle.loads({pickle.dumps(t)!r}); print(len(t.system.players))")
+        self.assertEqual(loaded, "1",
+                "Started tournaments keep their pairing system")
+
+    def test_reload_changed(self):
+        """
+        Only edited modules and the ones after them are reloaded
+        """
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ['lazy_a', 'lazy_b', 'lazy_c']:
+                with open(os.path.join(directory, name + '.py'), 'w') as f:
+                    f.write("VALUE = 1\n")
+            sys.path.insert(0, directory)
+            try:
+                import lazy_a, lazy_b, lazy_c
+                self.assertEqual(imports.reload_changed(lazy_a, lazy_b, lazy_c), [],
+                        "Nothing is reloaded the first time")
+
+                path = os.path.join(directory, 'lazy_b.py')
+                with open(path, 'w') as f:
+                    f.write("VALUE = 2\n")
+                os.utime(path, (time.time() + 10, time.time() + 10))
+                self.assertEqual(imports.reload_changed(lazy_a, lazy_b, lazy_c), [lazy_b, lazy_c])
+                self.assertEqual(lazy_b.VALUE, 2)
+                self.assertEqual(imports.reload_changed(lazy_a, lazy_b, lazy_c), [])
+            finally:
+                sys.path.remove(directory)
+                for name in ['lazy_a', 'lazy_b', 'lazy_c']:
+                    sys.modules.pop(name, None)
+
+if __name__ == '__main__':
+    unittest.main()
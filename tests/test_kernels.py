@@ -0,0 +1,83 @@
+import unittest
+import random
+
+import numpy as np
+
+from angelarena import kernels, system
+
+class TestPairingKernel(unittest.TestCase):
+    def make_system(self, players, rounds, seed):
+        sys = system.SSSSystem(3, None, seed=seed)
+        for i in range(players):
+            sys.add_new_player(None) # Passing None as discord member
+
+        for i in range(rounds):
+            sys.pair_new_round()
+            for m in sys.rounds[-1]:
+                if m.result == system.SSSResults.open:
+                    m.result = random.choice([system.SSSResults.win_corp, system.SSSResults.win_runner])
+            sys.finish_round()
+
+        if len(sys.players) % 2 == 1:
+            sys.players.append(sys.bye_player)
+        return sys
+
+    def reference(self, sys, seed):
+        # pairing matrix as composed from the separate penalty arrays
+        n = len(sys.players)
+        pairing_matrix = 20000 \
+                - sys.make_score_penalty_array() \
+                - sys.make_side_penalty_array() \
+                - sys.make_repair_penalty_array()
+        pairing_matrix = pairing_matrix * sys.make_bye_bonus_array()
+        return pairing_matrix + kernels.noise(np.random.default_rng(seed), np.empty((n, n)))
+
+    def test_identical_to_reference(self):
+        """
+        Kernel gives the same weights as the separate penalty arrays
+        """
+
+        sys = self.make_system(37, 4, 1)
+        sys.rng = np.random.default_rng(5)
+        weights = sys.make_pairings_matrix()
+
+        np.testing.assert_array_equal(weights, self.reference(sys, 5))
+
+    def test_float32(self):
+        """
+        Single precision kernel stays close to the reference
+        """
+
+        sys = system.SSSSystem(3, None, dtype=np.float32, seed=1)
+        for i in range(30):
+            sys.add_new_player(None) # Passing None as discord member
+        sys.pair_new_round()
+
+        weights = sys.make_pairings_matrix()
+        self.assertEqual(weights.dtype, np.float32,
+                "Selected dtype is used")
+        expected = self.reference(sys, 0)
+        self.assertTrue(np.all(np.abs(weights - expected) < 10),
+                "Only the noise differs")
+
+    def test_buffer_reuse(self):
+        """
+        Repeated calls reuse the same memory, also for smaller fields
+        """
+
+        sys = self.make_system(40, 2, 2)
+        first = sys.make_pairings_matrix()
+        second = sys.make_pairings_matrix(sys.players[:10])
+        self.assertTrue(np.shares_memory(first, second),
+                "Output buffer is reused")
+
+        out = np.empty((10, 10))
+        third = sys.make_pairings_matrix(sys.players[:10], out=out)
+        self.assertIs(third, out,
+                "Explicit output buffer is filled")
+
+        with self.assertRaises(Exception):
+            kernels.PairingKernel(np.int32)
+
+if __name__ == '__main__':
+    unittest.main()
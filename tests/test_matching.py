@@ -0,0 +1,110 @@
+import unittest
+import random
+
+import numpy as np
+
+from angelarena import matching, system
+
+class TestMatchingEngines(unittest.TestCase):
+    def total_weight(self, weights, pairings):
+        return sum(weights[min(i, j), max(i, j)] for i, j in pairings)
+
+    def assert_valid_matching(self, n, pairings, mask=None):
+        seen = [x for p in pairings for x in p]
+        self.assertEqual(len(seen), len(set(seen)),
+                "Every vertex is matched at most once")
+        for i, j in pairings:
+            self.assertTrue(0 <= i < j < n,
+                    "Pairs are ordered vertex indices")
+            if mask is not None:
+                self.assertTrue(mask[i, j] or mask[j, i],
+                        "Only candidate edges are used")
+
+    def test_parity_random_complete(self):
+        """
+        Both engines find perfect matchings of the same total weight
+        """
+
+        rng = np.random.default_rng(1)
+        blossom = matching.get_engine('blossom')
+        reference = matching.get_engine('networkx')
+        for trial in range(60):
+            n = 2*int(rng.integers(1, 20))
+            low, high = [(0, 10), (-50, 50), (0, 3), (-20000, 20000)][trial % 4]
+            weights = rng.integers(low, high, size=(n, n))
+
+            a = blossom.match(weights)
+            b = reference.match(weights)
+            self.assert_valid_matching(n, a)
+            self.assertEqual(len(a), n//2,
+                    "Blossom matching is perfect")
+            self.assertEqual(len(b), n//2,
+                    "Reference matching is perfect")
+            self.assertEqual(self.total_weight(weights, a), self.total_weight(weights, b),
+                    "Same total weight")
+
+    def test_parity_random_sparse(self):
+        """
+        Both engines agree on cardinality and weight on restricted graphs
+        """
+
+        rng = np.random.default_rng(2)
+        blossom = matching.get_engine('blossom')
+        reference = matching.get_engine('networkx')
+        for trial in range(60):
+            n = int(rng.integers(2, 30))
+            weights = rng.integers(-100, 100, size=(n, n))
+            mask = rng.random((n, n)) < 0.2
+
+            a = blossom.match(weights, mask)
+            b = reference.match(weights, mask)
+            self.assert_valid_matching(n, a, mask)
+            self.assertEqual(len(a), len(b),
+                    "Same cardinality")
+            self.assertEqual(self.total_weight(weights, a), self.total_weight(weights, b),
+                    "Same total weight")
+
+    def test_parity_sss_rounds(self):
+        """
+        Both engines agree on pairing matrices of a running tournament
+        """
+
+        sys = system.SSSSystem(3, None)
+        for i in range(41):
+            sys.add_new_player(None) # Passing None as discord member
+
+        for i in range(6):
+            if sys.bye_player in sys.players:
+                sys.players.remove(sys.bye_player)
+            if len(sys.players) % 2 == 1:
+                sys.players.append(sys.bye_player)
+            weights = sys.make_pairings_matrix()
+            a = matching.get_engine('blossom').match(weights)
+            b = matching.get_engine('networkx').match(weights)
+            self.assertEqual(self.total_weight(weights, a), self.total_weight(weights, b),
+                    "Same total weight")
+
+            sys.pair_new_round()
+            for m in sys.rounds[-1]:
+                if m.result == system.SSSResults.open:
+                    m.result = random.choice([system.SSSResults.win_corp, system.SSSResults.win_runner])
+            sys.finish_round()
+
+    def test_system_engine_selection(self):
+        """
+        Systems can be created with either engine
+        """
+
+        for name in matching.ENGINES:
+            sys = system.SSSSystem(3, None, engine=name)
+            for i in range(9):
+                sys.add_new_player(None) # Passing None as discord member
+            sys.pair_new_round()
+            self.assertEqual(len(sys.rounds[0]), 5,
+                    "Five matches paired")
+
+        with self.assertRaises(Exception):
+            system.SSSSystem(3, None, engine='unknown')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+import asyncio
+import collections
+import logging
+import os
+import tempfile
+
+from angelarena import metrics
+
+Route = collections.namedtuple('Route', ['method', 'path'])
+
+class HTTPError(Exception):
+    status = 404
+
+class FakeHTTP(object):
+    async def request(self, route, **kwargs):
+        if route.path == '/missing':
+            raise HTTPError()
+        return route.path
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        """
+        Observations land in the right buckets and quantiles give the bucket bound
+        """
+
+        h = metrics.Histogram()
+        for value in [0.002]*90 + [0.3]*9 + [100]:
+            h.observe(value)
+
+        self.assertEqual(h.count, 100)
+        self.assertAlmostEqual(h.mean(), (0.18 + 2.7 + 100)/100)
+        self.assertEqual(h.quantile(0.5), 0.0025)
+        self.assertEqual(h.quantile(0.95), 0.5)
+        self.assertEqual(h.quantile(1), float('inf'),
+                "Values above the last bucket count towards +Inf")
+
+    def test_render(self):
+        """
+        Prometheus text format with cumulative buckets and escaped labels
+        """
+
+        m = metrics.Metrics()
+        m.inc('calls_total', route='GET /x')
+        m.inc('calls_total', 2, route='GET /x')
+        m.observe('latency_seconds', 0.02, name='say "hi"')
+        m.set('queued', 4)
+        m.set('queued', 2)
+
+        text = m.render()
+        self.assertIn('# TYPE calls_total counter\ncalls_total{route="GET /x"} 3\n', text)
+        self.assertIn('# TYPE queued gauge\nqueued 2\n', text)
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        self.assertIn('latency_seconds_bucket{name="say \\"hi\\"",le="0.01"} 0', text)
+        self.assertIn('latency_seconds_bucket{name="say \\"hi\\"",le="0.025"} 1', text)
+        self.assertIn('latency_seconds_bucket{name="say \\"hi\\"",le="+Inf"} 1', text)
+        self.assertIn('latency_seconds_count{name="say \\"hi\\""} 1', text)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.prom')
+            m.write_textfile(path)
+            with open(path) as f:
+                self.assertEqual(f.read(), text)
+            self.assertEqual(os.listdir(directory), ['metrics.prom'],
+                    "No temporary file is left behind")
+
+    def test_instrument(self):
+        """
+        Decorated coroutines are timed by name, also when they raise
+        """
+
+        m = metrics.Metrics()
+
+        @m.instrument('listener_seconds', name='on_test')
+        async def on_test(fail):
+            if fail:
+                raise ValueError()
+            return 42
+
+        self.assertEqual(asyncio.run(on_test(False)), 42)
+        with self.assertRaises(ValueError):
+            asyncio.run(on_test(True))
+        self.assertEqual(on_test.__name__, 'on_test',
+                "The listener keeps its name")
+        self.assertEqual(m.select('listener_seconds')[(('name', 'on_test'),)].count, 2)
+
+    def test_instrument_http(self):
+        """
+        API calls and errors are counted by route and the wrapper can be removed again
+        """
+
+        m = metrics.Metrics()
+        http = FakeHTTP()
+        metrics.instrument_http(http, m)
+        metrics.instrument_http(http, m)
+
+        async def run():
+            await http.request(Route('GET', '/channels'))
+            await http.request(Route('GET', '/channels'))
+            with self.assertRaises(HTTPError):
+                await http.request(Route('POST', '/missing'))
+        asyncio.run(run())
+
+        calls = m.select('discord_api_calls_total')
+        self.assertEqual(calls[(('route', 'GET /channels'),)], 2,
+                "Instrumenting twice does not count twice")
+        self.assertEqual(calls[(('route', 'POST /missing'),)], 1)
+        self.assertEqual(m.select('discord_api_errors_total'), {(('route', 'POST /missing'), ('status', 404)): 1})
+        self.assertEqual(m.select('discord_api_seconds')[(('route', 'GET /channels'),)].count, 2)
+
+        metrics.uninstrument_http(http)
+        self.assertIs(http.request.__func__, FakeHTTP.request)
+
+    def test_rate_limit_handler(self):
+        """
+        429s logged by discord.py are counted by route
+        """
+
+        m = metrics.Metrics()
+        logger = logging.getLogger('test.discord.http')
+        logger.propagate = False
+        handler = metrics.RateLimitHandler(m)
+        logger.addHandler(handler)
+        try:
+            logger.warning('We are being rate limited. Retrying in %.2f seconds. Handling under the lock: %s', 1.5, '123:456:/channels/{channel_id}/messages')
+            logger.warning('Global rate limit has been hit. Retrying in %.2f seconds.', 3.0)
+            logger.warning('Something else')
+        finally:
+            logger.removeHandler(handler)
+
+        self.assertEqual(m.select('discord_rate_limited_total'), {
+            (('route', '/channels/{channel_id}/messages'),): 1,
+            (('route', 'global'),): 1})
+        self.assertEqual(m.select('discord_rate_limit_wait_seconds')[(('route', 'global'),)].sum, 3.0)
+
+    def test_summary(self):
+        """
+        The !stats text lists every kind of metric and fits in a message
+        """
+
+        m = metrics.Metrics()
+        m.observe('bot_command_seconds', 0.2, name='kickoff')
+        m.observe('sss_stage_seconds', 0.01, stage='matching')
+        m.inc('discord_rate_limited_total', route='global')
+
+        text = metrics.summary(m)
+        self.assertIn("`kickoff` 1x, mean 200ms, p95 < 250ms", text)
+        self.assertIn("`matching` 1x", text)
+        self.assertIn("`global` 1x", text)
+        self.assertLessEqual(len(text), 2000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import unittest
+import asyncio
+import pickle
+
+from angelarena import pairing, system
+
+def make_system(size, seed=0, max_rounds=None):
+    sys = system.SSSSystem(3, max_rounds, seed=seed)
+    for i in range(size):
+        sys.add_new_player(1000 + i)
+    return sys
+
+def report_all(sys, result=system.SSSResults.win_corp):
+    sys.report_results([(k+1, result) for k, m in enumerate(sys.rounds[-1]) if m.result == system.SSSResults.open])
+
+def tables(sys):
+    store = sys.store
+    start = store.match_count - len(sys.rounds[-1])
+    return store.match_corp[start:store.match_count].tolist(), store.match_runner[start:store.match_count].tolist()
+
+class TestPairingService(unittest.TestCase):
+    def setUp(self):
+        self.service = pairing.PairingService(workers=2, timeout=60)
+
+    def tearDown(self):
+        self.service.close()
+
+    def test_same_as_in_process(self):
+        """
+        Rounds paired in a worker are the ones the system would pair itself
+        """
+
+        sys = make_system(41)
+        reference = pickle.loads(pickle.dumps(sys))
+
+        async def run():
+            for i in range(3):
+                round = await self.service.advance('t', sys, finish=sys.round_in_progress())
+                self.assertIs(round, sys.rounds[-1])
+                report_all(sys)
+
+        asyncio.run(run())
+        for i in range(3):
+            if reference.round_in_progress():
+                reference.finish_round()
+            reference.pair_new_round()
+            report_all(reference)
+
+        self.assertEqual(tables(sys), tables(reference))
+        self.assertEqual(len(sys.rounds), 3)
+        self.assertEqual(sys.finished_matches, reference.finished_matches)
+        self.assertTrue((sys.store.score[:sys.store.count] == reference.store.score[:reference.store.count]).all())
+        self.assertEqual(sys.rng.bit_generator.state, reference.rng.bit_generator.state,
+                "The random state moves on as if paired in process")
+        self.assertGreater(sys.stage_times['matching'], 0)
+
+    def test_parallel(self):
+        """
+        Several tournaments are paired at once, one job per tournament
+        """
+
+        systems = [make_system(30, seed) for seed in range(3)]
+
+        async def run():
+            jobs = [self.service.advance(k, sys) for k, sys in enumerate(systems)]
+            return await asyncio.gather(self.service.advance(0, systems[0]), *jobs, return_exceptions=True)
+
+        failed = [str(e) for e in asyncio.run(run()) if isinstance(e, Exception)]
+        self.assertEqual(failed, ["This tournament is already being paired."])
+        for sys in systems:
+            self.assertEqual(len(sys.rounds), 1)
+            self.assertEqual(len(sys.rounds[0]), 15)
+
+    def test_stale(self):
+        """
+        A pairing is thrown away if the system changed while it was computed
+        """
+
+        sys = make_system(20)
+
+        async def run():
+            job = asyncio.create_task(self.service.advance('t', sys))
+            await asyncio.sleep(0)
+            sys.add_new_player(2000)
+            with self.assertRaisesRegex(Exception, "changed"):
+                await job
+
+        asyncio.run(run())
+        self.assertEqual(sys.rounds, [])
+        self.assertEqual(self.service.stats['stale'], 1)
+
+    def test_timeout_and_cancel(self):
+        """
+        Timed out and cancelled jobs leave the system as it was and the service keeps working
+        """
+
+        sys = make_system(200)
+
+        async def run():
+            with self.assertRaisesRegex(Exception, "longer than"):
+                await self.service.advance('t', sys, timeout=0.001)
+            self.assertFalse(self.service.busy('t'))
+
+            job = asyncio.create_task(self.service.advance('t', sys))
+            await asyncio.sleep(0)
+            self.assertTrue(self.service.cancel('t'))
+            with self.assertRaisesRegex(Exception, "cancelled"):
+                await job
+            self.assertFalse(self.service.cancel('t'))
+
+            self.assertEqual(sys.rounds, [])
+            await self.service.advance('t', sys)
+
+        asyncio.run(run())
+        self.assertEqual(len(sys.rounds), 1)
+
+    def test_finish_only(self):
+        """
+        The last round is finished without pairing another one once the tournament is over
+        """
+
+        sys = make_system(2, max_rounds=1)
+
+        async def run():
+            await self.service.advance('t', sys)
+            report_all(sys)
+            return await self.service.advance('t', sys, finish=True)
+
+        self.assertIsNone(asyncio.run(run()))
+        self.assertTrue(sys.over())
+        self.assertFalse(sys.round_in_progress())
+        self.assertEqual(sys.results_version, 1)
+
+class TestSpeculation(unittest.TestCase):
+    def setUp(self):
+        self.service = pairing.PairingService(workers=2, timeout=60, max_outcomes=9)
+
+    def tearDown(self):
+        self.service.close()
+
+    def paired(self, size):
+        sys = make_system(size)
+        asyncio.run(self.service.advance('t', sys))
+        return sys
+
+    def jobs(self):
+        return self.service.speculations['t'][1]
+
+    def test_hit(self):
+        """
+        The round paired ahead for the actual outcome is used and equals pairing it afterwards
+        """
+
+        sys = self.paired(40)
+        open_tables = list(range(1, len(sys.rounds[-1]) + 1))
+        sys.report_results([(table, system.SSSResults.win_corp) for table in open_tables[2:]])
+        self.service.speculate('t', sys)
+        self.assertEqual(len(self.jobs()), 9,
+                "Every outcome of two open matches is paired ahead")
+
+        sys.report_results([(1, system.SSSResults.draw), (2, system.SSSResults.win_runner)])
+        reference = pickle.loads(pickle.dumps(sys))
+        reference.finish_round()
+        reference.pair_new_round()
+
+        round = asyncio.run(self.service.advance('t', sys, finish=True))
+        self.assertEqual(self.service.stats['speculation_hits'], 1)
+        self.assertIs(round, sys.rounds[-1])
+        self.assertEqual(tables(sys), tables(reference))
+        self.assertEqual(sys.finished_matches, reference.finished_matches)
+        self.assertNotIn('t', self.service.speculations,
+                "The other outcomes are dropped")
+
+    def test_incremental(self):
+        """
+        Speculations follow incoming and corrected results without pairing an outcome twice
+        """
+
+        sys = self.paired(6)
+        self.service.speculate('t', sys)
+        self.assertEqual(len(self.jobs()), 0,
+                "27 outcomes are too many")
+
+        sys.report_results([(1, system.SSSResults.win_corp)])
+        self.service.speculate('t', sys)
+        self.assertEqual(len(self.jobs()), 9)
+
+        sys.report_results([(2, system.SSSResults.win_runner)])
+        self.service.speculate('t', sys)
+        self.assertEqual(len(self.jobs()), 3,
+                "Outcomes that contradict the new result are dropped")
+        self.assertEqual(self.service.stats['speculated'], 9,
+                "Nothing new is paired")
+
+        sys.report_results([(1, system.SSSResults.win_runner)])
+        self.service.speculate('t', sys)
+        self.assertEqual(len(self.jobs()), 3)
+        self.assertEqual(self.service.stats['speculated'], 12,
+                "A corrected result starts the outcomes that are still possible")
+
+        sys.report_results([(3, system.SSSResults.win_corp)])
+        asyncio.run(self.service.advance('t', sys, finish=True))
+        self.assertEqual(self.service.stats['speculation_hits'], 1)
+        self.assertEqual(len(sys.rounds), 2)
+
+    def test_miss(self):
+        """
+        A changed tournament does not use speculations made before
+        """
+
+        sys = self.paired(6)
+        sys.report_results([(1, system.SSSResults.win_corp), (2, system.SSSResults.win_corp)])
+        self.service.speculate('t', sys)
+        sys.report_results([(3, system.SSSResults.win_corp)])
+        sys.drop_player(sys.players[0])
+
+        asyncio.run(self.service.advance('t', sys, finish=True))
+        self.assertEqual(self.service.stats['speculation_hits'], 0)
+        self.assertEqual(self.service.stats['speculation_misses'], 1)
+        self.assertEqual(len(sys.rounds), 2)
+
+if __name__ == '__main__':
+    unittest.main()
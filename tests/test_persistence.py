@@ -0,0 +1,189 @@
+import unittest
+import asyncio
+import os
+import pickle
+import random
+import tempfile
+
+from angelarena import persistence, registry, system, tournament
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.dir.name, 'tournaments.p')
+        self.journal_path = os.path.join(self.dir.name, 'tournaments.journal')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def journal(self, compact_every=500):
+        return persistence.Journal(self.snapshot_path, self.journal_path, compact_every, sync=False)
+
+    def play_round(self, journal, t):
+        t.system.pair_new_round()
+        round = t.system.rounds[-1]
+        journal.record('pair', t, [m.corp.index for m in round], [m.runner.index for m in round])
+
+        results = [(k+1, random.choice([system.SSSResults.win_corp, system.SSSResults.win_runner]))
+                for k, m in enumerate(round) if m.result == system.SSSResults.open]
+        t.system.report_results(results)
+        journal.record('results', t, results)
+        t.system.finish_round()
+        journal.record('finish', t)
+
+    def assert_same_tournament(self, a, b):
+        self.assertEqual(a.id, b.id)
+        self.assertEqual(a.participants, b.participants)
+        self.assertEqual(a.message_id, b.message_id)
+        self.assertEqual(a.approval, b.approval)
+        sa, sb = a.system, b.system
+        self.assertEqual(len(sa.rounds), len(sb.rounds))
+        self.assertEqual([p.index for p in sa.players], [p.index for p in sb.players],
+                "Same active players")
+        self.assertEqual([str(m) for r in sa.rounds for m in r], [str(m) for r in sb.rounds for m in r],
+                "Same pairings and results")
+        self.assertEqual(sa.store.side_balance[:sa.store.count].tolist(), sb.store.side_balance[:sb.store.count].tolist())
+
+    def test_replay(self):
+        """
+        Snapshot and journal replay to the same state
+        """
+
+        journal = self.journal()
+        self.assertEqual(len(journal.load()), 0,
+                "Nothing saved yet")
+
+        t = tournament.SSSTournament("Test", 1, "Description", "Standard")
+        journal.record('add', t, t)
+        for user_id in range(10):
+            t.participants.append(user_id)
+            journal.record('join', t, user_id)
+            t.system.add_new_player(user_id)
+            journal.record('add_player', t, user_id)
+        t.participants.remove(3)
+        journal.record('leave', t, 3)
+        t.message_id = 1234
+        journal.record('set', t, {'message_id': 1234})
+
+        self.play_round(journal, t)
+        journal.snapshot(registry.TournamentRegistry([t]))
+        self.play_round(journal, t)
+        t.system.drop_player(t.system.players[0])
+        journal.record('drop', t, t.system.dropped[0].index)
+        self.play_round(journal, t)
+        journal.close()
+
+        loaded = self.journal().load()
+        self.assertEqual(len(loaded), 1)
+        self.assert_same_tournament(t, loaded.get(t.id))
+
+    def test_torn_record(self):
+        """
+        A partially written record at the end of the journal is dropped
+        """
+
+        journal = self.journal()
+        journal.load()
+        a = tournament.Tournament("A", 1, "Description", "Standard")
+        journal.record('add', a, a)
+        journal.record('join', a, 42)
+        journal.close()
+        size = os.path.getsize(self.journal_path)
+
+        with open(self.journal_path, 'ab') as f:
+            f.write(b'\x80\x05\x95garbage')
+
+        journal = self.journal()
+        loaded = journal.load()
+        self.assertEqual(loaded.get(a.id).participants, [42])
+        self.assertEqual(os.path.getsize(self.journal_path), size,
+                "Incomplete record is cut off")
+
+        journal.record('join', loaded.get(a.id), 43)
+        journal.close()
+        self.assertEqual(self.journal().load().get(a.id).participants, [42, 43],
+                "Journal continues after the last complete record")
+
+    def test_compaction(self):
+        """
+        Snapshots truncate the journal and skip records they already contain
+        """
+
+        journal = self.journal(compact_every=3)
+        journal.load()
+        t = tournament.Tournament("A", 1, "Description", "Standard")
+        journal.record('add', t, t)
+        journal.record('join', t, 1)
+        self.assertFalse(journal.needs_compaction())
+        journal.record('join', t, 2)
+        self.assertTrue(journal.needs_compaction())
+
+        t.participants = [1, 2]
+        with open(self.journal_path, 'rb') as f:
+            records = f.read()
+        journal.snapshot(registry.TournamentRegistry([t]))
+        self.assertEqual(os.path.getsize(self.journal_path), 0,
+                "Journal is empty after a snapshot")
+        journal.close()
+
+        # journal truncation did not happen, the records must not be applied twice
+        with open(self.journal_path, 'wb') as f:
+            f.write(records)
+        self.assertEqual(self.journal().load().get(t.id).participants, [1, 2])
+
+    def test_old_snapshot(self):
+        """
+        Plain pickled tournament lists are still loaded
+        """
+
+        with open(self.snapshot_path, 'wb') as f:
+            pickle.dump([tournament.Tournament("A", 1, "Description", "Standard")], f)
+        self.assertEqual(self.journal().load().by_title("A").title, "A")
+
+class TestStateWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.dir.name, 'tournaments.p')
+        self.journal_path = os.path.join(self.dir.name, 'tournaments.journal')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_coalescing(self):
+        """
+        Bursts of changes are written together and snapshots replace records
+        """
+
+        journal = persistence.Journal(self.snapshot_path, self.journal_path, sync=False)
+        journal.load()
+        writer = persistence.StateWriter(journal)
+        t = tournament.Tournament("A", 1, "Description", "Standard")
+
+        async def burst():
+            writer.submit_record(journal.encode('add', t, t))
+            for user_id in range(100):
+                t.participants.append(user_id)
+                writer.submit_record(journal.encode('join', t, user_id))
+            await writer.flush()
+            self.assertEqual(writer.stats['writes'], 1,
+                    "One write for the whole burst")
+            self.assertEqual(writer.stats['max_queue_depth'], 101)
+
+            for user_id in range(100, 110):
+                t.participants.append(user_id)
+                writer.submit_record(journal.encode('join', t, user_id))
+            writer.submit_snapshot(journal.encode_snapshot(registry.TournamentRegistry([t])))
+            writer.submit_record(journal.encode('leave', t, 0))
+            t.participants.remove(0)
+            await writer.flush()
+            self.assertEqual(writer.stats['coalesced'], 10,
+                    "Records before the snapshot are not written")
+
+        asyncio.run(burst())
+        writer.close()
+
+        loaded = persistence.Journal(self.snapshot_path, self.journal_path).load()
+        self.assertEqual(loaded.get(t.id).participants, list(range(1, 110)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+
+from angelarena import profiling
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+class TestProfiling(unittest.TestCase):
+    def test_sampling_profiler(self):
+        """
+        The profiler attributes samples of the profiled thread to the functions running in it
+        """
+
+        profiler = profiling.SamplingProfiler(interval=0.001)
+        profiler.start()
+        self.assertTrue(profiler.running)
+        busy_loop(0.2)
+        profile = profiler.stop()
+        self.assertFalse(profiler.running)
+
+        self.assertGreater(profile.samples(), 10)
+        busiest = max(profile.stacks, key=profile.stacks.get)
+        self.assertIn('busy_loop', [name for _, name, _ in busiest],
+                "Most samples are taken in the busy loop")
+
+        summary = profile.summary()
+        self.assertIn("Own time:", summary)
+        self.assertIn("busy_loop (test_profiling.py:", summary)
+        self.assertIn("test_sampling_profiler (test_profiling.py);busy_loop (test_profiling.py)", summary,
+                "Collapsed stacks list the outermost frame first")
+
+    def test_other_thread(self):
+        """
+        Only the profiled thread is sampled
+        """
+
+        worker = threading.Thread(target=busy_loop, args=(0.2,))
+        worker.start()
+        profiler = profiling.SamplingProfiler(thread_id=worker.ident, interval=0.001)
+        profiler.start()
+        time.sleep(0.1)
+        profile = profiler.stop()
+        worker.join()
+
+        self.assertGreater(profile.samples(), 0)
+        self.assertNotIn('test_other_thread', profile.summary())
+
+    def test_memory_tracker(self):
+        """
+        Growth since the baseline is reported by line
+        """
+
+        memory = profiling.MemoryTracker()
+        memory.start()
+        try:
+            self.assertTrue(memory.tracing)
+            leak = [str(i)*10 for i in range(20000)]
+            summary = memory.summary()
+        finally:
+            memory.stop()
+        self.assertFalse(memory.tracing)
+
+        growth = summary.split("Growth since the baseline:\n")[1].split("\n")[0]
+        self.assertIn("test_profiling.py", growth,
+                "The biggest growth comes from the test")
+        self.assertEqual(len(leak), 20000)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = profiling.write_report(os.path.join(directory, 'reports'), 'memory', summary)
+            with open(path) as f:
+                self.assertEqual(f.read(), summary)
+            self.assertTrue(os.path.basename(path).startswith('memory-'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import collections
+import pickle
+
+from angelarena import registry, tournament
+
+Channel = collections.namedtuple('Channel', ['id', 'category_id'])
+
+class TestTournamentRegistry(unittest.TestCase):
+    def make(self):
+        tournaments = registry.TournamentRegistry()
+        a = tournament.Tournament("A", 1, "Description", "Standard")
+        b = tournament.SSSTournament("B", 1, "Description", "Standard")
+        c = tournament.Tournament("C", 2, "Description", "Standard")
+        for t in [a, b, c]:
+            tournaments.add(t)
+        return tournaments, a, b, c
+
+    def test_lookup(self):
+        """
+        Tournaments are found by every indexed attribute
+        """
+
+        tournaments, a, b, c = self.make()
+        tournaments.set(a, {'message_id': 10})
+        tournaments.set(b, {'message_id': 11, 'category_id': 20, 'lobby_id': 21})
+
+        self.assertIs(tournaments.find('message_id', 10), a)
+        self.assertIs(tournaments.find('message_id', 11), b)
+        self.assertIs(tournaments.by_title("C"), c)
+        self.assertIs(tournaments.by_channel(Channel(21, 20)), b,
+                "Found by channel id")
+        self.assertIs(tournaments.by_channel(Channel(22, 20)), b,
+                "Found by category of the channel")
+        self.assertIsNone(tournaments.by_channel(Channel(23, None)))
+        self.assertEqual(tournaments.by_organizer(1), [a, b])
+
+        tournaments.set(a, {'message_id': 12})
+        self.assertIsNone(tournaments.find('message_id', 10),
+                "Old values are unindexed")
+        self.assertIs(tournaments.find('message_id', 12), a)
+
+        with self.assertRaises(Exception):
+            tournaments.add(a)
+
+    def test_archive(self):
+        """
+        Archived tournaments are kept but not routed to
+        """
+
+        tournaments, a, b, c = self.make()
+        tournaments.set(b, {'message_id': 11, 'category_id': 20})
+        tournaments.archive(b)
+
+        self.assertEqual(list(tournaments), [a, c])
+        self.assertNotIn(b, tournaments)
+        self.assertIsNone(tournaments.find('message_id', 11))
+        self.assertIsNone(tournaments.by_title("B"))
+        self.assertIs(tournaments.get(b.id), b)
+        self.assertEqual(tournaments.by_organizer(1), [a])
+        self.assertEqual(tournaments.by_organizer(1, archived=True), [a, b])
+
+        tournaments.remove(b)
+        self.assertIsNone(tournaments.get(b.id))
+
+    def test_pickle(self):
+        """
+        Indexes are rebuilt when unpickled
+        """
+
+        tournaments, a, b, c = self.make()
+        tournaments.set(b, {'message_id': 11, 'category_id': 20})
+        tournaments.archive(c)
+
+        loaded = pickle.loads(pickle.dumps(tournaments))
+        self.assertEqual(loaded.find('message_id', 11).id, b.id)
+        self.assertEqual(loaded.by_channel(Channel(5, 20)).id, b.id)
+        self.assertEqual([t.id for t in loaded], [a.id, b.id])
+        self.assertEqual(loaded.get(c.id).title, "C")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import random
+
+from angelarena import rendering, tournament, system
+
+class TestDescriptionCache(unittest.TestCase):
+    def test_split(self):
+        """
+        Large events are split into messages below the limit
+        """
+
+        t = tournament.Tournament("Big event", 1, "First line\nSecond line", "Standard")
+        cache = rendering.DescriptionCache()
+        self.assertEqual(cache.render(t), [rendering.header(t)],
+                "No participants yet")
+
+        for user_id in range(10**17, 10**17 + 300):
+            t.add_participant(user_id)
+        parts = cache.render(t)
+        self.assertGreater(len(parts), 1)
+        for part in parts:
+            self.assertLessEqual(len(part), rendering.LIMIT)
+        self.assertIn("**Participants (300):**", parts[0])
+        self.assertTrue(all(part.startswith(rendering.CONTINUED) for part in parts[1:]))
+        self.assertEqual(sum(part.count("<@") for part in parts), 301,
+                "Every participant and the organizer is mentioned once")
+
+    def test_cached(self):
+        """
+        Rendering is reused until the tournament changes
+        """
+
+        t = tournament.Tournament("Event", 1, "Description", "Standard")
+        cache = rendering.DescriptionCache()
+        t.add_participant(5)
+        parts = cache.render(t)
+        self.assertIs(cache.render(t), parts)
+        t.add_participant(5)
+        self.assertIs(cache.render(t), parts,
+                "Joining twice is no change")
+        t.add_participant(6)
+        self.assertIsNot(cache.render(t), parts)
+
+    def test_incremental(self):
+        """
+        Incremental updates match a fresh rendering
+        """
+
+        random.seed(0)
+        t = tournament.Tournament("Event", 1, "Description", "Standard")
+        cache = rendering.DescriptionCache(limit=300)
+        for step in range(2000):
+            if random.random() < 0.6 or not t.participants:
+                t.add_participant(random.choice([random.randrange(100), random.randrange(10**17, 10**18)]))
+            else:
+                t.remove_participant(random.choice(t.participants))
+            if step == 1000:
+                t.title = "Renamed event"
+                t.version += 1
+            self.assertEqual(cache.render(t), rendering.DescriptionCache(limit=300).render(t))
+
+class TestPairings(unittest.TestCase):
+    def test_pairings(self):
+        """
+        Every table is listed once, the bye included, across messages below the limit
+        """
+
+        sss = system.SSSSystem(3, None, seed=0)
+        for user_id in range(10**17, 10**17 + 301):
+            sss.add_new_player(user_id)
+        round = sss.pair_new_round()
+
+        messages = rendering.pairings(1, round)
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(all(len(m) <= rendering.LIMIT for m in messages))
+        lines = "\n".join(messages).split("\n")
+        self.assertEqual(lines[0], "**Round 1 pairings:**")
+        self.assertEqual(len(lines), 152)
+        self.assertEqual(sum("has a bye" in line for line in lines), 1)
+        self.assertEqual(lines[1], f"Table 1: <@{round[0].corp.member}> (Corp) vs <@{round[0].runner.member}> (Runner)")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import os
+import tempfile
+
+from angelarena import persistence, registry, sessions, tournament
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class Person(object):
+    def __init__(self, id):
+        self.id = id
+
+class Cog(object):
+    def __init__(self, tournaments):
+        self.tournaments = tournaments
+        self.wizards = sessions.SessionStore()
+
+    def restore_wizard(self, user_id, kind, state):
+        return tournament.WIZARDS[kind].restore(self, Person(user_id), state)
+
+class TestSessionStore(unittest.TestCase):
+    def test_eviction(self):
+        """
+        Idle sessions expire and the store never exceeds its capacity
+        """
+
+        clock = Clock()
+        store = sessions.SessionStore(ttl=60, capacity=3, clock=clock)
+        for user_id in range(3):
+            store[user_id] = object()
+            clock.now += 10
+
+        store[0] # activity keeps a session alive
+        clock.now += 45
+        self.assertNotIn(1, store,
+                "Idle for longer than the ttl")
+        self.assertIn(0, store)
+        self.assertIn(2, store)
+
+        store[3] = object()
+        store[4] = object()
+        self.assertEqual(len(store), 3)
+        self.assertNotIn(2, store,
+                "Least recently active session is dropped first")
+        self.assertEqual(store.stats['expired'] + store.stats['evicted'], 2)
+
+        self.assertIsNone(store.pop(2))
+        self.assertIsNotNone(store.pop(3))
+        self.assertNotIn(3, store)
+
+    def test_restore(self):
+        """
+        Check-ins in progress survive a snapshot
+        """
+
+        t = tournament.SSSTournament("Test", 1, "Description", "Standard")
+        tournaments = registry.TournamentRegistry([t])
+        cog = Cog(tournaments)
+        w = tournament.TournamentCheckInWizard(cog, t, Person(7))
+        w.stage = 1
+        w.corp_deck = "https://netrunnerdb.com/en/decklist/1"
+        cog.wizards[7] = w
+        c = tournament.TournamentCreationWizard(cog, Person(8))
+        c.stage = 2
+        c.data['title'] = "Another one"
+        cog.wizards[8] = c
+        cog.wizards[9] = tournament.TournamentCheckInWizard(cog, tournament.Tournament("Gone", 1, "", ""), Person(9))
+
+        with tempfile.TemporaryDirectory() as directory:
+            journal = persistence.Journal(os.path.join(directory, 't.p'), os.path.join(directory, 't.journal'), sync=False)
+            journal.load()
+            journal.snapshot(tournaments, cog.wizards.dump())
+            journal.close()
+
+            journal = persistence.Journal(os.path.join(directory, 't.p'), os.path.join(directory, 't.journal'), sync=False)
+            loaded = Cog(journal.load())
+            loaded.wizards.restore(journal.sessions, loaded.restore_wizard)
+            journal.close()
+
+        self.assertEqual(len(loaded.wizards), 2,
+                "Wizards of unknown tournaments are dropped")
+        w = loaded.wizards[7]
+        self.assertEqual((w.stage, w.corp_deck, w.tournament.id), (1, "https://netrunnerdb.com/en/decklist/1", t.id))
+        c = loaded.wizards[8]
+        self.assertEqual((c.stage, c.data['title'], c.data['organizer']), (2, "Another one", 8))
+
+if __name__ == '__main__':
+    unittest.main()
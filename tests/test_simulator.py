@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from angelarena import simulator
+
+class TestSimulator(unittest.TestCase):
+    def test_batch(self):
+        """
+        Simulated tournaments end with one player left
+        """
+
+        result = simulator.simulate(32, sims=200, seed=1)
+        self.assertEqual(len(result.rounds_to_winner), 200,
+                "One entry per simulated tournament")
+        self.assertTrue((result.rounds_to_winner > 3).all(),
+                "Nobody can be eliminated before four losses")
+        self.assertTrue((result.rounds_to_undefeated <= result.rounds_to_winner).all(),
+                "Undefeated players are decided first")
+        self.assertTrue((np.diff(result.curve) <= 0).all(),
+                "Players are only ever removed")
+        self.assertLessEqual(result.curve[-1], 1,
+                "Tournaments end with at most one player")
+
+    def test_more_players_take_longer(self):
+        """
+        Larger fields and more allowed losses need more rounds
+        """
+
+        small = simulator.simulate(16, sims=300, seed=2).summary()
+        large = simulator.simulate(128, sims=300, seed=2).summary()
+        lenient = simulator.simulate(16, sims=300, max_losses=5, seed=2).summary()
+        self.assertLess(small['median'], large['median'],
+                "Larger fields take longer")
+        self.assertLess(small['median'], lenient['median'],
+                "More losses take longer")
+
+    def test_workers(self):
+        """
+        Simulations split across processes are merged
+        """
+
+        result = simulator.simulate(16, sims=101, seed=3, workers=2)
+        self.assertEqual(len(result.rounds_to_winner), 101,
+                "All simulations are merged")
+
+    def test_suggestions(self):
+        """
+        Suggestions come from the precomputed table
+        """
+
+        self.assertIsNone(simulator.suggest(1),
+                "No suggestion without players")
+        self.assertEqual(simulator.suggest(64)['median'], simulator.TABLE[64]['median'],
+                "Table entry is used")
+        self.assertGreaterEqual(simulator.suggest(50)['median'], simulator.TABLE[48]['median'],
+                "Sizes between entries round up")
+        self.assertGreater(simulator.suggest(8000)['median'], simulator.TABLE[2048]['median'],
+                "Fields beyond the table are extrapolated")
+        self.assertIn("rounds", simulator.suggestion_text(20))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
 import unittest
 import random
+import pickle
+
+import numpy as np
 
 from angelarena import system
 
@@ -69,7 +72,10 @@ class TestSSSSystem(unittest.TestCase):
         Simulate small elimination tournament
         """
 
-        sys = system.SSSSystem(3,None)
+        # Seeded since the last players can also be eliminated together,
+        # e.g. by a draw when both are at the loss limit
+        random.seed(0)
+        sys = system.SSSSystem(3,None, seed=0)
         for i in range(15):
             sys.add_new_player(None) # Passing None as discord member
 
@@ -94,6 +100,281 @@ class TestSSSSystem(unittest.TestCase):
         self.assertEqual(len(sys.players), 1,
                 "Tournament ended with a winner")
 
+    def test_opponent_matrix_matches_history(self):
+        """
+        Opponent count matrix stays consistent with the match lists
+        """
+
+        sys = system.SSSSystem(3,None)
+        for i in range(21):
+            sys.add_new_player(None) # Passing None as discord member
+
+        everyone = list(sys.players)
+        for i in range(8):
+            sys.pair_new_round()
+            for m in sys.rounds[-1]:
+                if m.result == system.SSSResults.open:
+                    m.result = random.choice([system.SSSResults.win_corp, system.SSSResults.win_runner])
+            sys.finish_round()
+            if len(sys.players) <= 2:
+                break
+            if i == 2:
+                sys.drop_player(sys.players[0])
+
+        everyone.append(sys.bye_player)
+        for p1 in everyone:
+            for p2 in everyone:
+                self.assertEqual(sys.opponents[p1.index, p2.index],
+                        sum(1 for match in p1.matches if p2 in match and p1 is not p2),
+                        "Opponent count matches history")
+
+        penalty = sys.make_repair_penalty_array()
+        self.assertEqual(penalty.shape, (len(sys.players), len(sys.players)),
+                "Penalty covers active players only")
+        self.assertTrue((penalty.diagonal() == 0).all(),
+                "No penalty for pairing a player with itself")
+
+    def test_bracket_pairing(self):
+        """
+        Bracket mode pairs everyone once and avoids rematches
+        """
+
+        for workers in [None, 2]:
+            sys = system.SSSSystem(3,None,pairing_mode='brackets',pairing_workers=workers)
+            for i in range(41):
+                sys.add_new_player(None) # Passing None as discord member
+
+            for i in range(5):
+                sys.pair_new_round()
+                round = sys.rounds[-1]
+                for player in sys.players:
+                    self.assertEqual(sum(1 for match in round if player in match), 1,
+                            "Found only one match per player")
+                for m in round:
+                    self.assertEqual(sys.opponents[m.corp.index, m.runner.index], 1,
+                            "No rematches")
+                    if m.result == system.SSSResults.open:
+                        m.result = random.choice([system.SSSResults.win_corp, system.SSSResults.win_runner])
+                sys.finish_round()
+
+    def test_bracket_groups(self):
+        """
+        Score brackets are even and floaters only move down
+        """
+
+        sys = system.SSSSystem(3,None,pairing_mode='brackets')
+        for i in range(29):
+            sys.add_new_player(None) # Passing None as discord member
+        for i, player in enumerate(sys.players):
+            player.score = i % 3
+        sys.players.append(sys.bye_player)
+
+        groups = sys.make_bracket_groups()
+        self.assertEqual(sum(len(group) for group in groups), 30,
+                "Every player is in exactly one group")
+        for group in groups:
+            self.assertEqual(len(group) % 2, 0,
+                    "Groups can be paired")
+        self.assertIn(sys.bye_player, groups[-1],
+                "Bye is paired in the lowest bracket")
+        for upper, lower in zip(groups, groups[1:]):
+            self.assertGreater(min(p.score for p in upper), min(p.score for p in lower),
+                    "Floaters only move down")
+
+    def test_sparse_pairing(self):
+        """
+        Sparse mode pairs everyone and avoids rematches without falling back
+        """
+
+        sys = system.SSSSystem(3,None,pairing_mode='sparse')
+        for i in range(41):
+            sys.add_new_player(None) # Passing None as discord member
+
+        for i in range(5):
+            sys.pair_new_round()
+            round = sys.rounds[-1]
+            for player in sys.players:
+                self.assertEqual(sum(1 for match in round if player in match), 1,
+                        "Found only one match per player")
+            for m in round:
+                self.assertEqual(sys.opponents[m.corp.index, m.runner.index], 1,
+                        "No rematches")
+                if m.result == system.SSSResults.open:
+                    m.result = random.choice([system.SSSResults.win_corp, system.SSSResults.win_runner])
+            sys.finish_round()
+
+        self.assertEqual(sys.pairing_stats['sparse'], 5,
+                "Every round was paired sparse")
+
+    def test_sparse_pairing_fallback(self):
+        """
+        Sparse mode falls back to dense pairing when only rematches are left
+        """
+
+        sys = system.SSSSystem(3,None,pairing_mode='sparse')
+        for i in range(4):
+            sys.add_new_player(None) # Passing None as discord member
+        sys.sparse_k = 1
+        sys.opponents[1:5, 1:5] = 1
+        np.fill_diagonal(sys.opponents, 0)
+
+        sys.pair_new_round()
+        self.assertEqual(len(sys.rounds[0]), 2,
+                "Two matches paired")
+        self.assertEqual(sys.pairing_stats['dense_fallback'], 1,
+                "Fallback was reported")
+        self.assertGreaterEqual(sys.pairing_stats['sparse_widened'], 1,
+                "Candidate graph was widened first")
+
+    def test_store_views(self):
+        """
+        Players and matches are views on the columnar store
+        """
+
+        sys = system.SSSSystem(3,None)
+        for i in range(40):
+            sys.add_new_player(i)
+
+        self.assertFalse(hasattr(sys.players[0], '__dict__'),
+                "Player views use slots")
+        self.assertEqual([p.member for p in sys.players], list(range(40)),
+                "Members are kept in order")
+
+        sys.pair_new_round()
+        for m in sys.rounds[-1]:
+            m.result = system.SSSResults.win_corp
+        sys.finish_round()
+        sys.drop_player(sys.players[0])
+
+        store = sys.store
+        for player in sys.players:
+            self.assertEqual(player.score, store.score[player.index],
+                    "Score is read from the store")
+            self.assertIs(player.matches[0], sys.rounds[0][player.matches[0].index],
+                    "Match views are shared")
+        self.assertEqual(store.status[sys.dropped[0].index], system.SSSStatus.dropped.value,
+                "Dropped flag is set")
+        self.assertEqual(store.score[sys.bye_player.index], -1,
+                "Bye keeps a score of -1")
+        self.assertEqual(store.side_balance[sys.bye_player.index], 0,
+                "Bye keeps a side balance of 0")
+
+        copy = pickle.loads(pickle.dumps(sys))
+        self.assertEqual([p.score for p in copy.players], [p.score for p in sys.players],
+                "Scores survive pickling")
+        self.assertIs(copy.rounds[0][0].corp, copy.store.views[copy.rounds[0][0].corp.index],
+                "Views stay canonical after pickling")
+        copy.add_new_player(None)
+        copy.pair_new_round()
+        self.assertEqual(len(copy.rounds), 2,
+                "Unpickled system can keep pairing")
+
+    def test_report_results(self):
+        """
+        Results are reported in one batch by player or table number
+        """
+
+        sys = system.SSSSystem(0,None)
+        for i in range(9):
+            sys.add_new_player(None) # Passing None as discord member
+
+        sys.pair_new_round()
+        round = sys.rounds[-1]
+        tables = [m for m in round if m.result == system.SSSResults.open]
+        bye_table = next(k for k, m in enumerate(round) if m.result == system.SSSResults.bye) + 1
+
+        self.assertEqual(sys.current_match(tables[0].runner).index, tables[0].index,
+                "Players are looked up by their current match")
+        self.assertEqual(sys.current_match(1).index, round[0].index,
+                "Tables are numbered from one")
+
+        with self.assertRaises(Exception):
+            sys.report_results({bye_table: system.SSSResults.win_corp})
+        with self.assertRaises(Exception):
+            sys.report_results({len(round)+1: system.SSSResults.win_corp})
+        with self.assertRaises(Exception):
+            sys.report_results([(tables[0].corp, system.SSSResults.win_corp), (tables[0].runner, system.SSSResults.draw)])
+        with self.assertRaises(Exception):
+            sys.report_results({tables[0].corp: system.SSSResults.open})
+        self.assertEqual(len(tables), sum(m.result == system.SSSResults.open for m in round),
+                "Invalid batches are not applied")
+
+        open_matches = sys.report_results([(tables[0].corp, system.SSSResults.win_corp), (tables[0].runner, system.SSSResults.win_corp)])
+        self.assertEqual(open_matches, len(tables)-1,
+                "Both players of a match can report the same result")
+
+        winners = [tables[0].corp]
+        results = {}
+        for m in tables[1:]:
+            results[m.index - round[0].index + 1] = system.SSSResults.win_runner
+            winners.append(m.runner)
+        self.assertEqual(sys.report_results(results), 0,
+                "All results recorded")
+
+        sys.finish_round()
+        self.assertEqual(len(sys.players), 5,
+                "Every loser is eliminated with no losses allowed")
+        self.assertEqual(set(p.index for p in sys.players), set(p.index for p in winners + [round[bye_table-1].opponent(sys.bye_player)]),
+                "Winners and the bye stay in the tournament")
+        for p in sys.eliminated:
+            self.assertEqual(sys.store.status[p.index], system.SSSStatus.eliminated.value)
+
+        with self.assertRaises(Exception):
+            sys.report_results({1: system.SSSResults.draw})
+
+    def test_standings(self):
+        """
+        Standings match a naive computation over the match lists
+        """
+
+        sys = system.SSSSystem(3,None)
+        for i in range(25):
+            sys.add_new_player(None) # Passing None as discord member
+
+        for i in range(5):
+            sys.pair_new_round()
+            for m in sys.rounds[-1]:
+                if m.result == system.SSSResults.open:
+                    m.result = random.choice([system.SSSResults.win_corp, system.SSSResults.win_runner, system.SSSResults.draw])
+            sys.finish_round()
+        sys.pair_new_round() # open round is not counted
+
+        def finished(player):
+            return [m for m in player.matches if not m in sys.rounds[-1]]
+
+        def points(player):
+            return player.score / len(finished(player))
+
+        def opponents(player):
+            return [m.opponent(player) for m in finished(player) if not sys.bye_player in m]
+
+        def sos(player):
+            played = opponents(player)
+            return sum(points(o) for o in played) / len(played) if played else 0
+
+        def esos(player):
+            played = opponents(player)
+            return sum(sos(o) for o in played) / len(played) if played else 0
+
+        standings = sys.standings()
+        self.assertEqual(len(standings), 25,
+                "Everyone is ranked, including eliminated players")
+        for row in standings:
+            self.assertAlmostEqual(row.sos, sos(row.player))
+            self.assertAlmostEqual(row.esos, esos(row.player))
+        for a, b in zip(standings, standings[1:]):
+            self.assertGreaterEqual((a.score, a.sos, a.esos), (b.score, b.sos, b.esos),
+                    "Sorted by score and tiebreakers")
+
+        self.assertIs(sys.standings(), standings,
+                "Standings are cached")
+        for m in sys.rounds[-1]:
+            if m.result == system.SSSResults.open:
+                m.result = system.SSSResults.win_corp
+        sys.finish_round()
+        self.assertIsNot(sys.standings(), standings,
+                "Finishing a round refreshes standings")
+
     @unittest.skip("Takes long time")
     def test_full_huge_tournament(self):
         """